@@ -0,0 +1,205 @@
+# Precomputed admin analytics rollups for Domora
+# The admin dashboard reads small rollup documents instead of scanning
+# bookings and payment transactions on request. Rollups are maintained with
+# $inc upserts on every booking state transition and rebuilt from the source
+# collections by a nightly reconciliation that corrects any drift.
+#
+#   booking_rollups      one doc per day x service_type x status:
+#                        bookings, revenue (captured payments)
+#   provider_rollups     one doc per provider: bookings, revenue, by_status
+#   analytics_counters   {"id": "users"}: registered users by role
+#
+# Bookings are bucketed by the day they were created; a status change moves
+# the booking (and its captured revenue) between that day's status buckets.
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+ROLES = ("customer", "provider", "admin")
+
+
+def _value(value):
+    return getattr(value, "value", value)
+
+
+def day_key(when: datetime) -> str:
+    return when.strftime("%Y-%m-%d")
+
+
+def booking_revenue(booking: Dict[str, Any]) -> float:
+    """Captured amount of a booking; zero until its payment is captured"""
+    if _value(booking.get("payment_status")) != "captured":
+        return 0.0
+    return float((booking.get("price_estimate") or {}).get("total_price", 0.0))
+
+
+def _bucket(booking: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "day": day_key(booking["created_at"]),
+        "service_type": _value(booking["service_type"]),
+        "status": _value(booking["status"]),
+    }
+
+
+def _rollup_id(bucket: Dict[str, str]) -> str:
+    return f"{bucket['day']}:{bucket['service_type']}:{bucket['status']}"
+
+
+async def ensure_indexes(db):
+    await db.booking_rollups.create_index("day")
+    await db.provider_rollups.create_index([("revenue", -1)])
+
+
+async def record_transition(db, before: Optional[Dict[str, Any]], after: Dict[str, Any]):
+    """Apply one booking change to the rollups.
+
+    ``before`` is the booking as it was (None for a new booking) and
+    ``after`` as it is now. Callers must only report a transition once, e.g.
+    by making the underlying update conditional on the previous state.
+    """
+    now = datetime.utcnow()
+    deltas = defaultdict(lambda: {"bookings": 0, "revenue": 0.0})
+    provider_deltas = defaultdict(lambda: defaultdict(int))
+    for booking, sign in ((before, -1), (after, 1)):
+        if booking is None:
+            continue
+        bucket = _bucket(booking)
+        revenue = booking_revenue(booking)
+        delta = deltas[_rollup_id(bucket)]
+        delta.update(bucket)
+        delta["bookings"] += sign
+        delta["revenue"] += sign * revenue
+        if booking.get("provider_id"):
+            provider = provider_deltas[booking["provider_id"]]
+            provider["bookings"] += sign
+            provider["revenue"] += sign * revenue
+            provider[f"by_status.{bucket['status']}"] += sign
+
+    operations = [
+        UpdateOne(
+            {"id": rollup_id},
+            {
+                "$inc": {"bookings": delta["bookings"], "revenue": delta["revenue"]},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {k: delta[k] for k in ("day", "service_type", "status")},
+            },
+            upsert=True,
+        )
+        for rollup_id, delta in deltas.items()
+        if delta["bookings"] or delta["revenue"]
+    ]
+    if operations:
+        await db.booking_rollups.bulk_write(operations, ordered=False)
+
+    provider_operations = [
+        UpdateOne(
+            {"id": provider_id},
+            {"$inc": {k: v for k, v in delta.items() if v}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for provider_id, delta in provider_deltas.items()
+        if any(delta.values())
+    ]
+    if provider_operations:
+        await db.provider_rollups.bulk_write(provider_operations, ordered=False)
+
+
+async def record_user_registered(db, role):
+    await db.analytics_counters.update_one(
+        {"id": "users"}, {"$inc": {f"by_role.{_value(role)}": 1}}, upsert=True
+    )
+
+
+async def dashboard_summary(db, start_day: date, end_day: date) -> Dict[str, Any]:
+    """Totals, per-status and per-service-type breakdowns and a daily series for a day range"""
+    start, end = start_day.isoformat(), end_day.isoformat()
+    rollups = await db.booking_rollups.find(
+        {"day": {"$gte": start, "$lte": end}}, {"_id": 0}
+    ).to_list(None)
+
+    by_status: Dict[str, int] = defaultdict(int)
+    by_service_type: Dict[str, Dict[str, float]] = defaultdict(lambda: {"bookings": 0, "revenue": 0.0})
+    daily: Dict[str, Dict[str, float]] = {}
+    for rollup in rollups:
+        if not rollup["bookings"] and not rollup["revenue"]:
+            continue  # every booking in the bucket moved on
+        by_status[rollup["status"]] += rollup["bookings"]
+        service = by_service_type[rollup["service_type"]]
+        service["bookings"] += rollup["bookings"]
+        service["revenue"] += rollup["revenue"]
+        day = daily.setdefault(rollup["day"], {"day": rollup["day"], "bookings": 0, "revenue": 0.0})
+        day["bookings"] += rollup["bookings"]
+        day["revenue"] += rollup["revenue"]
+
+    counters = await db.analytics_counters.find_one({"id": "users"}) or {}
+    users = {role: counters.get("by_role", {}).get(role, 0) for role in ROLES}
+    return {
+        "start_day": start,
+        "end_day": end,
+        "total_bookings": sum(by_status.values()),
+        "total_revenue": round(sum(day["revenue"] for day in daily.values()), 2),
+        "by_status": dict(by_status),
+        "by_service_type": {k: {**v, "revenue": round(v["revenue"], 2)} for k, v in by_service_type.items()},
+        "daily": [{**daily[day], "revenue": round(daily[day]["revenue"], 2)} for day in sorted(daily)],
+        "users": users,
+    }
+
+
+async def top_providers(db, limit: int = 10) -> List[Dict[str, Any]]:
+    return await db.provider_rollups.find({}, {"_id": 0}).sort("revenue", -1).limit(limit).to_list(limit)
+
+
+async def reconcile(db, batch_size: int = 1000) -> Dict[str, int]:
+    """Rebuild all rollups from ``bookings`` and ``users``.
+
+    Bookings are streamed in batches with only the fields the rollups need.
+    Transitions recorded while this runs can be overwritten; the next run
+    picks them up again.
+    """
+    started = datetime.utcnow()
+    rollups: Dict[str, Dict[str, Any]] = {}
+    providers: Dict[str, Dict[str, Any]] = {}
+    cursor = db.bookings.find(
+        {},
+        {"_id": 0, "created_at": 1, "service_type": 1, "status": 1, "payment_status": 1,
+         "price_estimate.total_price": 1, "provider_id": 1},
+    ).batch_size(batch_size)
+    scanned = 0
+    async for booking in cursor:
+        scanned += 1
+        bucket = _bucket(booking)
+        revenue = booking_revenue(booking)
+        rollup = rollups.setdefault(_rollup_id(bucket), {**bucket, "bookings": 0, "revenue": 0.0})
+        rollup["bookings"] += 1
+        rollup["revenue"] += revenue
+        if booking.get("provider_id"):
+            provider = providers.setdefault(
+                booking["provider_id"], {"bookings": 0, "revenue": 0.0, "by_status": defaultdict(int)}
+            )
+            provider["bookings"] += 1
+            provider["revenue"] += revenue
+            provider["by_status"][bucket["status"]] += 1
+
+    await db.booking_rollups.bulk_write(
+        [ReplaceOne({"id": k}, {"id": k, **v, "updated_at": started}, upsert=True) for k, v in rollups.items()]
+        + [DeleteMany({"updated_at": {"$lt": started}})],
+        ordered=True,
+    )
+    await db.provider_rollups.bulk_write(
+        [
+            ReplaceOne({"id": k}, {"id": k, **v, "by_status": dict(v["by_status"]), "updated_at": started}, upsert=True)
+            for k, v in providers.items()
+        ]
+        + [DeleteMany({"updated_at": {"$lt": started}})],
+        ordered=True,
+    )
+
+    by_role = {role: await db.users.count_documents({"role": role}) for role in ROLES}
+    await db.analytics_counters.replace_one({"id": "users"}, {"id": "users", "by_role": by_role}, upsert=True)
+
+    logging.info(f"Analytics reconciled: {scanned} bookings into {len(rollups)} rollups, {len(providers)} providers")
+    return {"bookings": scanned, "rollups": len(rollups), "providers": len(providers)}
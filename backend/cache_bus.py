@@ -0,0 +1,174 @@
+# Cross-worker cache invalidation for Domora
+# In-process caches subscribe to a collection and are told which document
+# changed (or None: drop everything for that collection). Changes made by any
+# worker or pod arrive through a MongoDB change stream. Standalone servers
+# without a replica set cannot open change streams, so the bus falls back to
+# polling ``updated_at`` and the sync tombstones (see sync.py) for deletions;
+# ensure_indexes gives every watched collection the index those polls need.
+#
+# Invalidations are idempotent: a cache may be told about the same change more
+# than once, but never misses one for longer than a poll interval.
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import metrics
+
+WATCHED = ("users", "provider_profiles", "service_packages", "service_addons")
+
+# Collections as named in sync tombstones
+TOMBSTONE_NAMES = {"packages": "service_packages", "addons": "service_addons"}
+
+# Writes can commit slightly out of updated_at order; polls look back this far
+POLL_OVERLAP = timedelta(seconds=1)
+
+Callback = Callable[[str, Optional[str]], None]
+
+invalidations = metrics.counter("cache_invalidations_total", "Cache invalidations broadcast, by collection and source")
+propagation_lag = metrics.histogram(
+    "cache_invalidation_lag_seconds", "Delay between a write and its invalidation reaching this worker"
+)
+bus_mode = metrics.gauge("cache_bus_mode", "1 for the active invalidation source (change_stream or poll)")
+
+
+class CacheBus:
+    def __init__(
+        self,
+        collections: Sequence[str] = WATCHED,
+        poll_interval: Optional[float] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.collections = tuple(collections)
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._subscribers: Dict[str, List[Callback]] = defaultdict(list)
+
+    def subscribe(self, collection: str, callback: Callback):
+        self._subscribers[collection].append(callback)
+
+    def publish(self, collection: str, doc_id: Optional[str] = None, changed_at: Optional[datetime] = None,
+                source: str = "local"):
+        """Invalidate ``doc_id`` (None: everything) in every cache subscribed to ``collection``"""
+        for callback in self._subscribers.get(collection, ()):
+            try:
+                callback(collection, doc_id)
+            except Exception as e:
+                logging.error(f"Cache invalidation for {collection} failed: {e}")
+        invalidations.inc(collection=collection, source=source)
+        if changed_at is not None:
+            propagation_lag.observe(max(0.0, (self._clock() - changed_at).total_seconds()), collection=collection)
+
+    async def ensure_indexes(self, db):
+        # Polls are range scans on updated_at; tombstones are covered by their deleted_at TTL index
+        for collection in self.collections:
+            await db[collection].create_index("updated_at")
+
+    def flush(self, source: str = "local"):
+        for collection in self.collections:
+            self.publish(collection, None, source=source)
+
+    async def run(self, db, mode: Optional[str] = None):
+        """Follow changes until cancelled; ``mode`` is auto, change_stream or poll (CACHE_BUS_MODE)"""
+        mode = mode or os.getenv("CACHE_BUS_MODE", "auto")
+        while True:
+            if mode in ("auto", "change_stream"):
+                try:
+                    await self.watch(db)
+                except OperationFailure as e:
+                    if mode == "change_stream":
+                        raise
+                    logging.info(f"Change streams unavailable ({e}), polling for cache invalidations")
+                    mode = "poll"
+                    continue
+                except PyMongoError as e:
+                    logging.warning(f"Cache invalidation stream interrupted: {e}")
+                    await asyncio.sleep(1)
+                    continue
+            else:
+                await self.poll(db)
+
+    async def watch(self, db):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": {"$in": list(self.collections)}},
+            {"operationType": {"$in": ["dropDatabase", "invalidate"]}},
+        ]}}]
+        async with db.watch(pipeline, full_document="updateLookup") as stream:
+            self._set_mode("change_stream")
+            # Anything may have changed while no stream was open
+            self.flush(source="change_stream")
+            async for change in stream:
+                self.apply_change(change)
+
+    def apply_change(self, change: dict):
+        collection = change.get("ns", {}).get("coll")
+        operation = change.get("operationType")
+        if collection not in self.collections:
+            if operation in ("dropDatabase", "invalidate"):
+                self.flush(source="change_stream")
+            return
+        document = change.get("fullDocument") or {}
+        # Deletes only carry the Mongo _id, not our id, so drop the collection
+        doc_id = document.get("id") if operation in ("insert", "update", "replace") else None
+        cluster_time = change.get("clusterTime")
+        changed_at = cluster_time.as_datetime().replace(tzinfo=None) if cluster_time else None
+        self.publish(collection, doc_id, changed_at, source="change_stream")
+
+    async def poll(self, db):
+        self._set_mode("poll")
+        interval = self.poll_interval or float(os.getenv("CACHE_BUS_POLL_SECONDS", 2))
+        cursors = {name: _PollCursor(self._clock()) for name in self.collections + ("sync_tombstones",)}
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll_once(db, cursors)
+            except PyMongoError as e:
+                logging.warning(f"Cache invalidation poll failed: {e}")
+
+    async def poll_once(self, db, cursors: Dict[str, "_PollCursor"]):
+        """Publish documents updated (or tombstoned) since the previous poll"""
+        for collection in self.collections:
+            cursor = cursors[collection]
+            changed = await db[collection].find(
+                {"updated_at": {"$gt": cursor.since - POLL_OVERLAP}}, {"_id": 0, "id": 1, "updated_at": 1}
+            ).to_list(None)
+            for document in changed:
+                if cursor.advance(document.get("id"), document["updated_at"]):
+                    self.publish(collection, document.get("id"), document["updated_at"], source="poll")
+
+        cursor = cursors["sync_tombstones"]
+        deleted = await db.sync_tombstones.find(
+            {"deleted_at": {"$gt": cursor.since - POLL_OVERLAP}}, {"_id": 0}
+        ).to_list(None)
+        for tombstone in deleted:
+            collection = TOMBSTONE_NAMES.get(tombstone["collection"], tombstone["collection"])
+            fresh = cursor.advance((collection, tombstone["doc_id"]), tombstone["deleted_at"])
+            if fresh and collection in self.collections:
+                self.publish(collection, tombstone["doc_id"], tombstone["deleted_at"], source="poll")
+
+    def _set_mode(self, mode: str):
+        for name in ("change_stream", "poll"):
+            bus_mode.set(1 if name == mode else 0, mode=name)
+
+
+class _PollCursor:
+    """Newest change seen, plus the changes inside the overlap window already published"""
+
+    def __init__(self, since: datetime):
+        self.since = since
+        self._seen: Dict[object, datetime] = {}
+
+    def advance(self, key, changed_at: datetime) -> bool:
+        if self._seen.get(key) == changed_at:
+            return False
+        self._seen[key] = changed_at
+        if changed_at > self.since:
+            self.since = changed_at
+            horizon = self.since - POLL_OVERLAP
+            self._seen = {k: at for k, at in self._seen.items() if at > horizon}
+        return True
@@ -0,0 +1,149 @@
+# Circuit breakers for Domora's calls to external services
+# Each dependency (Google Maps, Stripe) gets one breaker per worker. It
+# remembers the outcome and latency of the last WINDOW calls; when too many of
+# them failed or were slow, the breaker opens and calls fail immediately with
+# CircuitOpen, so callers can use their fallback without waiting on a degraded
+# service. After OPEN_SECONDS it lets a probe call through (half-open): a
+# success closes it again, a failure reopens it.
+#
+# Calls are also bounded by an adaptive timeout: a multiple of the recent
+# 95th percentile latency, clamped to [min_timeout, max_timeout]. Until the
+# window has enough samples the timeout is max_timeout. Timeouts count as
+# failures.
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+state_gauge = metrics.gauge("circuit_breaker_state", "Breaker state per dependency: 0 closed, 1 half-open, 2 open")
+timeout_gauge = metrics.gauge("circuit_breaker_timeout_seconds", "Current adaptive timeout per dependency")
+calls = metrics.counter("circuit_breaker_calls_total", "Calls through a circuit breaker, by dependency and result")
+latency = metrics.histogram("circuit_breaker_call_seconds", "Latency of calls through a circuit breaker")
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 10.0,
+        timeout_multiplier: float = 4.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds if slow_call_seconds is not None else max_timeout / 2
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self._clock = clock
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window)  # (succeeded, seconds)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def timeout(self) -> float:
+        latencies = sorted(seconds for ok, seconds in self._outcomes if ok)
+        if len(latencies) < self.min_calls:
+            return self.max_timeout
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn()`` under the breaker; raises CircuitOpen instead of calling while open"""
+        probe = self._admit()
+        timeout = self.timeout
+        started = self._clock()
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            self._record(False, timeout, probe, "timeout")
+            raise
+        except asyncio.CancelledError:
+            if probe:
+                self._probing = False
+            raise
+        except Exception:
+            self._record(False, self._clock() - started, probe, "error")
+            raise
+        self._record(True, self._clock() - started, probe, "ok")
+        return result
+
+    def _admit(self) -> bool:
+        """Whether the call is the half-open probe; raises when it may not run at all"""
+        state = self.state
+        if state == CLOSED:
+            return False
+        self._publish()
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        calls.inc(dependency=self.name, result="rejected")
+        retry_after = max(0.0, self._opened_at + self.open_seconds - self._clock())
+        raise CircuitOpen(self.name, retry_after)
+
+    def _record(self, ok: bool, seconds: float, probe: bool, result: str):
+        calls.inc(dependency=self.name, result=result)
+        latency.observe(seconds, dependency=self.name)
+        if probe:
+            self._probing = False
+            if ok:
+                self._outcomes.clear()
+                self._state = CLOSED
+            else:
+                self._trip()
+        elif self._state == CLOSED:
+            self._outcomes.append((ok, seconds))
+            if self._should_trip():
+                self._trip()
+        self._publish()
+
+    def _should_trip(self) -> bool:
+        total = len(self._outcomes)
+        if total < self.min_calls:
+            return False
+        failures = sum(1 for ok, _ in self._outcomes if not ok)
+        slow = sum(1 for ok, seconds in self._outcomes if ok and seconds >= self.slow_call_seconds)
+        return failures / total >= self.failure_rate or slow / total >= self.slow_call_rate
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+
+    def _publish(self):
+        state_gauge.set(_STATE_VALUES[self.state], dependency=self.name)
+        timeout_gauge.set(self.timeout, dependency=self.name)
@@ -0,0 +1,106 @@
+# Rolling booking demand for Domora surge pricing
+# Counts bookings per (service_type, city) in hourly slots over a rolling
+# window. Each key owns a fixed-size ring of slot counters plus a running
+# total, so recording a booking and reading the current demand are both O(1)
+# and pricing never aggregates bookings on the request path. Every worker
+# keeps its own index: it is warmed from recent bookings at startup and then
+# follows the bookings that worker creates.
+
+import logging
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+
+def _key(service_type, city: Optional[str]) -> Tuple[str, str]:
+    service_type = getattr(service_type, "value", service_type)
+    return str(service_type), " ".join((city or "").split()).casefold()
+
+
+class _SlotRing:
+    __slots__ = ("counts", "head", "total")
+
+    def __init__(self, window: int, slot: int):
+        self.counts = array("I", bytes(4 * window))
+        self.head = slot  # newest slot number held in the ring
+        self.total = 0
+
+    def advance(self, slot: int):
+        """Move the ring forward to ``slot``, dropping counts that left the window"""
+        window = len(self.counts)
+        if slot <= self.head:
+            return
+        if slot - self.head >= window:
+            self.counts = array("I", bytes(4 * window))
+            self.total = 0
+        else:
+            for expired in range(self.head + 1, slot + 1):
+                position = expired % window
+                self.total -= self.counts[position]
+                self.counts[position] = 0
+        self.head = slot
+
+
+class DemandIndex:
+    """Bookings per (service_type, city) over the last ``window_hours`` hours"""
+
+    def __init__(self, window_hours: int = 24, slot_seconds: int = 3600, clock: Callable[[], float] = time.time):
+        self.window = window_hours * 3600 // slot_seconds
+        self.slot_seconds = slot_seconds
+        self.clock = clock
+        self._rings: Dict[Tuple[str, str], _SlotRing] = {}
+
+    def _slot(self, when: Optional[datetime]) -> int:
+        if when is None:
+            timestamp = self.clock()
+        else:
+            # Bookings store naive UTC datetimes
+            timestamp = (when if when.tzinfo else when.replace(tzinfo=timezone.utc)).timestamp()
+        return int(timestamp // self.slot_seconds)
+
+    def record(self, service_type: str, city: Optional[str], when: Optional[datetime] = None):
+        """Count one booking; ``when`` defaults to now"""
+        key = _key(service_type, city)
+        now_slot = self._slot(None)
+        slot = min(self._slot(when), now_slot)
+        if slot <= now_slot - self.window:
+            return
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = _SlotRing(self.window, now_slot)
+        ring.advance(now_slot)
+        ring.counts[slot % self.window] += 1
+        ring.total += 1
+
+    def count(self, service_type: str, city: Optional[str]) -> int:
+        """Bookings in the rolling window for this service type and city"""
+        ring = self._rings.get(_key(service_type, city))
+        if ring is None:
+            return 0
+        ring.advance(self._slot(None))
+        return ring.total
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    async def warm(self, db, batch_size: int = 1000) -> int:
+        """Rebuild the index from bookings created within the window.
+
+        The rebuilt rings replace the current ones in a single assignment, so
+        quotes served while the query runs keep reading the previous counts.
+        """
+        window_start = (self._slot(None) - self.window + 1) * self.slot_seconds
+        since = datetime.fromtimestamp(window_start, timezone.utc).replace(tzinfo=None)
+        cursor = db.bookings.find(
+            {"created_at": {"$gte": since}},
+            {"_id": 0, "service_type": 1, "service_address.city": 1, "created_at": 1},
+        ).batch_size(batch_size)
+        rebuilt = DemandIndex(self.window * self.slot_seconds // 3600, self.slot_seconds, self.clock)
+        recorded = 0
+        async for booking in cursor:
+            rebuilt.record(booking["service_type"], booking.get("service_address", {}).get("city"), booking["created_at"])
+            recorded += 1
+        self._rings = rebuilt._rings
+        logging.info(f"Demand index warmed from {recorded} bookings in {len(self._rings)} service areas")
+        return recorded
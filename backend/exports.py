@@ -0,0 +1,119 @@
+# Streaming booking exports for Domora
+# Bookings are read with a keyset-paginated cursor ordered by (created_at, id)
+# and written out one batch at a time as NDJSON or CSV, so memory use does not
+# grow with the size of the export. Every row carries an opaque cursor token:
+# passing the last token received back as ``cursor`` resumes the export right
+# after that row.
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING
+
+SORT = [("created_at", ASCENDING), ("id", ASCENDING)]
+
+CSV_COLUMNS = (
+    "id", "customer_id", "provider_id", "service_type", "package_id", "addon_ids",
+    "street", "city", "postal_code", "country", "scheduled_datetime", "status", "payment_status",
+    "base_price", "addons_price", "travel_fee", "total_price", "currency", "notes",
+    "created_at", "updated_at", "cursor",
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+async def ensure_indexes(db):
+    await db.bookings.create_index(SORT)
+
+
+def encode_cursor(booking: Dict[str, Any]) -> str:
+    position = {"c": booking["created_at"].isoformat(), "i": booking["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return {"created_at": datetime.fromisoformat(position["c"]), "id": str(position["i"])}
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid export cursor: {e}") from e
+
+
+def keyset_query(base_query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """``base_query`` restricted to bookings after the cursor position"""
+    if not cursor:
+        return base_query
+    position = decode_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$gt": position["created_at"]}},
+        {"created_at": position["created_at"], "id": {"$gt": position["id"]}},
+    ]}
+    return {"$and": [base_query, after]} if base_query else after
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, "value", value)
+
+
+def ndjson_row(booking: Dict[str, Any], cursor: str) -> str:
+    return json.dumps({**booking, "cursor": cursor}, default=_plain, separators=(",", ":")) + "\n"
+
+
+def csv_row(booking: Dict[str, Any], cursor: str) -> list:
+    address = booking.get("service_address") or {}
+    estimate = booking.get("price_estimate") or {}
+    values = {
+        **booking,
+        "addon_ids": ";".join(booking.get("addon_ids") or []),
+        **{k: address.get(k) for k in ("street", "city", "postal_code", "country")},
+        **{k: estimate.get(k) for k in ("base_price", "addons_price", "travel_fee", "total_price", "currency")},
+        "cursor": cursor,
+    }
+    return ["" if values.get(column) is None else _plain(values[column]) for column in CSV_COLUMNS]
+
+
+async def stream_bookings(
+    db,
+    query: Dict[str, Any],
+    export_format: str,
+    cursor: Optional[str] = None,
+    batch_size: int = 500,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the export one encoded batch at a time, stopping if the client goes away"""
+    documents = db.bookings.find(keyset_query(query, cursor), {"_id": 0}).sort(SORT).batch_size(batch_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(CSV_COLUMNS)
+
+    pending = 0
+    try:
+        async for booking in documents:
+            token = encode_cursor(booking)
+            if writer:
+                writer.writerow(csv_row(booking, token))
+            else:
+                buffer.write(ndjson_row(booking, token))
+            pending += 1
+            if pending >= batch_size:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+                if is_disconnected and await is_disconnected():
+                    return
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    finally:
+        await documents.close()
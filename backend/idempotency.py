@@ -0,0 +1,165 @@
+# Idempotency-Key handling for Domora's retried POST requests
+# Mobile clients retry requests whose response they never saw. When a request
+# carries an Idempotency-Key header, the first one to arrive claims the key in
+# the idempotency_keys collection and does the work; its response is stored
+# with a fingerprint of the request and replayed for every retry until the key
+# expires (a TTL index removes it).
+#
+# Duplicates that arrive while the first request is still running wait for
+# it instead of repeating the work: on the same worker they share its
+# single-flight attempt, on other workers they poll the stored record. A retry
+# with the same key but a different body is rejected with 422.
+#
+# Client errors (4xx) are stored and replayed like successes. Server errors
+# release the key, so the client's next retry runs the request again.
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+from singleflight import SingleFlight
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+KEY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24)))
+# How long a claimed key may stay in progress before another worker takes over
+LOCK_TIMEOUT = timedelta(seconds=int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60)))
+# How long a duplicate waits for the original request before giving up with 409
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+POLL_INTERVAL = 0.1
+
+IN_PROGRESS, COMPLETED = "in_progress", "completed"
+
+requests = metrics.counter("idempotency_requests_total", "Requests with an Idempotency-Key, by outcome")
+
+_in_flight = SingleFlight("idempotency")
+
+
+async def ensure_indexes(db):
+    await db.idempotency_keys.create_index("id", unique=True)
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def fingerprint(request: Request) -> str:
+    digest = hashlib.sha256()
+    for part in (request.method, request.url.path, request.url.query):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(await request.body())
+    return digest.hexdigest()
+
+
+async def _claim(db, record_id: str, request_fingerprint: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            "id": record_id,
+            "fingerprint": request_fingerprint,
+            "status": IN_PROGRESS,
+            "locked_until": now + LOCK_TIMEOUT,
+            "created_at": now,
+            "expires_at": now + KEY_TTL,
+        })
+        return True
+    except DuplicateKeyError:
+        # Take over a key whose worker died mid-request
+        result = await db.idempotency_keys.update_one(
+            {"id": record_id, "fingerprint": request_fingerprint, "status": IN_PROGRESS,
+             "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + LOCK_TIMEOUT}}
+        )
+        return result.modified_count == 1
+
+
+async def _complete(db, record_id: str, status_code: int, body: Any):
+    await db.idempotency_keys.update_one(
+        {"id": record_id},
+        {"$set": {
+            "status": COMPLETED,
+            "status_code": status_code,
+            "body": jsonable_encoder(body),
+            "expires_at": datetime.utcnow() + KEY_TTL,
+        }}
+    )
+
+
+async def _attempt(db, record_id: str, request_fingerprint: str,
+                   work: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    """Replay the stored outcome for ``record_id``, or claim the key and run ``work``"""
+    deadline = asyncio.get_running_loop().time() + WAIT_SECONDS
+    while True:
+        record = await db.idempotency_keys.find_one({"id": record_id}, {"_id": 0})
+        if record is not None and record["fingerprint"] != request_fingerprint:
+            requests.inc(outcome="mismatch")
+            raise HTTPException(status_code=422, detail=f"{HEADER} was already used for a different request")
+        if record is not None and record["status"] == COMPLETED:
+            requests.inc(outcome="replayed")
+            return {"status_code": record["status_code"], "body": record["body"], "replayed": True}
+        if await _claim(db, record_id, request_fingerprint):
+            break
+
+        # Another worker is running the request
+        if asyncio.get_running_loop().time() >= deadline:
+            requests.inc(outcome="conflict")
+            raise HTTPException(
+                status_code=409, detail="A request with this Idempotency-Key is still being processed",
+                headers={"Retry-After": "1"}
+            )
+        await asyncio.sleep(POLL_INTERVAL)
+
+    requests.inc(outcome="executed")
+    try:
+        result = await work()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            await db.idempotency_keys.delete_one({"id": record_id})
+            raise
+        await _complete(db, record_id, e.status_code, {"detail": e.detail})
+        return {"status_code": e.status_code, "body": {"detail": e.detail}, "replayed": False}
+    except BaseException:
+        await db.idempotency_keys.delete_one({"id": record_id})
+        raise
+    await _complete(db, record_id, 200, result)
+    return {"status_code": 200, "body": result, "replayed": False}
+
+
+async def run(db, request: Request, response: Response, scope: str, key: Optional[str],
+              work: Callable[[], Awaitable[Any]]) -> Any:
+    """Run ``work`` once per ``key`` within ``scope``; retries get the stored response"""
+    if key is None:
+        return await work()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+
+    record_id = f"{scope}:{key}"
+    request_fingerprint = await fingerprint(request)
+    ran = False
+
+    async def attempt():
+        nonlocal ran
+        ran = True
+        return await _attempt(db, record_id, request_fingerprint, work)
+
+    # Duplicates in flight on this worker share the first request's attempt
+    outcome = await _in_flight.do((record_id, request_fingerprint), attempt)
+    if not ran:
+        requests.inc(outcome="coalesced")
+    replayed = outcome["replayed"] or not ran
+
+    if outcome["status_code"] >= 400:
+        raise HTTPException(
+            status_code=outcome["status_code"], detail=outcome["body"].get("detail"),
+            headers={REPLAYED_HEADER: "true"} if replayed else None
+        )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return outcome["body"]
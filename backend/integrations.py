@@ -0,0 +1,92 @@
+# Lazily constructed third-party integrations for Domora
+# Heavy SDKs (googlemaps, emergentintegrations/Stripe, smtplib + MIME, passlib
+# bcrypt) are imported and built on first use instead of at process start, so
+# a fresh worker can answer its first request sooner and a missing API key only
+# affects the endpoints that need it.
+
+import os
+import threading
+import types
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LazyIntegration(Generic[T]):
+    """Build a value with ``factory`` on first ``get()`` and reuse it afterwards"""
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> T:
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def override(self, value: Optional[T]):
+        """Replace the integration (tests, benchmarks); ``None`` restores lazy loading"""
+        with self._lock:
+            self._value = value
+
+
+def _build_gmaps():
+    import googlemaps
+    return googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+
+
+def _load_stripe():
+    from emergentintegrations.payments.stripe import checkout
+    return checkout
+
+
+def _load_smtp():
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    return types.SimpleNamespace(SMTP=smtplib.SMTP, MIMEText=MIMEText, MIMEMultipart=MIMEMultipart)
+
+
+def _build_push_client():
+    import httpx
+    return httpx.AsyncClient(base_url=os.getenv("EXPO_PUSH_URL", "https://exp.host"), timeout=10)
+
+
+def _build_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Google Maps client (geocoding, distance matrix)
+gmaps = LazyIntegration("google_maps", _build_gmaps)
+
+# emergentintegrations' Stripe checkout module (StripeCheckout, CheckoutSessionRequest, ...)
+stripe = LazyIntegration("stripe", _load_stripe)
+
+# smtplib.SMTP plus the MIME classes used to build messages
+smtp = LazyIntegration("smtp", _load_smtp)
+
+# HTTP client for the Expo push notification service
+push = LazyIntegration("expo_push", _build_push_client)
+
+# Password hashing
+pwd_context = LazyIntegration("passlib", _build_pwd_context)
+
+
+def loaded_integrations() -> dict:
+    return {integration.name: integration.loaded for integration in (gmaps, stripe, smtp, push, pwd_context)}
+
+
+def stripe_checkout(webhook_url: str = "") -> Any:
+    """Create a StripeCheckout client for the configured secret key"""
+    return stripe.get().StripeCheckout(api_key=os.getenv("STRIPE_SECRET_KEY"), webhook_url=webhook_url)
@@ -0,0 +1,124 @@
+# Booking chat storage for Domora
+# Each booking has one chat thread (thread id == booking id). Messages are not
+# stored one document per message: they are appended to bucket documents of
+# up to BUCKET_SIZE messages per thread and UTC day, so reading a page of
+# history touches a handful of documents. Every message gets a per-thread
+# sequence number from the thread document's ``last_seq`` counter.
+#
+# Each participant's read position is a watermark (``read_seq.<user_id>``) on
+# the thread, so an unread count is ``last_seq - read_seq`` and listing unread
+# counts reads one document per thread, never the messages themselves.
+
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", 200))
+MAX_PAGE = 100
+
+
+async def ensure_indexes(db):
+    await db.message_threads.create_index("id", unique=True)
+    await db.message_threads.create_index([("participants", ASCENDING), ("last_message_at", DESCENDING)])
+    await db.message_buckets.create_index([("thread_id", ASCENDING), ("first_seq", DESCENDING)])
+    await db.message_buckets.create_index([("thread_id", ASCENDING), ("day", ASCENDING), ("count", ASCENDING)])
+
+
+async def post_message(db, thread_id: str, sender_id: str, text: str,
+                       participants: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Append a message to the thread, creating the thread on first use; returns the message and thread"""
+    now = datetime.utcnow()
+    thread = await db.message_threads.find_one_and_update(
+        {"id": thread_id},
+        {
+            "$inc": {"last_seq": 1},
+            "$set": {"last_message_at": now, "last_message": text[:140], "updated_at": now},
+            "$addToSet": {"participants": {"$each": [p for p in participants if p]}},
+            "$setOnInsert": {"created_at": now},
+        },
+        projection={"_id": 0, "read_seq": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    seq = thread["last_seq"]
+    message = {"id": str(uuid.uuid4()), "seq": seq, "sender_id": sender_id, "text": text, "created_at": now}
+
+    # A full bucket no longer matches the filter, so the upsert starts a new one
+    await db.message_buckets.update_one(
+        {"thread_id": thread_id, "day": now.strftime("%Y-%m-%d"), "count": {"$lt": BUCKET_SIZE}},
+        {
+            "$push": {"messages": message},
+            "$inc": {"count": 1},
+            "$min": {"first_seq": seq},
+            "$max": {"last_seq": seq},
+        },
+        upsert=True,
+    )
+    # Senders have read their own messages
+    await mark_read(db, thread_id, sender_id, seq)
+    return {**message, "thread_id": thread_id}, thread
+
+
+async def history(db, thread_id: str, before: Optional[int] = None,
+                  limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Messages older than sequence ``before``, newest first, and the cursor for the next page"""
+    limit = max(1, min(limit, MAX_PAGE))
+    query: Dict[str, Any] = {"thread_id": thread_id}
+    if before is not None:
+        query["first_seq"] = {"$lt": before}
+
+    collected: List[Dict[str, Any]] = []
+    buckets = db.message_buckets.find(query, {"_id": 0, "messages": 1, "last_seq": 1}).sort("first_seq", DESCENDING)
+    async for bucket in buckets:
+        # Buckets started concurrently can overlap, so only stop once no
+        # remaining bucket can hold a message newer than the page's oldest
+        if len(collected) >= limit and bucket["last_seq"] < collected[limit - 1]["seq"]:
+            break
+        collected.extend(m for m in bucket["messages"] if before is None or m["seq"] < before)
+        collected.sort(key=lambda m: m["seq"], reverse=True)
+    await buckets.close()
+
+    page = collected[:limit]
+    # Sequence numbers start at 1 with no gaps, so older messages exist iff
+    # the oldest one on this page is not the first
+    return page, page[-1]["seq"] if page and page[-1]["seq"] > 1 else None
+
+
+async def mark_read(db, thread_id: str, user_id: str, seq: int) -> int:
+    """Move ``user_id``'s read watermark forward to ``seq``; it never moves back"""
+    thread = await db.message_threads.find_one({"id": thread_id}, {"_id": 0, "last_seq": 1})
+    if not thread:
+        return 0
+    seq = max(0, min(seq, thread["last_seq"]))
+    thread = await db.message_threads.find_one_and_update(
+        {"id": thread_id},
+        {"$max": {f"read_seq.{user_id}": seq}},
+        projection={"_id": 0, "read_seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return thread["read_seq"][user_id]
+
+
+def unread(thread: Dict[str, Any], user_id: str) -> int:
+    return max(0, thread.get("last_seq", 0) - (thread.get("read_seq") or {}).get(user_id, 0))
+
+
+async def threads_for(db, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """The user's threads, most recently active first, with unread counts"""
+    threads = await db.message_threads.find(
+        {"participants": user_id},
+        {"_id": 0, "id": 1, "last_seq": 1, "last_message": 1, "last_message_at": 1, f"read_seq.{user_id}": 1},
+    ).sort("last_message_at", DESCENDING).to_list(limit)
+    return [
+        {
+            "thread_id": thread["id"],
+            "last_seq": thread["last_seq"],
+            "last_message": thread.get("last_message"),
+            "last_message_at": thread.get("last_message_at"),
+            "unread": unread(thread, user_id),
+        }
+        for thread in threads
+    ]
@@ -0,0 +1,133 @@
+# MongoDB client configuration for Domora
+# Connection pool sizing, timeouts, wire compression and read routing are
+# read from the environment. An option already set in MONGO_URL's query
+# string wins over both the environment and the defaults here.
+#
+# PoolMetrics is a pymongo ConnectionPoolListener. It records how long each
+# checkout waited for a connection and how many connections are open and in
+# use, which is what sizing MONGO_MAX_POOL_SIZE needs.
+
+import importlib.util
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from pymongo import monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+import metrics
+
+# Environment variable -> (client option, parser, default or None for the driver's own)
+_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int, 100),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int, None),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", int, None),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int, None),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int, 5000),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int, 5000),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int, 5000),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int, None),
+}
+
+# Compressor -> module it needs; zlib ships with Python
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+pool_wait = metrics.histogram(
+    "mongo_pool_wait_seconds", "Time spent waiting to check out a pooled connection",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+checkout_failures = metrics.counter("mongo_pool_checkout_failures_total", "Failed connection checkouts, by reason")
+connections_open = metrics.gauge("mongo_pool_connections", "Open pooled connections, by server")
+connections_in_use = metrics.gauge("mongo_pool_connections_in_use", "Checked out connections, by server")
+
+
+def available_compressors(requested: List[str]) -> List[str]:
+    available = []
+    for name in requested:
+        module = _COMPRESSOR_MODULES.get(name)
+        if name not in _COMPRESSOR_MODULES or (module and importlib.util.find_spec(module) is None):
+            logging.info(f"MongoDB compressor {name!r} is not available, skipping it")
+            continue
+        available.append(name)
+    return available
+
+
+def client_options(mongo_url: str) -> Dict[str, Any]:
+    """Keyword arguments for the Motor client, without options already in ``mongo_url``"""
+    in_url = {name.lower() for name in parse_qs(urlsplit(mongo_url).query)}
+    options: Dict[str, Any] = {}
+    for env_name, (option, parse, default) in _OPTIONS.items():
+        value = os.getenv(env_name)
+        value = parse(value) if value else default
+        if value is not None and option.lower() not in in_url:
+            options[option] = value
+
+    compressors = available_compressors(
+        [c.strip() for c in os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib").split(",") if c.strip()]
+    )
+    if compressors and "compressors" not in in_url:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def read_heavy_preference():
+    """Read preference for queries that tolerate replication lag (MONGO_READ_HEAVY_PREFERENCE)"""
+    mode = os.getenv("MONGO_READ_HEAVY_PREFERENCE", "secondaryPreferred")
+    max_staleness = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", -1))
+    return make_read_preference(read_pref_mode_from_name(mode), None, max_staleness=max_staleness)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Exports pool waits and connection counts; register with ``event_listeners=[PoolMetrics()]``"""
+
+    def __init__(self):
+        # Checkouts start and finish on the same driver thread
+        self._checkout_started = threading.local()
+
+    def _server(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.at = time.perf_counter()
+
+    def _waited(self):
+        started = getattr(self._checkout_started, "at", None)
+        if started is not None:
+            pool_wait.observe(time.perf_counter() - started)
+            self._checkout_started.at = None
+
+    def connection_checked_out(self, event):
+        self._waited()
+        connections_in_use.inc(server=self._server(event))
+
+    def connection_check_out_failed(self, event):
+        self._waited()
+        checkout_failures.inc(reason=str(event.reason))
+
+    def connection_checked_in(self, event):
+        connections_in_use.inc(-1, server=self._server(event))
+
+    def connection_created(self, event):
+        connections_open.inc(server=self._server(event))
+
+    def connection_closed(self, event):
+        connections_open.inc(-1, server=self._server(event))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
@@ -0,0 +1,191 @@
+# Transactional outbox for Domora's notifications and side effects
+# Requests never call SMTP or push services themselves. They write an outbox
+# message next to the state change it announces, inside one transaction, and
+# return. The OutboxDispatcher drains pending messages in batches, with a
+# concurrency limit per channel, exponential backoff between attempts and a
+# dead letter status once a message has failed MAX_ATTEMPTS times.
+#
+# Transactions need a replica set. On a standalone server ``atomically`` runs
+# the same writes sequentially, state change first, so a crash in between can
+# lose a notification but never announce a change that did not happen.
+
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import OperationFailure
+
+import metrics
+
+T = TypeVar("T")
+Sender = Callable[[Dict[str, Any]], Awaitable[None]]
+
+PENDING, SENDING, SENT, DEAD = "pending", "sending", "sent", "dead"
+
+# "Transaction numbers are only allowed on a replica set member or mongos"
+_NO_TRANSACTIONS = (20, 263)
+_transactions_supported: Optional[bool] = None
+
+outcomes = metrics.counter("outbox_deliveries_total", "Outbox delivery attempts, by channel and result")
+backlog = metrics.gauge("outbox_batch_size", "Messages claimed by the last dispatcher batch")
+
+
+async def ensure_indexes(db):
+    await db.outbox.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+    await db.outbox.create_index("id", unique=True)
+
+
+async def atomically(db, work: Callable[[Any], Awaitable[T]]) -> T:
+    """Run ``work(session)`` in a transaction, or with ``session=None`` where transactions are unavailable"""
+    global _transactions_supported
+    client = getattr(db, "client", None)
+    if client is None or _transactions_supported is False:
+        return await work(None)
+    try:
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                result = await work(session)
+        _transactions_supported = True
+        return result
+    except OperationFailure as e:
+        if e.code not in _NO_TRANSACTIONS:
+            raise
+        logging.info("MongoDB transactions unavailable, writing outbox messages sequentially")
+        _transactions_supported = False
+        return await work(None)
+
+
+async def enqueue(db, channel: str, payload: Dict[str, Any], session=None, message_id: Optional[str] = None) -> str:
+    """Queue a message; a repeated ``message_id`` is ignored, so retried work queues it once"""
+    now = datetime.utcnow()
+    message = {
+        "channel": channel,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if message_id is None:
+        message_id = str(uuid.uuid4())
+        await db.outbox.insert_one({"id": message_id, **message}, session=session)
+    else:
+        # An upsert rather than catching DuplicateKeyError, which would abort the caller's transaction
+        await db.outbox.update_one({"id": message_id}, {"$setOnInsert": message}, upsert=True, session=session)
+    return message_id
+
+
+class OutboxDispatcher:
+    def __init__(
+        self,
+        db,
+        senders: Dict[str, Sender],
+        concurrency: Optional[Dict[str, int]] = None,
+        batch_size: int = 50,
+        max_attempts: Optional[int] = None,
+        poll_interval: float = 1.0,
+        lease: timedelta = timedelta(minutes=5),
+        base_delay: float = 5.0,
+        max_delay: float = 3600.0,
+    ):
+        self.db = db
+        self.senders = senders
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.worker_id = str(uuid.uuid4())
+        self._limits = {
+            channel: asyncio.Semaphore((concurrency or {}).get(channel, 4)) for channel in senders
+        }
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Start the next batch now instead of after the poll interval"""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception as e:
+                logging.error(f"Outbox dispatch failed: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """Claim and deliver one batch; returns how many messages were claimed"""
+        batch = await self.claim()
+        backlog.set(len(batch))
+        await asyncio.gather(*(self.deliver(message) for message in batch))
+        return len(batch)
+
+    async def claim(self) -> List[Dict[str, Any]]:
+        # Messages left "sending" by a crashed worker are retried once their lease runs out
+        now = datetime.utcnow()
+        due = {"$or": [
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": SENDING, "locked_until": {"$lte": now}},
+        ]}
+        claimed = []
+        for _ in range(self.batch_size):
+            message = await self.db.outbox.find_one_and_update(
+                due,
+                {"$set": {"status": SENDING, "locked_by": self.worker_id, "locked_until": now + self.lease}},
+                sort=[("next_attempt_at", ASCENDING)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if message is None:
+                break
+            claimed.append(message)
+        return claimed
+
+    async def deliver(self, message: Dict[str, Any]):
+        channel = message["channel"]
+        sender = self.senders.get(channel)
+        if sender is None:
+            await self._finish(message, DEAD, error=f"No sender for channel {channel!r}")
+            return
+        async with self._limits[channel]:
+            try:
+                await sender(message["payload"])
+            except Exception as e:
+                attempts = message["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    logging.error(f"Outbox message {message['id']} dead-lettered after {attempts} attempts: {e}")
+                    await self._finish(message, DEAD, error=str(e), attempts=attempts)
+                else:
+                    await self._finish(message, PENDING, error=str(e), attempts=attempts)
+                return
+        await self._finish(message, SENT)
+
+    async def _finish(self, message: Dict[str, Any], status: str, error: Optional[str] = None,
+                      attempts: Optional[int] = None):
+        now = datetime.utcnow()
+        changes: Dict[str, Any] = {"status": status, "updated_at": now, "locked_until": None}
+        if attempts is not None:
+            changes["attempts"] = attempts
+        if error is not None:
+            changes["last_error"] = error
+        if status == PENDING:
+            delay = min(self.max_delay, self.base_delay * 2 ** (changes["attempts"] - 1))
+            changes["next_attempt_at"] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        elif status == SENT:
+            changes["sent_at"] = now
+        # Only the worker holding the lease may settle the message
+        await self.db.outbox.update_one({"id": message["id"], "locked_by": self.worker_id}, {"$set": changes})
+        outcomes.inc(channel=message["channel"], result="retry" if status == PENDING else status)
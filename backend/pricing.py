@@ -0,0 +1,345 @@
+# Pricing for Domora: compiled rule sets and vectorized batch quotes
+# Pricing rules (travel fee bands, per-service-type surcharges, weekend,
+# emergency and demand surge multipliers) are parsed and validated once into
+# immutable PricingRules objects and swapped atomically on reload, so
+# evaluating an estimate only does arithmetic. Batch quotes compute every
+# provider distance in a single NumPy haversine pass and band the whole
+# distance array at once.
+
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lon2 = np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class PriceComponents(NamedTuple):
+    base_price: float
+    addons_price: float
+    travel_fee: float
+    service_surcharge: float
+    weekend_surcharge: float
+    emergency_surcharge: float
+    demand_surcharge: float
+    total_price: float
+
+
+@dataclass(frozen=True, eq=False)
+class PricingRules:
+    """A compiled, read-only rule set; build with ``compile_rules``"""
+
+    version: str
+    band_starts: Tuple[float, ...]  # distance (km) where each travel band begins
+    band_rates: Tuple[float, ...]  # fee per km inside each band
+    band_base_fees: Tuple[float, ...]  # fee accumulated before each band begins
+    service_type_surcharges: Mapping[str, float]
+    weekend_multiplier: float
+    emergency_multiplier: float
+    emergency_pattern: Optional[re.Pattern]
+    surge_baseline: int  # bookings per demand window priced without surge
+    surge_step: float  # multiplier added per booking above the baseline
+    surge_max_multiplier: float
+    band_starts_array: np.ndarray
+    band_rates_array: np.ndarray
+    band_base_fees_array: np.ndarray
+
+    def travel_fee(self, distance_km):
+        """Banded travel fee; accepts a float or a NumPy array of distances"""
+        if isinstance(distance_km, np.ndarray):
+            distances = np.maximum(distance_km, 0.0)
+            band = np.searchsorted(self.band_starts_array, distances, side="right") - 1
+            return self.band_base_fees_array[band] + (distances - self.band_starts_array[band]) * self.band_rates_array[band]
+        distance_km = max(float(distance_km), 0.0)
+        band = bisect.bisect_right(self.band_starts, distance_km) - 1
+        return self.band_base_fees[band] + (distance_km - self.band_starts[band]) * self.band_rates[band]
+
+    def is_emergency(self, package_name: str) -> bool:
+        return self.emergency_pattern is not None and self.emergency_pattern.search(package_name) is not None
+
+    def surge_multiplier(self, demand: int) -> float:
+        """Multiplier for ``demand`` recent bookings in the same service type and city"""
+        if demand <= self.surge_baseline:
+            return 1.0
+        return min(1.0 + (demand - self.surge_baseline) * self.surge_step, self.surge_max_multiplier)
+
+    def evaluate(
+        self,
+        base_price: float,
+        addons_price: float,
+        travel_fee: float,
+        service_type: str,
+        package_name: str,
+        scheduled_datetime: Optional[datetime] = None,
+        demand: int = 0,
+    ) -> PriceComponents:
+        """Apply surcharges and multipliers to an already-priced package, add-ons and travel fee"""
+        subtotal = base_price + addons_price
+        weekend_surcharge = 0.0
+        if scheduled_datetime is not None and scheduled_datetime.weekday() >= 5:
+            weekend_surcharge = subtotal * (self.weekend_multiplier - 1.0)
+        emergency_surcharge = 0.0
+        if self.emergency_multiplier != 1.0 and self.is_emergency(package_name):
+            emergency_surcharge = (subtotal + weekend_surcharge) * (self.emergency_multiplier - 1.0)
+        demand_surcharge = 0.0
+        if demand > self.surge_baseline:
+            demand_surcharge = (subtotal + weekend_surcharge + emergency_surcharge) * (self.surge_multiplier(demand) - 1.0)
+        service_surcharge = self.service_type_surcharges.get(service_type, 0.0)
+        total_price = (
+            subtotal + weekend_surcharge + emergency_surcharge + demand_surcharge + service_surcharge + travel_fee
+        )
+        return PriceComponents(
+            base_price, addons_price, travel_fee, service_surcharge, weekend_surcharge, emergency_surcharge,
+            demand_surcharge, total_price
+        )
+
+
+def _frozen_array(values: Sequence[float]) -> np.ndarray:
+    array = np.array(values, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+def default_rules_config() -> Dict[str, Any]:
+    """Rules equivalent to the original flat fee: free radius, then a per-km rate"""
+    return {
+        "version": "env",
+        "travel_bands": [
+            {"from_km": 0, "fee_per_km": 0.0},
+            {"from_km": float(os.getenv("FREE_TRAVEL_RADIUS_KM", 15)), "fee_per_km": float(os.getenv("TRAVEL_FEE_PER_KM", 0.50))},
+        ],
+    }
+
+
+def compile_rules(config: Dict[str, Any]) -> PricingRules:
+    """Validate a rules document and compile it into a PricingRules; raises ValueError when invalid"""
+    try:
+        bands = sorted(
+            ((float(band["from_km"]), float(band["fee_per_km"])) for band in config.get("travel_bands", [])),
+            key=lambda band: band[0],
+        )
+        surcharges = {str(k): float(v) for k, v in config.get("service_type_surcharges", {}).items()}
+        weekend_multiplier = float(config.get("weekend_multiplier", 1.0))
+        emergency_multiplier = float(config.get("emergency_multiplier", 1.0))
+        keywords = [str(keyword) for keyword in config.get("emergency_keywords", ["emergency", "same-day"])]
+        surge = config.get("demand_surge", {})
+        surge_baseline = int(surge.get("baseline", 0))
+        surge_step = float(surge.get("step", 0.0))
+        surge_max_multiplier = float(surge.get("max_multiplier", 1.0))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid pricing rules: {e}") from e
+
+    if not bands or bands[0][0] != 0:
+        raise ValueError("Invalid pricing rules: travel bands must start at 0 km")
+    if any(rate < 0 for _, rate in bands) or any(fee < 0 for fee in surcharges.values()):
+        raise ValueError("Invalid pricing rules: fees must not be negative")
+    if min(weekend_multiplier, emergency_multiplier, surge_max_multiplier) < 1.0:
+        raise ValueError("Invalid pricing rules: multipliers must be at least 1.0")
+
+    starts = tuple(start for start, _ in bands)
+    rates = tuple(rate for _, rate in bands)
+    base_fees = [0.0]
+    for i in range(1, len(bands)):
+        base_fees.append(base_fees[-1] + (starts[i] - starts[i - 1]) * rates[i - 1])
+
+    pattern = re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE) if keywords else None
+    return PricingRules(
+        version=str(config.get("version", "unversioned")),
+        band_starts=starts,
+        band_rates=rates,
+        band_base_fees=tuple(base_fees),
+        service_type_surcharges=MappingProxyType(surcharges),
+        weekend_multiplier=weekend_multiplier,
+        emergency_multiplier=emergency_multiplier,
+        emergency_pattern=pattern,
+        surge_baseline=surge_baseline,
+        surge_step=surge_step,
+        surge_max_multiplier=surge_max_multiplier,
+        band_starts_array=_frozen_array(starts),
+        band_rates_array=_frozen_array(rates),
+        band_base_fees_array=_frozen_array(base_fees),
+    )
+
+
+class PricingRulesStore:
+    """Holds the active rule set and swaps it in one assignment on reload.
+
+    Rules come from the JSON file named by ``PRICING_RULES_FILE`` or, without
+    one, from the legacy ``FREE_TRAVEL_RADIUS_KM``/``TRAVEL_FEE_PER_KM`` env
+    vars. The file's mtime is checked at most every ``check_interval`` seconds;
+    a file that fails validation is logged and the previous rules stay active.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        # Unset values are read from the environment on first use, after .env is loaded
+        self.path = path
+        self.check_interval = check_interval
+        self._rules: Optional[PricingRules] = None
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> PricingRules:
+        rules = self._rules
+        if rules is None:
+            return self.reload()
+        if self.path and time.monotonic() >= self._next_check:
+            self._reload_if_changed()
+        return self._rules
+
+    def reload(self) -> PricingRules:
+        """Compile the configured rules now and make them active"""
+        with self._lock:
+            if self.path is None:
+                self.path = os.getenv("PRICING_RULES_FILE", "")
+            if self.check_interval is None:
+                self.check_interval = float(os.getenv("PRICING_RULES_CHECK_SECONDS", 5))
+            self._next_check = time.monotonic() + self.check_interval
+            if not self.path:
+                self._rules = compile_rules(default_rules_config())
+                return self._rules
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path) as f:
+                rules = compile_rules(json.load(f))
+            self._rules, self._mtime = rules, mtime
+            logging.info(f"Loaded pricing rules version {rules.version} from {self.path}")
+            return rules
+
+    def _reload_if_changed(self):
+        try:
+            changed = os.stat(self.path).st_mtime != self._mtime
+        except OSError as e:
+            logging.error(f"Pricing rules file unavailable, keeping version {self._rules.version}: {e}")
+            changed = False
+        if not changed:
+            self._next_check = time.monotonic() + self.check_interval
+            return
+        try:
+            self.reload()
+        except (OSError, ValueError) as e:
+            logging.error(f"Pricing rules reload failed, keeping version {self._rules.version}: {e}")
+
+    def override(self, rules: Optional[PricingRules]):
+        """Pin a rule set (tests, benchmarks); ``None`` reloads from the configured source"""
+        with self._lock:
+            self._rules = rules
+            self._mtime = None
+
+
+rules_store = PricingRulesStore()
+
+
+def current_rules() -> PricingRules:
+    return rules_store.current()
+
+
+def provider_location(provider: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """Coordinates of the provider's first service area, as used for single estimates"""
+    if not provider or not provider.get("service_areas"):
+        return None
+    area = provider["service_areas"][0]
+    if area.get("latitude") and area.get("longitude"):
+        return area["latitude"], area["longitude"]
+    return None
+
+
+def estimate_fields(components: PriceComponents, package_name: str, addon_prices: Mapping[str, float]) -> Dict[str, Any]:
+    """``PriceEstimate`` fields, with a breakdown line for every surcharge that applies"""
+    breakdown = {package_name: components.base_price, **addon_prices}
+    for label, amount in (
+        ("Service Surcharge", components.service_surcharge),
+        ("Weekend Surcharge", components.weekend_surcharge),
+        ("Emergency Surcharge", components.emergency_surcharge),
+        ("Demand Surcharge", components.demand_surcharge),
+    ):
+        if amount:
+            breakdown[label] = amount
+    breakdown["Travel Fee"] = components.travel_fee
+    return {
+        "base_price": components.base_price,
+        "addons_price": components.addons_price,
+        "travel_fee": components.travel_fee,
+        "total_price": components.total_price,
+        "breakdown": breakdown,
+    }
+
+
+def quote_batch(
+    quotes: Sequence[Any],
+    packages: Dict[str, Dict[str, Any]],
+    addons: Dict[str, Dict[str, Any]],
+    providers: Dict[str, Dict[str, Any]],
+    origin: Optional[Tuple[float, float]],
+    rules: PricingRules,
+    scheduled_datetime: Optional[datetime] = None,
+    demand: Optional[Mapping[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """Price every quote (objects with ``package_id``, ``addon_ids``, ``provider_id``).
+
+    ``origin`` is the geocoded service address, or None when it could not be
+    geocoded (no travel fees then). ``demand`` maps service types to recent
+    bookings in the address's city, for surge pricing. Returns one dict per
+    quote, in order, with either an ``estimate`` matching ``PriceEstimate``
+    or an ``error``.
+    """
+    count = len(quotes)
+    distances = np.full(count, np.nan)
+
+    if origin is not None:
+        rows, lats, lons = [], [], []
+        for row, quote in enumerate(quotes):
+            location = provider_location(providers.get(quote.provider_id)) if quote.provider_id else None
+            if location:
+                rows.append(row)
+                lats.append(location[0])
+                lons.append(location[1])
+        if rows:
+            distances[rows] = haversine_km(origin[0], origin[1], lats, lons)
+
+    located = ~np.isnan(distances)
+    fees = np.zeros(count)
+    if located.any():
+        fees[located] = rules.travel_fee(distances[located])
+
+    results = []
+    for row, quote in enumerate(quotes):
+        result = {"package_id": quote.package_id, "addon_ids": quote.addon_ids, "provider_id": quote.provider_id}
+        package = packages.get(quote.package_id)
+        if package is None:
+            result["error"] = "Package not found"
+            results.append(result)
+            continue
+
+        quote_addons = [addons[addon_id] for addon_id in dict.fromkeys(quote.addon_ids) if addon_id in addons]
+        addon_prices = {addon["name"]: addon["price"] for addon in quote_addons}
+        components = rules.evaluate(
+            package["base_price"],
+            sum(addon["price"] for addon in quote_addons),
+            float(fees[row]),
+            package["service_type"],
+            package["name"],
+            scheduled_datetime,
+            demand.get(package["service_type"], 0) if demand else 0,
+        )
+        result["distance_km"] = float(distances[row]) if located[row] else None
+        result["estimate"] = estimate_fields(components, package["name"], addon_prices)
+        results.append(result)
+    return results
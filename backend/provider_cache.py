@@ -0,0 +1,48 @@
+# Provider identity lookups for Domora
+# Bookings reference a provider by either their user id or their provider
+# profile id, so provider access checks need the profile id for a user. The
+# mapping almost never changes, so it is cached per worker (bounded, with a
+# TTL) instead of being read from provider_profiles on every request. The
+# cache subscribes to the cache bus; users without a profile are cached too
+# and forgotten whenever any profile changes.
+
+import os
+from typing import Optional
+
+import metrics
+from ttl_cache import MISSING, TTLCache
+
+lookups = metrics.counter("provider_profile_cache_lookups_total", "Provider profile id lookups, by result")
+
+
+class ProviderProfileCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self._entries = TTLCache(
+            max_entries or int(os.getenv("PROVIDER_CACHE_SIZE", 10000)),
+            ttl if ttl is not None else float(os.getenv("PROVIDER_CACHE_TTL_SECONDS", 300)),
+        )
+
+    async def resolve(self, db, user_id: str) -> Optional[str]:
+        """Provider profile id of ``user_id``, or None if they have no profile"""
+        profile_id = self._entries.get(user_id)
+        if profile_id is not MISSING:
+            lookups.inc(result="hit")
+            return profile_id
+        lookups.inc(result="miss")
+        profile = await db.provider_profiles.find_one({"user_id": user_id}, {"_id": 0, "id": 1})
+        profile_id = profile["id"] if profile else None
+        self._entries.set(user_id, profile_id)
+        return profile_id
+
+    def remember(self, user_id: str, profile_id: Optional[str]):
+        self._entries.set(user_id, profile_id)
+
+    def invalidate(self, collection: str, profile_id: Optional[str] = None):
+        """Cache bus callback: forget ``profile_id`` (None: everything)"""
+        if profile_id is None:
+            self._entries.clear()
+        else:
+            self._entries.discard_where(lambda user_id, cached: cached is None or cached == profile_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,174 @@
+# Request rate limiting for Domora
+# Token buckets per client, implemented with GCRA: each bucket is a single
+# number, the "theoretical arrival time" (TAT) at which it will be full again,
+# so a check is one read and one write whatever the limit. A limit of
+# "10/minute" refills one token every 6 seconds and allows bursts of 10.
+#
+# Buckets live in this worker's memory by default (RATE_LIMIT_BACKEND=memory),
+# bounded by an LRU that drops buckets once they are full again. With several
+# workers, RATE_LIMIT_BACKEND=mongo keeps them in the rate_limits collection
+# and updates them with compare-and-set, so every worker draws from the same
+# bucket. RATE_LIMIT_BACKEND=off disables limiting.
+
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+from ttl_cache import MISSING, TTLCache
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+CAS_RETRIES = 5
+
+rejections = metrics.counter("rate_limit_rejections_total", "Requests answered with 429, by limit")
+
+
+class Limit(NamedTuple):
+    count: int
+    period: float  # seconds
+
+    @property
+    def interval(self) -> float:
+        """Seconds per token"""
+        return self.period / self.count
+
+
+def parse_limit(spec: str) -> Limit:
+    """Parse "<count>/<second|minute|hour|day>", e.g. "10/minute" """
+    count, _, period = spec.partition("/")
+    try:
+        limit = Limit(int(count), float(_PERIODS[period.strip().lower()]))
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '10/minute'")
+    if limit.count < 1:
+        raise ValueError(f"Invalid rate limit {spec!r}, count must be positive")
+    return limit
+
+
+def gcra(tat: float, now: float, limit: Limit) -> Tuple[Optional[float], float]:
+    """Apply one request to a bucket; returns (retry_after or None if allowed, new TAT)"""
+    tat = max(tat, now)
+    new_tat = tat + limit.interval
+    allow_at = new_tat - limit.period
+    if now < allow_at:
+        return allow_at - now, tat
+    return None, new_tat
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.time):
+        # The TAT doubles as the entry's expiry: a bucket that is full again
+        # holds no information and can be forgotten
+        self._tats = TTLCache(max_keys, ttl=0, clock=clock)
+        self._clock = clock
+
+    async def hit(self, key: str, limit: Limit) -> Optional[float]:
+        now = self._clock()
+        tat = self._tats.get(key)
+        retry_after, new_tat = gcra(now if tat is MISSING else tat, now, limit)
+        if retry_after is None:
+            self._tats.set(key, new_tat, ttl=new_tat - now)
+        return retry_after
+
+    async def peek(self, key: str, limit: Limit) -> Optional[float]:
+        now = self._clock()
+        tat = self._tats.get(key)
+        return gcra(now if tat is MISSING else tat, now, limit)[0]
+
+
+class MongoBuckets:
+    def __init__(self, get_db: Callable[[], Any], clock: Callable[[], float] = time.time):
+        self._get_db = get_db
+        self._clock = clock
+
+    async def hit(self, key: str, limit: Limit) -> Optional[float]:
+        collection = self._get_db().rate_limits
+        for _ in range(CAS_RETRIES):
+            now = self._clock()
+            bucket = await collection.find_one({"id": key}, {"_id": 0, "tat": 1})
+            retry_after, new_tat = gcra(bucket["tat"] if bucket else now, now, limit)
+            if retry_after is not None:
+                return retry_after
+            update = {"$set": {"tat": new_tat, "expires_at": datetime.utcfromtimestamp(new_tat)}}
+            try:
+                if bucket is None:
+                    await collection.insert_one({"id": key, **update["$set"]})
+                    return None
+                result = await collection.update_one({"id": key, "tat": bucket["tat"]}, update)
+                if result.modified_count == 1:
+                    return None
+            except DuplicateKeyError:
+                pass
+            # Another worker took a token in between; read the bucket again
+        logging.warning(f"Rate limit bucket {key} is heavily contended, letting the request through")
+        return None
+
+    async def peek(self, key: str, limit: Limit) -> Optional[float]:
+        now = self._clock()
+        bucket = await self._get_db().rate_limits.find_one({"id": key}, {"_id": 0, "tat": 1})
+        return gcra(bucket["tat"] if bucket else now, now, limit)[0]
+
+
+async def ensure_indexes(db):
+    await db.rate_limits.create_index("id", unique=True)
+    await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+
+class RateLimiter:
+    def __init__(self, buckets: Optional[Any], proxy_hops: int = 0):
+        self.buckets = buckets
+        self.proxy_hops = proxy_hops
+
+    def client_ip(self, request: Request) -> str:
+        """The caller's address, read from X-Forwarded-For behind ``proxy_hops`` trusted proxies"""
+        if self.proxy_hops:
+            forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+            if len(forwarded) >= self.proxy_hops:
+                return forwarded[-self.proxy_hops]
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, name: str, key: str, limit: Limit):
+        """Take a token from ``key``'s bucket for ``name``; raises 429 when it is empty"""
+        if self.buckets is None:
+            return
+        retry_after = await self.buckets.hit(f"{name}:{key}", limit)
+        if retry_after is not None:
+            self._reject(name, retry_after)
+
+    async def ensure_available(self, name: str, key: str, limit: Limit):
+        """Raise 429 if ``key``'s bucket for ``name`` is empty, without taking a token"""
+        if self.buckets is None:
+            return
+        retry_after = await self.buckets.peek(f"{name}:{key}", limit)
+        if retry_after is not None:
+            self._reject(name, retry_after)
+
+    async def charge(self, name: str, key: str, limit: Limit):
+        """Take a token from ``key``'s bucket for ``name`` if one is left, never raising"""
+        if self.buckets is not None:
+            await self.buckets.hit(f"{name}:{key}", limit)
+
+    def _reject(self, name: str, retry_after: float):
+        rejections.inc(limit=name)
+        raise HTTPException(
+            status_code=429, detail="Too many requests, please try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+def from_env(get_db: Callable[[], Any]) -> RateLimiter:
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    proxy_hops = int(os.getenv("RATE_LIMIT_PROXY_HOPS", 0))
+    if backend == "off":
+        return RateLimiter(None, proxy_hops)
+    if backend == "mongo":
+        return RateLimiter(MongoBuckets(get_db), proxy_hops)
+    if backend != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {backend!r}")
+    return RateLimiter(MemoryBuckets(int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))), proxy_hops)
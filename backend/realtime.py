@@ -0,0 +1,247 @@
+# Real-time booking and chat updates for Domora
+# Clients open one WebSocket (/api/ws?token=...) and subscribe to the bookings
+# and chat threads they can access. Events reach this worker's Hub through a
+# bus: InProcessBus delivers what this worker publishes (enough for a single
+# worker), ChangeStreamBus follows MongoDB change streams so every worker sees
+# writes made by any of them. Another broker (e.g. Redis pub/sub) would be a
+# bus with the same publish/run interface.
+#
+# Each connection has a bounded send queue. A client that falls behind has
+# its backlog replaced by a single "resync" event telling it to refetch over
+# REST, so a slow socket neither grows memory nor delays fan-out to others.
+
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+from starlette.websockets import WebSocketDisconnect
+
+import metrics
+
+QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", 64))
+MAX_TOPICS = int(os.getenv("REALTIME_MAX_TOPICS", 200))
+CHANNELS = ("booking", "thread")
+
+open_connections = metrics.gauge("realtime_connections", "Open WebSocket connections")
+delivered = metrics.counter("realtime_events_total", "Events queued for WebSocket clients, by channel")
+overflows = metrics.counter("realtime_overflows_total", "Send queues that overflowed and were replaced by a resync")
+
+
+def topic(channel: str, key: str) -> str:
+    return f"{channel}:{key}"
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return getattr(value, "value", value)
+
+
+def booking_event(booking: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "booking.updated",
+        "booking_id": booking["id"],
+        **{k: _plain(booking.get(k)) for k in ("status", "payment_status", "provider_id", "updated_at")},
+    }
+
+
+def thread_event(thread: Dict[str, Any]) -> Dict[str, Any]:
+    """A chat thread moved on; clients holding fewer than ``last_seq`` messages refetch the newest page"""
+    return {
+        "type": "thread.updated",
+        "thread_id": thread["id"],
+        **{k: _plain(thread.get(k)) for k in ("last_seq", "last_message", "last_message_at")},
+    }
+
+
+class Connection:
+    __slots__ = ("websocket", "user_id", "queue", "topics")
+
+    def __init__(self, websocket, user_id: str, queue_size: int = QUEUE_SIZE):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.topics: Set[str] = set()
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue ``event`` without waiting; on overflow swap the backlog for a resync"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "topics": sorted(self.topics)})
+            overflows.inc()
+            return False
+
+    async def send_forever(self):
+        try:
+            while True:
+                event = await self.queue.get()
+                await self.websocket.send_text(json.dumps(event, default=_plain))
+        except (WebSocketDisconnect, RuntimeError):
+            # The receive loop sees the disconnect and cleans up
+            return
+
+
+class Hub:
+    """This worker's connections, indexed by the topics they subscribe to"""
+
+    def __init__(self):
+        self.connections: Set[Connection] = set()
+        self._subscribers: Dict[str, Set[Connection]] = defaultdict(set)
+
+    def add(self, connection: Connection):
+        self.connections.add(connection)
+        open_connections.set(len(self.connections))
+
+    def remove(self, connection: Connection):
+        for name in connection.topics:
+            subscribers = self._subscribers.get(name)
+            if subscribers:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self._subscribers[name]
+        connection.topics.clear()
+        self.connections.discard(connection)
+        open_connections.set(len(self.connections))
+
+    def subscribe(self, connection: Connection, name: str):
+        connection.topics.add(name)
+        self._subscribers[name].add(connection)
+
+    def unsubscribe(self, connection: Connection, name: str):
+        connection.topics.discard(name)
+        subscribers = self._subscribers.get(name)
+        if subscribers:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._subscribers[name]
+
+    def deliver(self, name: str, event: Dict[str, Any]) -> int:
+        subscribers = self._subscribers.get(name)
+        if not subscribers:
+            return 0
+        for connection in list(subscribers):
+            connection.offer(event)
+        delivered.inc(len(subscribers), channel=name.split(":", 1)[0])
+        return len(subscribers)
+
+
+class InProcessBus:
+    """Delivers events published by this worker to this worker's clients"""
+
+    def __init__(self, hub: Hub):
+        self.hub = hub
+
+    async def publish(self, name: str, event: Dict[str, Any]):
+        self.hub.deliver(name, event)
+
+    async def run(self, db):
+        return
+
+
+class ChangeStreamBus(InProcessBus):
+    """Every worker follows the bookings and chat thread change streams, so the write itself is the message"""
+
+    collections = ("bookings", "message_threads")
+
+    def __init__(self, hub: Hub):
+        super().__init__(hub)
+        self.following = False
+
+    async def publish(self, name: str, event: Dict[str, Any]):
+        # Without a stream (standalone server) fall back to local delivery
+        if not self.following:
+            self.hub.deliver(name, event)
+
+    async def run(self, db):
+        while True:
+            try:
+                async with db.watch(
+                    [{"$match": {"ns.coll": {"$in": list(self.collections)}, "operationType": {"$in": [
+                        "insert", "update", "replace"
+                    ]}}}],
+                    full_document="updateLookup",
+                ) as stream:
+                    self.following = True
+                    async for change in stream:
+                        for name, event in self.events_for(change):
+                            self.hub.deliver(name, event)
+            except OperationFailure as e:
+                self.following = False
+                logging.warning(f"Change streams unavailable ({e}), real-time updates are local to this worker")
+                return
+            except PyMongoError as e:
+                self.following = False
+                logging.warning(f"Real-time change stream interrupted: {e}")
+                await asyncio.sleep(1)
+
+    def events_for(self, change: Dict[str, Any]):
+        document = change.get("fullDocument")
+        if not document:
+            return
+        if change["ns"]["coll"] == "bookings":
+            yield topic("booking", document["id"]), booking_event(document)
+        elif change["ns"]["coll"] == "message_threads":
+            yield topic("thread", document["id"]), thread_event(document)
+
+
+def make_bus(kind: str, hub: Hub) -> InProcessBus:
+    buses = {"local": InProcessBus, "change_stream": ChangeStreamBus}
+    if kind not in buses:
+        raise ValueError(f"Unknown real-time bus {kind!r}, expected one of {sorted(buses)}")
+    return buses[kind](hub)
+
+
+async def serve(
+    websocket,
+    user_id: str,
+    hub: Hub,
+    authorize: Callable[[str, str], Awaitable[bool]],
+    queue_size: Optional[int] = None,
+):
+    """Run an accepted WebSocket until the client disconnects
+
+    Clients send ``{"action": "subscribe"|"unsubscribe", "channel": "booking"|"thread", "id": ...}``
+    or ``{"action": "ping"}``; ``authorize(channel, id)`` decides who may subscribe.
+    """
+    connection = Connection(websocket, user_id, queue_size or QUEUE_SIZE)
+    hub.add(connection)
+    sender = asyncio.create_task(connection.send_forever())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action, channel, key = message.get("action"), message.get("channel", "booking"), message.get("id")
+            except (ValueError, AttributeError):
+                connection.offer({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+
+            if action == "ping":
+                connection.offer({"type": "pong"})
+            elif action in ("subscribe", "unsubscribe") and channel in CHANNELS and isinstance(key, str):
+                name = topic(channel, key)
+                if action == "unsubscribe":
+                    hub.unsubscribe(connection, name)
+                    connection.offer({"type": "unsubscribed", "topic": name})
+                elif len(connection.topics) >= MAX_TOPICS:
+                    connection.offer({"type": "error", "topic": name, "detail": "Too many subscriptions"})
+                elif await authorize(channel, key):
+                    hub.subscribe(connection, name)
+                    connection.offer({"type": "subscribed", "topic": name})
+                else:
+                    connection.offer({"type": "error", "topic": name, "detail": "Access denied"})
+            else:
+                connection.offer({"type": "error", "detail": "Unknown action"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        hub.remove(connection)
@@ -0,0 +1,326 @@
+# Offline reporting for Domora
+# Streams bookings and payment transactions out of MongoDB in batches, turns
+# them into typed columnar pandas frames (categorical service_type/status,
+# datetime64 timestamps, float prices) and computes cohort, retention,
+# revenue-per-provider and travel-fee reports with vectorized operations.
+# Frames can be saved as compressed .npz column snapshots so repeated
+# reports run against the snapshot instead of the production database:
+#
+#   python reports.py snapshot snapshots/2025-06-01
+#   python reports.py retention --snapshot snapshots/2025-06-01
+#   python reports.py revenue-per-provider --csv providers.csv
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import typer
+from pandas.api.types import union_categoricals
+
+# Column name -> (document path, kind)
+BOOKING_COLUMNS = {
+    "id": ("id", "string"),
+    "customer_id": ("customer_id", "category"),
+    "provider_id": ("provider_id", "category"),
+    "service_type": ("service_type", "category"),
+    "status": ("status", "category"),
+    "payment_status": ("payment_status", "category"),
+    "city": ("service_address.city", "category"),
+    "base_price": ("price_estimate.base_price", "float"),
+    "addons_price": ("price_estimate.addons_price", "float"),
+    "travel_fee": ("price_estimate.travel_fee", "float"),
+    "total_price": ("price_estimate.total_price", "float"),
+    "scheduled_datetime": ("scheduled_datetime", "datetime"),
+    "created_at": ("created_at", "datetime"),
+}
+
+TRANSACTION_COLUMNS = {
+    "id": ("id", "string"),
+    "booking_id": ("booking_id", "string"),
+    "user_id": ("user_id", "category"),
+    "amount": ("amount", "float"),
+    "currency": ("currency", "category"),
+    "payment_status": ("payment_status", "category"),
+    "created_at": ("created_at", "datetime"),
+    "updated_at": ("updated_at", "datetime"),
+}
+
+SOURCES = {"bookings": BOOKING_COLUMNS, "payment_transactions": TRANSACTION_COLUMNS}
+
+
+def _get(document: dict, parts: tuple):
+    for part in parts:
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return getattr(document, "value", document)
+
+
+def projection(columns: Dict[str, tuple]) -> Dict[str, int]:
+    return {"_id": 0, **{path: 1 for path, _ in columns.values()}}
+
+
+def stream_batches(collection, columns: Dict[str, tuple], batch_size: int = 5000) -> Iterator[List[dict]]:
+    """Yield lists of at most ``batch_size`` documents with only the report fields"""
+    batch: List[dict] = []
+    for document in collection.find({}, projection(columns)).batch_size(batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _batch_columns(batch: List[dict], columns: Dict[str, tuple]) -> Dict[str, object]:
+    result = {}
+    for name, (path, kind) in columns.items():
+        parts = tuple(path.split("."))
+        values = [_get(document, parts) for document in batch]
+        if kind == "category":
+            result[name] = pd.Categorical(values)
+        elif kind == "float":
+            result[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif kind == "datetime":
+            result[name] = pd.to_datetime(values).values.astype("datetime64[ns]")
+        else:
+            result[name] = np.array(values, dtype=object)
+    return result
+
+
+def build_frame(batches: Iterable[List[dict]], columns: Dict[str, tuple]) -> pd.DataFrame:
+    """Typed columnar frame from document batches; each batch is converted as it arrives"""
+    parts: Dict[str, list] = {name: [] for name in columns}
+    for batch in batches:
+        for name, values in _batch_columns(batch, columns).items():
+            parts[name].append(values)
+
+    data = {}
+    for name, (_, kind) in columns.items():
+        chunks = parts[name]
+        if kind == "category":
+            data[name] = union_categoricals(chunks) if chunks else pd.Categorical([])
+        elif kind == "float":
+            data[name] = np.concatenate(chunks) if chunks else np.array([], dtype=np.float64)
+        elif kind == "datetime":
+            data[name] = np.concatenate(chunks) if chunks else np.array([], dtype="datetime64[ns]")
+        else:
+            data[name] = np.concatenate(chunks) if chunks else np.array([], dtype=object)
+    return pd.DataFrame(data)
+
+
+# Snapshots: one compressed .npz per collection. Categoricals are stored as
+# integer codes plus their categories, datetimes as int64 nanoseconds and
+# strings as fixed-width unicode, so loading never needs pickle.
+
+def save_frame(frame: pd.DataFrame, path: Path):
+    arrays = {}
+    schema = []
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            arrays[f"{name}.codes"] = column.cat.codes.to_numpy()
+            arrays[f"{name}.categories"] = np.asarray(column.cat.categories.astype(str), dtype=str)
+            kind = "category"
+        elif pd.api.types.is_datetime64_any_dtype(column.dtype):
+            arrays[name] = column.to_numpy(dtype="datetime64[ns]").view("int64")
+            kind = "datetime"
+        elif pd.api.types.is_float_dtype(column.dtype):
+            arrays[name] = column.to_numpy(dtype=np.float64)
+            kind = "float"
+        else:
+            arrays[name] = np.asarray(column.fillna("").astype(str), dtype=str)
+            arrays[f"{name}.isna"] = column.isna().to_numpy()
+            kind = "string"
+        schema.append({"name": name, "kind": kind})
+    meta = {"rows": len(frame), "columns": schema, "created_at": datetime.utcnow().isoformat()}
+    arrays["__meta__"] = np.array(json.dumps(meta))
+    np.savez_compressed(path, **arrays)
+
+
+def load_frame(path: Path) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays["__meta__"]))
+        data = {}
+        for column in meta["columns"]:
+            name, kind = column["name"], column["kind"]
+            if kind == "category":
+                data[name] = pd.Categorical.from_codes(arrays[f"{name}.codes"], arrays[f"{name}.categories"].astype(object))
+            elif kind == "datetime":
+                data[name] = arrays[name].view("datetime64[ns]")
+            elif kind == "float":
+                data[name] = arrays[name]
+            else:
+                values = arrays[name].astype(object)
+                values[arrays[f"{name}.isna"]] = None
+                data[name] = values
+    return pd.DataFrame(data)
+
+
+def save_snapshot(frames: Dict[str, pd.DataFrame], directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, frame in frames.items():
+        save_frame(frame, directory / f"{name}.npz")
+
+
+def load_snapshot(directory: Path) -> Dict[str, pd.DataFrame]:
+    return {name: load_frame(directory / f"{name}.npz") for name in SOURCES}
+
+
+# Reports
+
+def _month_index(timestamps: pd.Series) -> np.ndarray:
+    return (timestamps.dt.year * 12 + timestamps.dt.month - 1).to_numpy()
+
+
+def _month_label(index) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _with_cohorts(bookings: pd.DataFrame) -> pd.DataFrame:
+    frame = bookings[["customer_id", "created_at", "total_price", "payment_status"]].copy()
+    frame["month"] = _month_index(frame["created_at"])
+    frame["cohort"] = frame.groupby("customer_id", observed=True)["month"].transform("min")
+    frame["offset"] = frame["month"] - frame["cohort"]
+    return frame
+
+
+def cohort_report(bookings: pd.DataFrame) -> pd.DataFrame:
+    """Per first-booking month: customers, bookings and captured revenue to date"""
+    frame = _with_cohorts(bookings)
+    frame["revenue"] = np.where(frame["payment_status"] == "captured", frame["total_price"], 0.0)
+    report = frame.groupby("cohort").agg(
+        customers=("customer_id", "nunique"), bookings=("customer_id", "size"), revenue=("revenue", "sum")
+    )
+    report["bookings_per_customer"] = report["bookings"] / report["customers"]
+    report["revenue_per_customer"] = report["revenue"] / report["customers"]
+    report.index = [_month_label(i) for i in report.index]
+    report.index.name = "cohort"
+    return report.round(2)
+
+
+def retention_report(bookings: pd.DataFrame, months: int = 6) -> pd.DataFrame:
+    """Share of each cohort booking again N months after their first booking"""
+    frame = _with_cohorts(bookings)
+    frame = frame[frame["offset"] < months]
+    active = frame.groupby(["cohort", "offset"])["customer_id"].nunique().unstack(fill_value=0)
+    active = active.reindex(columns=range(months), fill_value=0)
+    retention = active.div(active[0], axis=0)
+    retention.index = [_month_label(i) for i in retention.index]
+    retention.index.name = "cohort"
+    retention.columns = [f"m{offset}" for offset in retention.columns]
+    return retention.round(3)
+
+
+def revenue_per_provider(bookings: pd.DataFrame, transactions: pd.DataFrame) -> pd.DataFrame:
+    """Captured payment revenue per provider, joined through the booking"""
+    captured = transactions.loc[transactions["payment_status"] == "captured", ["booking_id", "amount"]]
+    providers = bookings[["id", "provider_id"]].rename(columns={"id": "booking_id"})
+    joined = captured.merge(providers, on="booking_id", how="left")
+    joined["provider_id"] = joined["provider_id"].astype(object).fillna("(unassigned)")
+    report = joined.groupby("provider_id").agg(bookings=("booking_id", "nunique"), revenue=("amount", "sum"))
+    report["average_ticket"] = report["revenue"] / report["bookings"]
+    total = report["revenue"].sum()
+    report["share"] = report["revenue"] / total if total else 0.0
+    return report.sort_values("revenue", ascending=False).round(3)
+
+
+def travel_fee_report(bookings: pd.DataFrame, by: Optional[List[str]] = None) -> pd.DataFrame:
+    """Travel fee distribution per service type (or any categorical columns)"""
+    by = by or ["service_type"]
+    frame = bookings[by + ["travel_fee"]].copy()
+    frame["travel_fee"] = frame["travel_fee"].fillna(0.0)
+    frame["charged"] = frame["travel_fee"] > 0
+    grouped = frame.groupby(by, observed=True)["travel_fee"]
+    report = pd.DataFrame({
+        "bookings": grouped.size(),
+        "charged_share": frame.groupby(by, observed=True)["charged"].mean(),
+        "mean_fee": grouped.mean(),
+        "p50_fee": grouped.quantile(0.5),
+        "p90_fee": grouped.quantile(0.9),
+        "total_fees": grouped.sum(),
+    })
+    return report.round(3)
+
+
+# CLI
+
+app = typer.Typer(help="Domora offline reports", no_args_is_help=True)
+
+
+def open_database():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient, ReadPreference
+
+    load_dotenv(Path(__file__).parent / ".env")
+    client = MongoClient(os.environ["MONGO_URL"], read_preference=ReadPreference.SECONDARY_PREFERRED)
+    return client[os.environ["DB_NAME"]]
+
+
+def load_frames(snapshot: Optional[Path], batch_size: int) -> Dict[str, pd.DataFrame]:
+    if snapshot is not None:
+        return load_snapshot(snapshot)
+    db = open_database()
+    return {
+        name: build_frame(stream_batches(db[name], columns, batch_size), columns)
+        for name, columns in SOURCES.items()
+    }
+
+
+def emit(report: pd.DataFrame, csv: Optional[Path]):
+    if csv is not None:
+        report.to_csv(csv)
+        typer.echo(f"Wrote {len(report)} rows to {csv}")
+    else:
+        typer.echo(report.to_string())
+
+
+SnapshotOption = typer.Option(None, help="Read a snapshot directory instead of MongoDB")
+CsvOption = typer.Option(None, help="Write the report as CSV instead of printing it")
+BatchOption = typer.Option(5000, help="Documents per MongoDB batch")
+
+
+@app.command()
+def snapshot(directory: Path, batch_size: int = BatchOption):
+    """Stream bookings and payment transactions from MongoDB into a snapshot"""
+    frames = load_frames(None, batch_size)
+    save_snapshot(frames, directory)
+    for name, frame in frames.items():
+        typer.echo(f"{name}: {len(frame)} rows, {frame.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+
+
+@app.command()
+def cohorts(snapshot: Optional[Path] = SnapshotOption, csv: Optional[Path] = CsvOption, batch_size: int = BatchOption):
+    """Customers, bookings and revenue per first-booking month"""
+    emit(cohort_report(load_frames(snapshot, batch_size)["bookings"]), csv)
+
+
+@app.command()
+def retention(snapshot: Optional[Path] = SnapshotOption, csv: Optional[Path] = CsvOption,
+              months: int = typer.Option(6, help="Months after the first booking"), batch_size: int = BatchOption):
+    """Monthly retention matrix per cohort"""
+    emit(retention_report(load_frames(snapshot, batch_size)["bookings"], months), csv)
+
+
+@app.command("revenue-per-provider")
+def revenue_per_provider_command(snapshot: Optional[Path] = SnapshotOption, csv: Optional[Path] = CsvOption,
+                                 batch_size: int = BatchOption):
+    """Captured revenue per provider"""
+    frames = load_frames(snapshot, batch_size)
+    emit(revenue_per_provider(frames["bookings"], frames["payment_transactions"]), csv)
+
+
+@app.command("travel-fees")
+def travel_fees(snapshot: Optional[Path] = SnapshotOption, csv: Optional[Path] = CsvOption,
+                by: List[str] = typer.Option(["service_type"], help="Columns to group by, e.g. service_type, city"),
+                batch_size: int = BatchOption):
+    """Travel fee distribution"""
+    emit(travel_fee_report(load_frames(snapshot, batch_size)["bookings"], by), csv)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,268 @@
+# In-app job scheduler for Domora
+# Jobs live in the scheduled_jobs collection, so they survive restarts and are
+# shared by every worker. One worker at a time holds the scheduler lease
+# (a document in scheduler_leases, renewed while it runs) and is the only one
+# that claims persisted jobs. Due jobs are claimed in batches; a claim is
+# itself a lease, so a job whose worker died is picked up again. That makes
+# delivery at-least-once: a batch that outlives the leases can run a job a
+# second time, so handlers must be safe to repeat (notify(key=...) for
+# notifications).
+#
+# Each worker keeps a heap of upcoming run times and sleeps until the earliest
+# one instead of polling. Per-worker jobs (warming this process's caches)
+# only live in that heap and run on every worker.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+NextRun = Callable[[datetime], datetime]
+
+SCHEDULED, RUNNING, DONE, FAILED = "scheduled", "running", "done", "failed"
+COMPLETED_RETENTION = timedelta(days=7)
+
+runs = metrics.counter("scheduler_job_runs_total", "Scheduled job runs, by job and result")
+leader = metrics.gauge("scheduler_leader", "1 while this worker holds the scheduler lease")
+
+
+def every(seconds: float) -> NextRun:
+    return lambda now: now + timedelta(seconds=seconds)
+
+
+def daily_at(hour: int) -> NextRun:
+    """Next occurrence of ``hour``:00 UTC"""
+    def next_run(now: datetime) -> datetime:
+        target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        return target if target > now else target + timedelta(days=1)
+    return next_run
+
+
+async def ensure_indexes(db):
+    await db.scheduled_jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+    await db.scheduled_jobs.create_index("key", unique=True, sparse=True)
+    await db.scheduled_jobs.create_index("completed_at", expireAfterSeconds=int(COMPLETED_RETENTION.total_seconds()))
+    await db.scheduler_leases.create_index("id", unique=True)
+
+
+async def schedule(db, name: str, run_at: datetime, payload: Optional[Dict[str, Any]] = None,
+                   key: Optional[str] = None, session=None) -> str:
+    """Persist a one-off job; scheduling an existing ``key`` again moves it to ``run_at``"""
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    fields = {"name": name, "run_at": run_at, "payload": payload or {}, "status": SCHEDULED, "attempts": 0,
+              "locked_until": None, "updated_at": now}
+    if key is None:
+        await db.scheduled_jobs.insert_one({"id": job_id, **fields, "created_at": now}, session=session)
+        return job_id
+    job = await db.scheduled_jobs.find_one_and_update(
+        {"key": key},
+        {"$set": fields, "$unset": {"completed_at": ""}, "$setOnInsert": {"id": job_id, "created_at": now}},
+        upsert=True,
+        projection={"_id": 0, "id": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    return job["id"]
+
+
+async def cancel(db, key: str, session=None):
+    await db.scheduled_jobs.delete_one({"key": key, "status": SCHEDULED}, session=session)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        db,
+        batch_size: int = 20,
+        lease: timedelta = timedelta(seconds=30),
+        refresh_interval: float = 15.0,
+        max_attempts: Optional[int] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.lease = lease
+        self.refresh_interval = refresh_interval
+        self.max_attempts = max_attempts or int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 5))
+        self.worker_id = str(uuid.uuid4())
+        self.is_leader = False
+        self._clock = clock
+        self._handlers: Dict[str, Handler] = {}
+        self._recurring: Dict[str, NextRun] = {}
+        self._local: Dict[str, Tuple[Handler, NextRun]] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []  # (run_at, tiebreak, local job name or "")
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def job(self, name: str, handler: Handler, recurring: Optional[NextRun] = None):
+        """Register a persisted job; ``recurring`` jobs are scheduled once for the whole cluster"""
+        self._handlers[name] = handler
+        if recurring:
+            self._recurring[name] = recurring
+
+    def local_job(self, name: str, handler: Handler, next_run: NextRun):
+        """Register a job every worker runs for itself, e.g. warming its own caches"""
+        self._local[name] = (handler, next_run)
+        self._push(next_run(self._clock()), name)
+
+    def wake(self):
+        """Re-read due times now, e.g. after scheduling a job that is due soon"""
+        self._wakeup.set()
+
+    def _push(self, run_at: datetime, name: str = ""):
+        heapq.heappush(self._heap, (run_at, next(self._counter), name))
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self.tick()
+                except Exception as e:
+                    logging.error(f"Scheduler tick failed: {e}")
+                await self._sleep()
+        finally:
+            if self.is_leader:
+                await self.db.scheduler_leases.update_one(
+                    {"id": "scheduler", "holder": self.worker_id}, {"$set": {"expires_at": self._clock()}}
+                )
+
+    async def tick(self):
+        now = self._clock()
+        await self.run_local(now)
+        if await self.acquire_leadership(now):
+            await self.ensure_recurring(now)
+            while await self.run_due() == self.batch_size:
+                pass
+            await self.plan()
+
+    async def _sleep(self):
+        # Wake for the earliest known job, but at least every refresh_interval
+        # to renew the lease and notice jobs other workers scheduled
+        now = self._clock()
+        timeout = self.refresh_interval
+        if self._heap:
+            timeout = max(0.0, min(timeout, (self._heap[0][0] - now).total_seconds()))
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def acquire_leadership(self, now: datetime) -> bool:
+        try:
+            lease = await self.db.scheduler_leases.find_one_and_update(
+                {"id": "scheduler", "$or": [{"holder": self.worker_id}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.worker_id, "expires_at": now + self.lease}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self.is_leader = lease["holder"] == self.worker_id
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease
+            self.is_leader = False
+        leader.set(1 if self.is_leader else 0)
+        return self.is_leader
+
+    async def ensure_recurring(self, now: datetime):
+        for name, next_run in self._recurring.items():
+            await self.db.scheduled_jobs.update_one(
+                {"key": f"recurring:{name}"},
+                {"$setOnInsert": {
+                    "id": str(uuid.uuid4()), "name": name, "run_at": next_run(now), "payload": {},
+                    "status": SCHEDULED, "attempts": 0, "locked_until": None, "created_at": now, "updated_at": now,
+                }},
+                upsert=True,
+            )
+
+    async def run_local(self, now: datetime):
+        while self._heap and self._heap[0][0] <= now:
+            _, _, name = heapq.heappop(self._heap)
+            if not name:
+                continue  # persisted job hint; run_due claims those
+            handler, next_run = self._local[name]
+            try:
+                await handler({})
+                runs.inc(job=name, result="ok")
+            except Exception as e:
+                logging.error(f"Local job {name} failed: {e}")
+                runs.inc(job=name, result="error")
+            self._push(next_run(self._clock()), name)
+
+    async def plan(self):
+        """Put the next persisted due time on the heap so the leader sleeps exactly until then"""
+        upcoming = await self.db.scheduled_jobs.find(
+            {"status": SCHEDULED}, {"_id": 0, "run_at": 1}
+        ).sort("run_at", ASCENDING).limit(1).to_list(1)
+        self._heap = [entry for entry in self._heap if entry[2]]
+        heapq.heapify(self._heap)
+        if upcoming:
+            self._push(upcoming[0]["run_at"])
+
+    async def claim(self) -> List[Dict[str, Any]]:
+        now = self._clock()
+        due = {"$or": [
+            {"status": SCHEDULED, "run_at": {"$lte": now}},
+            {"status": RUNNING, "locked_until": {"$lte": now}},
+        ]}
+        claimed = []
+        for _ in range(self.batch_size):
+            job = await self.db.scheduled_jobs.find_one_and_update(
+                due,
+                {"$set": {"status": RUNNING, "locked_by": self.worker_id, "locked_until": now + self.lease}},
+                sort=[("run_at", ASCENDING)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                break
+            claimed.append(job)
+        return claimed
+
+    async def run_due(self) -> int:
+        """Claim one batch of due jobs and run them concurrently; returns the batch size"""
+        batch = await self.claim()
+        await asyncio.gather(*(self.execute(job) for job in batch))
+        return len(batch)
+
+    async def execute(self, job: Dict[str, Any]):
+        name = job["name"]
+        handler = self._handlers.get(name)
+        now = self._clock()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {name!r}")
+            await handler(job["payload"])
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            logging.error(f"Job {name} ({job['id']}) failed on attempt {attempts}: {e}")
+            runs.inc(job=name, result="error")
+            if attempts >= self.max_attempts and name not in self._recurring:
+                changes = {"status": FAILED, "completed_at": now}
+            else:
+                retry_at = now + timedelta(seconds=min(3600, 30 * 2 ** (attempts - 1)))
+                if name in self._recurring:
+                    retry_at = min(retry_at, self._recurring[name](now))
+                    attempts = 0 if attempts >= self.max_attempts else attempts
+                changes = {"status": SCHEDULED, "run_at": retry_at}
+            changes.update({"attempts": attempts, "last_error": str(e)})
+        else:
+            runs.inc(job=name, result="ok")
+            if name in self._recurring:
+                changes = {"status": SCHEDULED, "run_at": self._recurring[name](self._clock()), "attempts": 0}
+            else:
+                changes = {"status": DONE, "completed_at": self._clock()}
+        changes.update({"locked_until": None, "updated_at": self._clock()})
+        await self.db.scheduled_jobs.update_one(
+            {"id": job["id"], "locked_by": self.worker_id}, {"$set": changes}
+        )
@@ -1,23 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, APIRouter, status, BackgroundTasks
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, APIRouter, status, BackgroundTasks, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from contextlib import contextmanager
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+import hashlib
+import json
 import logging
 import uuid
-import googlemaps
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 from enum import Enum
+import asyncio
+import integrations
+import analytics
+import messaging
+import mongo_pool
+import metrics
+import outbox
+import exports
+import idempotency
+import pricing
+import rate_limit
+import realtime
+import scheduler
+import sync
+import tokens
+from cache_bus import CacheBus
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from provider_cache import ProviderProfileCache
+from singleflight import SingleFlight
+from demand import DemandIndex
+from http_caching import CompressionMiddleware, compression_settings, conditional_response, etag_values_match, weak_etag
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -27,20 +49,104 @@ load_dotenv(ROOT_DIR / '.env')
 JWT_SECRET = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
+# Setting JWT_ACCESS_TOKEN_MINUTES issues short-lived access tokens that carry
+# the user's profile, so requests skip the user lookup until they expire.
+# Unset, access tokens last JWT_EXPIRATION_HOURS and every request loads the user.
+# With short-lived tokens, deactivating an account takes effect when its
+# access token expires (at most JWT_ACCESS_TOKEN_MINUTES later): refreshing
+# checks the account, but requests in between only see the profile in the token.
+JWT_ACCESS_TOKEN_MINUTES = os.getenv("JWT_ACCESS_TOKEN_MINUTES")
+ACCESS_TOKEN_TTL = (
+    timedelta(minutes=int(JWT_ACCESS_TOKEN_MINUTES)) if JWT_ACCESS_TOKEN_MINUTES
+    else timedelta(hours=JWT_EXPIRATION_HOURS)
+)
+REFRESH_TOKEN_TTL = timedelta(days=int(os.getenv("JWT_REFRESH_TOKEN_DAYS", 30)))
+# Embed providers' profile id in their tokens as the "pid" claim
+JWT_PROVIDER_CLAIM = os.getenv("JWT_PROVIDER_CLAIM", "false").lower() in ("1", "true", "yes")
 
 # MongoDB setup
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url, event_listeners=[mongo_pool.PoolMetrics()], **mongo_pool.client_options(mongo_url)
+)
 db = client[os.environ['DB_NAME']]
+# Catalog, booking lists, exports and analytics go to secondaries when there
+# are any (MONGO_READ_HEAVY_PREFERENCE); everything else reads the primary
+READ_HEAVY_PREFERENCE = mongo_pool.read_heavy_preference()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def read_heavy_db():
+    return db.with_options(read_preference=READ_HEAVY_PREFERENCE)
 
 # Security
 security = HTTPBearer()
+token_codec = tokens.TokenCodec(
+    JWT_SECRET, JWT_ALGORITHM, max_entries=int(os.getenv("JWT_VERIFY_CACHE_SIZE", 10_000))
+)
+
+# Recent bookings per service type and city, read by surge pricing
+demand_index = DemandIndex(window_hours=int(os.getenv("DEMAND_WINDOW_HOURS", 24)))
+
+# Invalidates in-process caches when another worker changes the data behind them
+cache_bus = CacheBus()
+
+# Provider user id -> provider profile id, for booking access checks
+provider_profile_ids = ProviderProfileCache()
+cache_bus.subscribe("provider_profiles", provider_profile_ids.invalidate)
+
+# WebSocket clients of this worker, and how booking events reach them
+# (REALTIME_BUS: "local" for one worker, "change_stream" for several)
+realtime_hub = realtime.Hub()
+realtime_bus = realtime.make_bus(os.getenv("REALTIME_BUS", "local"), realtime_hub)
+
+# Token buckets for the auth and quote endpoints
+# (RATE_LIMIT_BACKEND: "memory" per worker, "mongo" shared by all workers, or "off")
+rate_limiter = rate_limit.from_env(lambda: db)
+AUTH_RATE_LIMIT = rate_limit.parse_limit(os.getenv("RATE_LIMIT_AUTH", "30/minute"))
+LOGIN_ACCOUNT_RATE_LIMIT = rate_limit.parse_limit(os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "10/minute"))
+# Addresses each account last logged in from; they are exempt from the
+# per-account limit, so failed guesses from elsewhere cannot lock the owner out
+LOGIN_ADDRESSES_KEPT = 5
+QUOTE_RATE_LIMIT = rate_limit.parse_limit(os.getenv("RATE_LIMIT_QUOTE", "120/minute"))
+
+# Fail fast while Google Maps or Stripe is degraded (see circuit_breaker.py)
+gmaps_breaker = CircuitBreaker("google_maps", max_timeout=float(os.getenv("GOOGLE_MAPS_TIMEOUT_SECONDS", 5)))
+stripe_breaker = CircuitBreaker("stripe", max_timeout=float(os.getenv("STRIPE_TIMEOUT_SECONDS", 15)))
+
+# Concurrent identical lookups share one call (see singleflight.py)
+geocode_flights = SingleFlight("geocode")
+distance_flights = SingleFlight("distance")
+catalog_flights = SingleFlight("catalog")
+stripe_status_flights = SingleFlight("stripe_status")
+
+# Delivers queued emails and push notifications; created at startup
+outbox_dispatcher: Optional[outbox.OutboxDispatcher] = None
+
+# Periodic and delayed jobs (see "Scheduled Jobs"); created at startup
+job_scheduler: Optional[scheduler.Scheduler] = None
+
+# Unpaid bookings are cancelled this long after they were created
+BOOKING_PAYMENT_TTL = timedelta(minutes=int(os.getenv("BOOKING_PAYMENT_TTL_MINUTES", 60)))
+# Customers and providers are reminded this long before a confirmed booking
+REMINDER_LEAD = timedelta(hours=int(os.getenv("REMINDER_LEAD_HOURS", 24)))
+
+# Password hashing, Google Maps, Stripe and SMTP are built on first use
+# (see integrations.py) to keep worker cold start short.
+
+# Long-running tasks started with the app, cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
 
-# Google Maps client
-gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+# Startup phase durations in seconds, reported by /api/health
+startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def startup_phase(name: str):
+    """Time one phase of process startup"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
+        logging.info(f"Startup phase '{name}' took {startup_timings[name] * 1000:.1f} ms")
 
 # FastAPI app
 app = FastAPI(title="Domora API", version="1.0.0")
@@ -55,6 +161,9 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Brotli/gzip for larger JSON payloads (catalog, booking lists)
+app.add_middleware(CompressionMiddleware, **compression_settings())
+
 # Enums
 class UserRole(str, Enum):
     CUSTOMER = "customer"
@@ -112,8 +221,13 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    expires_in: int
+    refresh_token: Optional[str] = None
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class AddressModel(BaseModel):
     street: str
     city: str
@@ -122,6 +236,15 @@ class AddressModel(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
+class SavedAddressCreate(AddressModel):
+    label: Optional[str] = None
+
+class SavedAddress(SavedAddressCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 class ServicePackage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -162,6 +285,27 @@ class PriceEstimate(BaseModel):
     currency: str = "EUR"
     breakdown: Dict[str, float]
 
+class PriceQuoteRequest(BaseModel):
+    package_id: str
+    addon_ids: List[str] = []
+    provider_id: Optional[str] = None
+
+class BatchPriceEstimateRequest(BaseModel):
+    service_address: AddressModel
+    scheduled_datetime: Optional[datetime] = None
+    quotes: List[PriceQuoteRequest]
+
+class PriceQuote(BaseModel):
+    package_id: str
+    addon_ids: List[str] = []
+    provider_id: Optional[str] = None
+    distance_km: Optional[float] = None
+    estimate: Optional[PriceEstimate] = None
+    error: Optional[str] = None
+
+class BatchPriceEstimate(BaseModel):
+    quotes: List[PriceQuote]
+
 class BookingCreate(BaseModel):
     service_type: ServiceType
     package_id: str
@@ -201,104 +345,223 @@ class PaymentTransaction(BaseModel):
 
 # Utility Functions
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return integrations.pwd_context.get().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return integrations.pwd_context.get().verify(plain_password, hashed_password)
     except Exception:
         # Return False if the stored password hash is invalid or corrupted
         return False
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
-    return encoded_jwt
+    to_encode["exp"] = int(time.time() + ACCESS_TOKEN_TTL.total_seconds())
+    return token_codec.encode(to_encode)
+
+USER_CLAIM_FIELDS = ("email", "full_name", "role", "is_active", "phone", "created_at", "updated_at")
+
+def access_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    claims = {"sub": user["id"]}
+    if JWT_ACCESS_TOKEN_MINUTES:
+        claims["usr"] = {field: user.get(field) for field in USER_CLAIM_FIELDS}
+    return claims
+
+async def issue_tokens(user: Dict[str, Any], claims: Dict[str, Any]) -> Token:
+    """Access token with ``claims`` plus a single-use refresh token for ``user``"""
+    refresh_id = str(uuid.uuid4())
+    expires_at = datetime.utcnow() + REFRESH_TOKEN_TTL
+    await db.refresh_tokens.insert_one({
+        "id": refresh_id, "user_id": user["id"], "used_at": None,
+        "created_at": datetime.utcnow(), "expires_at": expires_at
+    })
+    refresh_token = token_codec.encode({
+        "sub": user["id"], "typ": "refresh", "jti": refresh_id, "exp": int(time.time() + REFRESH_TOKEN_TTL.total_seconds())
+    })
+    return Token(
+        access_token=create_access_token(claims),
+        expires_in=int(ACCESS_TOKEN_TTL.total_seconds()),
+        refresh_token=refresh_token,
+        user=UserResponse(**user)
+    )
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str) -> User:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except JWTError:
+        payload = token_codec.decode(token)
+    except tokens.InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    user_id = payload.get("sub")
+    if user_id is None or payload.get("typ") == "refresh":
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    user = await db.users.find_one({"id": user_id})
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+    if "usr" in payload:
+        # Short-lived token: its profile is at most ACCESS_TOKEN_TTL old
+        user = {"id": user_id, **payload["usr"]}
+    else:
+        user = await db.users.find_one({"id": user_id})
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+    
+    if not user.get("is_active"):
+        raise HTTPException(status_code=401, detail="Account is deactivated")
+    
+    if payload.get("pid") and user["role"] == UserRole.PROVIDER:
+        provider_profile_ids.remember(user_id, payload["pid"])
     
     return User(**user)
 
+async def provider_ids_for(current_user: User) -> List[str]:
+    """Ids bookings may reference a provider by: their user id and provider profile id"""
+    profile_id = await provider_profile_ids.resolve(db, current_user.id)
+    return [current_user.id, profile_id] if profile_id else [current_user.id]
+
+def token_subject(request: Request) -> Optional[str]:
+    """User id of a valid bearer token on the request, without loading the user"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return token_codec.decode(token).get("sub")
+    except tokens.InvalidToken:
+        return None
+
+async def limit_auth(request: Request):
+    """Per-IP limit on the bcrypt-heavy auth endpoints"""
+    await rate_limiter.check("auth", rate_limiter.client_ip(request), AUTH_RATE_LIMIT)
+
+async def limit_quotes(request: Request):
+    """Per-user limit on quotes, which may call Google Maps; per-IP for anonymous callers"""
+    user_id = token_subject(request)
+    key = f"user:{user_id}" if user_id else f"ip:{rate_limiter.client_ip(request)}"
+    await rate_limiter.check("quote", key, QUOTE_RATE_LIMIT)
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def geocode_location(address_string: str) -> Optional[Dict[str, float]]:
+    geocode_result = integrations.gmaps.get().geocode(address_string)
+    return geocode_result[0]['geometry']['location'] if geocode_result else None
+
 async def geocode_address(address: AddressModel) -> AddressModel:
     """Geocode address using Google Maps API"""
     try:
         address_string = f"{address.street}, {address.city}, {address.postal_code}, {address.country}"
-        geocode_result = gmaps.geocode(address_string)
+        # The Maps client blocks, so it runs in a thread, once per address in flight
+        location = await geocode_flights.do(
+            address_string, lambda: gmaps_breaker.call(lambda: asyncio.to_thread(geocode_location, address_string))
+        )
         
-        if geocode_result:
-            location = geocode_result[0]['geometry']['location']
+        if location:
             address.latitude = location['lat']
             address.longitude = location['lng']
         
         return address
     except Exception as e:
-        logging.error(f"Geocoding error: {e}")
+        logging.error(f"Geocoding error: {e!r}")
         return address
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+def driving_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    result = integrations.gmaps.get().distance_matrix(
+        origins=[(lat1, lon1)],
+        destinations=[(lat2, lon2)],
+        mode="driving",
+        units="metric"
+    )
+    
+    if result['status'] == 'OK' and result['rows'][0]['elements'][0]['status'] == 'OK':
+        distance_meters = result['rows'][0]['elements'][0]['distance']['value']
+        return distance_meters / 1000  # Convert to kilometers
+    return 0.0
+
+async def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two points in kilometers using Google Maps API"""
     try:
-        result = gmaps.distance_matrix(
-            origins=[(lat1, lon1)],
-            destinations=[(lat2, lon2)],
-            mode="driving",
-            units="metric"
+        return await distance_flights.do(
+            (lat1, lon1, lat2, lon2),
+            lambda: gmaps_breaker.call(lambda: asyncio.to_thread(driving_distance_km, lat1, lon1, lat2, lon2))
         )
-        
-        if result['status'] == 'OK' and result['rows'][0]['elements'][0]['status'] == 'OK':
-            distance_meters = result['rows'][0]['elements'][0]['distance']['value']
-            return distance_meters / 1000  # Convert to kilometers
-        return 0.0
     except Exception as e:
-        logging.error(f"Distance calculation error: {e}")
+        logging.error(f"Distance calculation error: {e!r}")
         return 0.0
 
 def calculate_travel_fee(distance_km: float) -> float:
-    """Calculate travel fee based on distance"""
-    free_radius = float(os.getenv("FREE_TRAVEL_RADIUS_KM", 15))
-    fee_per_km = float(os.getenv("TRAVEL_FEE_PER_KM", 0.50))
-    
-    if distance_km <= free_radius:
-        return 0.0
-    
-    return (distance_km - free_radius) * fee_per_km
+    """Calculate travel fee based on distance using the active pricing rules"""
+    return pricing.current_rules().travel_fee(distance_km)
 
 async def send_email(to_email: str, subject: str, body: str):
-    """Send email using SMTP"""
-    try:
-        msg = MIMEMultipart()
+    """Send email using SMTP; raises on failure so the outbox can retry"""
+    
+    def send():
+        smtp = integrations.smtp.get()
+        msg = smtp.MIMEMultipart()
         msg['From'] = os.getenv("SMTP_USER")
         msg['To'] = to_email
         msg['Subject'] = subject
         
-        msg.attach(MIMEText(body, 'plain'))
+        msg.attach(smtp.MIMEText(body, 'plain'))
         
-        server = smtplib.SMTP(os.getenv("SMTP_HOST"), int(os.getenv("SMTP_PORT")))
+        server = smtp.SMTP(os.getenv("SMTP_HOST"), int(os.getenv("SMTP_PORT", 587)))
         server.starttls()
         server.login(os.getenv("SMTP_USER"), os.getenv("SMTP_PASSWORD"))
         text = msg.as_string()
         server.sendmail(os.getenv("SMTP_USER"), to_email, text)
         server.quit()
-        
-        logging.info(f"Email sent to {to_email}")
-    except Exception as e:
-        logging.error(f"Email sending error: {e}")
+    
+    # smtplib blocks, keep it off the event loop
+    await asyncio.to_thread(send)
+    logging.info(f"Email sent to {to_email}")
+
+# Notifications
+async def notification_recipient(user_id: str) -> Optional[Dict[str, Any]]:
+    """The user to notify; bookings may reference providers by profile id"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "email": 1, "push_tokens": 1})
+    if user is None:
+        profile = await db.provider_profiles.find_one({"id": user_id}, {"_id": 0, "user_id": 1})
+        if profile:
+            user = await db.users.find_one({"id": profile["user_id"]}, {"_id": 0, "email": 1, "push_tokens": 1})
+    return user
+
+async def deliver_email(payload: Dict[str, Any]):
+    user = await notification_recipient(payload["user_id"])
+    if user:
+        await send_email(user["email"], payload["subject"], payload["body"])
+
+async def deliver_push(payload: Dict[str, Any]):
+    user = await notification_recipient(payload["user_id"])
+    if not user or not user.get("push_tokens"):
+        return
+    response = await integrations.push.get().post("/--/api/v2/push/send", json=[
+        {"to": token, "title": payload["subject"], "body": payload["body"], "data": payload.get("data", {})}
+        for token in user["push_tokens"]
+    ])
+    response.raise_for_status()
+
+async def notify(user_id: Optional[str], subject: str, body: str, data: Dict[str, Any], session=None,
+                 key: Optional[str] = None):
+    """Queue an email and a push notification in the caller's transaction
+
+    Work that may run more than once, like scheduler jobs reclaimed after a
+    lost lease, passes a ``key`` naming the event; each recipient then gets
+    it once however often it is queued.
+    """
+    if not user_id:
+        return
+    payload = {"user_id": user_id, "subject": subject, "body": body, "data": data}
+    for channel in ("email", "push"):
+        message_id = f"{key}:{user_id}:{channel}" if key else None
+        await outbox.enqueue(db, channel, payload, session=session, message_id=message_id)
+
+def wake_outbox():
+    if outbox_dispatcher:
+        outbox_dispatcher.wake()
 
 # Authentication Endpoints
-@api_router.post("/auth/register", response_model=Token)
+@api_router.post("/auth/register", response_model=Token, dependencies=[Depends(limit_auth)])
 async def register(user_data: UserCreate):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_data.email})
@@ -314,62 +577,135 @@ async def register(user_data: UserCreate):
     user_dict["is_active"] = True
     
     await db.users.insert_one(user_dict)
+    await analytics.record_user_registered(db, user_dict["role"])
     
-    # Create access token
-    access_token = create_access_token(data={"sub": user_dict["id"]})
-    
-    # Return response
-    user_response = UserResponse(**user_dict)
-    return Token(access_token=access_token, user=user_response)
+    return await issue_tokens(user_dict, access_claims(user_dict))
 
-@api_router.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+@api_router.post("/auth/login", response_model=Token, dependencies=[Depends(limit_auth)])
+async def login(credentials: UserLogin, request: Request):
     # Find user
     user = await db.users.find_one({"email": credentials.email})
+    
+    # Slow down password guessing against one account from many addresses.
+    # Only failed attempts spend the account's budget, and addresses the
+    # account recently logged in from are never refused by it.
+    account = credentials.email.lower()
+    address = rate_limiter.client_ip(request)
+    known_address = bool(user) and address in user.get("login_addresses", [])
+    if not known_address:
+        await rate_limiter.ensure_available("login", account, LOGIN_ACCOUNT_RATE_LIMIT)
+    
     if not user or not verify_password(credentials.password, user["password"]):
+        await rate_limiter.charge("login", account, LOGIN_ACCOUNT_RATE_LIMIT)
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     if not user["is_active"]:
         raise HTTPException(status_code=400, detail="Account is deactivated")
     
-    # Create access token
-    access_token = create_access_token(data={"sub": user["id"]})
+    if not known_address:
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$push": {"login_addresses": {"$each": [address], "$slice": -LOGIN_ADDRESSES_KEPT}}}
+        )
+    
+    return await issue_tokens(user, await login_claims(user))
+
+async def login_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    claims = access_claims(user)
+    if JWT_PROVIDER_CLAIM and user["role"] == UserRole.PROVIDER:
+        profile_id = await provider_profile_ids.resolve(db, user["id"])
+        if profile_id:
+            claims["pid"] = profile_id
+    return claims
+
+@api_router.post("/auth/refresh", response_model=Token, dependencies=[Depends(limit_auth)])
+async def refresh_access_token(body: RefreshRequest):
+    """Trade a refresh token for a new access token and refresh token"""
+    try:
+        payload = token_codec.decode(body.refresh_token)
+    except tokens.InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if payload.get("typ") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    # Refresh tokens are single use
+    record = await db.refresh_tokens.find_one_and_update(
+        {"id": payload["jti"], "user_id": payload["sub"], "used_at": None},
+        {"$set": {"used_at": datetime.utcnow()}}
+    )
+    if record is None:
+        # Replayed or revoked: whoever else holds it must not keep a session
+        await db.refresh_tokens.delete_many({"user_id": payload["sub"]})
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
     
-    # Return response
-    user_response = UserResponse(**user)
-    return Token(access_token=access_token, user=user_response)
+    user = await db.users.find_one({"id": payload["sub"]})
+    if not user or not user["is_active"]:
+        raise HTTPException(status_code=401, detail="User not found")
+    return await issue_tokens(user, await login_claims(user))
 
 @api_router.get("/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    cached = conditional_response(request, response, weak_etag(current_user.id, current_user.updated_at))
+    if cached:
+        return cached
     return UserResponse(**current_user.dict())
 
+@api_router.get("/health")
+async def health():
+    """Liveness probe with startup phase timings"""
+    return {
+        "status": "ok",
+        "startup_ms": {phase: round(seconds * 1000, 2) for phase, seconds in startup_timings.items()},
+        "integrations_loaded": integrations.loaded_integrations()
+    }
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """This worker's metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Service Management Endpoints
+async def catalog_etag(kind: str, service_type: Optional[ServiceType], meta: Optional[dict] = None) -> str:
+    """Validator for a catalog listing; changes whenever the catalog is reseeded"""
+    if meta is None:
+        meta = await db.catalog_meta.find_one({"id": "catalog"})
+    meta = meta or {}
+    return weak_etag(kind, service_type.value if service_type else "", meta.get("fingerprint"), meta.get("updated_at"))
+
+async def load_catalog(collection: str, service_type: Optional[ServiceType] = None) -> List[dict]:
+    """Catalog documents; concurrent requests for the same listing share one query"""
+    filter_query = {"service_type": service_type} if service_type else {}
+    return await catalog_flights.do(
+        (collection, service_type), lambda: read_heavy_db()[collection].find(filter_query, {"_id": 0}).to_list(100)
+    )
+
 @api_router.get("/services/packages", response_model=List[ServicePackage])
-async def get_service_packages(service_type: Optional[ServiceType] = None):
+async def get_service_packages(request: Request, response: Response, service_type: Optional[ServiceType] = None):
     """Get available service packages"""
-    filter_query = {}
-    if service_type:
-        filter_query["service_type"] = service_type
+    cached = conditional_response(request, response, await catalog_etag("packages", service_type), "public, no-cache")
+    if cached:
+        return cached
     
-    packages = await db.service_packages.find(filter_query).to_list(100)
+    packages = await load_catalog("service_packages", service_type)
     return [ServicePackage(**pkg) for pkg in packages]
 
 @api_router.get("/services/addons", response_model=List[ServiceAddon])
-async def get_service_addons(service_type: Optional[ServiceType] = None):
+async def get_service_addons(request: Request, response: Response, service_type: Optional[ServiceType] = None):
     """Get available service add-ons"""
-    filter_query = {}
-    if service_type:
-        filter_query["service_type"] = service_type
+    cached = conditional_response(request, response, await catalog_etag("addons", service_type), "public, no-cache")
+    if cached:
+        return cached
     
-    addons = await db.service_addons.find(filter_query).to_list(100)
+    addons = await load_catalog("service_addons", service_type)
     return [ServiceAddon(**addon) for addon in addons]
 
-@api_router.post("/services/price-estimate", response_model=PriceEstimate)
+@api_router.post("/services/price-estimate", response_model=PriceEstimate, dependencies=[Depends(limit_quotes)])
 async def calculate_price_estimate(
     package_id: str,
     service_address: AddressModel,
     provider_id: Optional[str] = None,
-    addon_ids: List[str] = []
+    addon_ids: List[str] = [],
+    scheduled_datetime: Optional[datetime] = None
 ):
     """Calculate price estimate for a service"""
     
@@ -400,35 +736,94 @@ async def calculate_price_estimate(
                 # Geocode service address if needed
                 service_addr = await geocode_address(service_address)
                 if service_addr.latitude and service_addr.longitude:
-                    distance = calculate_distance(
+                    distance = await calculate_distance(
                         provider_location["latitude"], provider_location["longitude"],
                         service_addr.latitude, service_addr.longitude
                     )
                     travel_fee = calculate_travel_fee(distance)
     
-    total_price = base_price + addons_price + travel_fee
+    demand = demand_index.count(package["service_type"], service_address.city)
+    components = pricing.current_rules().evaluate(
+        base_price, addons_price, travel_fee, package["service_type"], package["name"], scheduled_datetime, demand
+    )
+    return PriceEstimate(**pricing.estimate_fields(components, package["name"], addon_breakdown))
+
+MAX_BATCH_QUOTES = 500
+
+@api_router.post("/services/price-estimate/batch", response_model=BatchPriceEstimate,
+                 dependencies=[Depends(limit_quotes)])
+async def calculate_price_estimates(batch: BatchPriceEstimateRequest):
+    """Price many package/add-on/provider combinations for one address"""
     
-    breakdown = {
-        package["name"]: base_price,
-        **addon_breakdown,
-        "Travel Fee": travel_fee
-    }
+    if len(batch.quotes) > MAX_BATCH_QUOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUOTES} quotes per request")
+    
+    package_ids = list({q.package_id for q in batch.quotes})
+    addon_ids = list({addon_id for q in batch.quotes for addon_id in q.addon_ids})
+    provider_ids = list({q.provider_id for q in batch.quotes if q.provider_id})
+    
+    # One lookup per collection for the whole batch
+    packages = await db.service_packages.find(
+        {"id": {"$in": package_ids}}, {"_id": 0, "id": 1, "name": 1, "base_price": 1, "service_type": 1}
+    ).to_list(None)
+    addons = await db.service_addons.find(
+        {"id": {"$in": addon_ids}}, {"_id": 0, "id": 1, "name": 1, "price": 1}
+    ).to_list(None) if addon_ids else []
+    providers = await db.provider_profiles.find(
+        {"id": {"$in": provider_ids}}, {"_id": 0, "id": 1, "service_areas": 1}
+    ).to_list(None) if provider_ids else []
+    
+    # Geocode the address once; distances are great-circle, computed in one pass
+    origin = None
+    if providers:
+        service_addr = batch.service_address
+        if not (service_addr.latitude and service_addr.longitude):
+            service_addr = await geocode_address(service_addr)
+        if service_addr.latitude and service_addr.longitude:
+            origin = (service_addr.latitude, service_addr.longitude)
+    
+    city = batch.service_address.city
+    demand = {pkg["service_type"]: demand_index.count(pkg["service_type"], city) for pkg in packages}
     
-    return PriceEstimate(
-        base_price=base_price,
-        addons_price=addons_price,
-        travel_fee=travel_fee,
-        total_price=total_price,
-        breakdown=breakdown
+    quotes = pricing.quote_batch(
+        batch.quotes,
+        {pkg["id"]: pkg for pkg in packages},
+        {addon["id"]: addon for addon in addons},
+        {provider["id"]: provider for provider in providers},
+        origin,
+        pricing.current_rules(),
+        batch.scheduled_datetime,
+        demand
     )
+    return BatchPriceEstimate(quotes=[PriceQuote(**quote) for quote in quotes])
+
+@api_router.post("/admin/pricing/reload")
+async def reload_pricing_rules(current_user: User = Depends(get_admin_user)):
+    """Reload pricing rules from PRICING_RULES_FILE"""
+    
+    try:
+        rules = pricing.rules_store.reload()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Pricing rules not reloaded: {e}")
+    
+    return {"version": rules.version}
 
 # Booking Endpoints
 @api_router.post("/bookings", response_model=Booking)
 async def create_booking(
     booking_data: BookingCreate,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.HEADER),
     current_user: User = Depends(get_current_user)
 ):
-    """Create a new booking"""
+    """Create a new booking; retries with the same Idempotency-Key get the original booking"""
+    return await idempotency.run(
+        db, request, response, f"{current_user.id}:bookings", idempotency_key,
+        lambda: place_booking(booking_data, current_user)
+    )
+
+async def place_booking(booking_data: BookingCreate, current_user: User) -> Booking:
     
     if current_user.role != UserRole.CUSTOMER:
         raise HTTPException(status_code=403, detail="Only customers can create bookings")
@@ -440,7 +835,8 @@ async def create_booking(
     price_estimate = await calculate_price_estimate(
         booking_data.package_id,
         service_address,
-        booking_data.addon_ids
+        addon_ids=booking_data.addon_ids,
+        scheduled_datetime=booking_data.scheduled_datetime
     )
     
     # Create booking
@@ -452,15 +848,28 @@ async def create_booking(
     booking_dict["status"] = BookingStatus.PENDING
     booking_dict["payment_status"] = PaymentStatus.PENDING
     booking_dict["created_at"] = datetime.utcnow()
-    booking_dict["updated_at"] = datetime.utcnow()
+    booking_dict.update(await sync.stamp(db))
     
-    await db.bookings.insert_one(booking_dict)
+    async def write(session):
+        await db.bookings.insert_one(booking_dict, session=session)
+        await notify(
+            current_user.id,
+            "Your Domora booking was received",
+            f"We received your booking for {booking_dict['scheduled_datetime']:%d.%m.%Y %H:%M}. "
+            f"Complete the payment to confirm it.",
+            {"booking_id": booking_dict["id"]},
+            session=session
+        )
+    
+    await outbox.atomically(db, write)
+    wake_outbox()
+    await analytics.record_transition(db, None, booking_dict)
+    demand_index.record(booking_dict["service_type"], service_address.city, booking_dict["created_at"])
     
     return Booking(**booking_dict)
 
-@api_router.get("/bookings", response_model=List[Booking])
-async def get_bookings(current_user: User = Depends(get_current_user)):
-    """Get user's bookings"""
+async def bookings_filter(current_user: User) -> Dict[str, Any]:
+    """Query for the bookings ``current_user`` may list"""
     
     filter_query = {}
     if current_user.role == UserRole.CUSTOMER:
@@ -470,22 +879,65 @@ async def get_bookings(current_user: User = Depends(get_current_user)):
         # their provider profile ID, as well as unassigned bookings. Some
         # bookings may reference the provider by profile ID instead of the
         # user ID, so we gather both identifiers for the filter.
-        provider_profile = await db.provider_profiles.find_one({
-            "user_id": current_user.id
-        })
-        provider_ids = [current_user.id]
-        if provider_profile:
-            provider_ids.append(provider_profile["id"])
-
         filter_query["$or"] = [
-            {"provider_id": {"$in": provider_ids}},
+            {"provider_id": {"$in": await provider_ids_for(current_user)}},
             {"provider_id": {"$exists": False}},
             {"provider_id": None},
         ]
+    return filter_query
+
+@api_router.get("/bookings", response_model=List[Booking])
+async def get_bookings(current_user: User = Depends(get_current_user)):
+    """Get user's bookings"""
     
-    bookings = await db.bookings.find(filter_query).to_list(100)
+    bookings = await read_heavy_db().bookings.find(await bookings_filter(current_user)).to_list(100)
     return [Booking(**booking) for booking in bookings]
 
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+
+@api_router.get("/bookings/export")
+async def export_bookings(
+    request: Request,
+    format: str = "ndjson",
+    cursor: Optional[str] = None,
+    status: Optional[BookingStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream bookings as NDJSON or CSV; pass the last row's cursor to resume"""
+    
+    if format not in exports.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    filter_query: Dict[str, Any] = {}
+    if current_user.role == UserRole.PROVIDER:
+        filter_query["provider_id"] = {"$in": await provider_ids_for(current_user)}
+    elif current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins and providers can export bookings")
+    
+    if status:
+        filter_query["status"] = status
+    if since or until:
+        filter_query["created_at"] = {
+            **({"$gte": since} if since else {}),
+            **({"$lt": until} if until else {})
+        }
+    
+    try:
+        exports.keyset_query(filter_query, cursor)
+    except exports.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = f"bookings-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        exports.stream_bookings(
+            read_heavy_db(), filter_query, format, cursor, EXPORT_BATCH_SIZE, request.is_disconnected
+        ),
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @api_router.get("/bookings/available", response_model=List[Booking])
 async def get_available_bookings(current_user: User = Depends(get_current_user)):
     """Get bookings that are not yet assigned to any provider"""
@@ -504,8 +956,16 @@ async def get_available_bookings(current_user: User = Depends(get_current_user))
     bookings = await db.bookings.find(filter_query).to_list(100)
     return [Booking(**booking) for booking in bookings]
 
+async def can_access_booking(current_user: User, booking: Dict[str, Any]) -> bool:
+    """Admins see every booking, customers their own, providers those assigned to them"""
+    if current_user.role == UserRole.CUSTOMER:
+        return booking["customer_id"] == current_user.id
+    if current_user.role == UserRole.PROVIDER:
+        return booking.get("provider_id") in await provider_ids_for(current_user)
+    return current_user.role == UserRole.ADMIN
+
 @api_router.get("/bookings/{booking_id}", response_model=Booking)
-async def get_booking(booking_id: str, current_user: User = Depends(get_current_user)):
+async def get_booking(booking_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)):
     """Get specific booking"""
     
     booking = await db.bookings.find_one({"id": booking_id})
@@ -513,29 +973,115 @@ async def get_booking(booking_id: str, current_user: User = Depends(get_current_
         raise HTTPException(status_code=404, detail="Booking not found")
     
     # Check access permissions
-    provider_ids: List[str] = []
-    if current_user.role == UserRole.PROVIDER:
-        provider_profile = await db.provider_profiles.find_one({"user_id": current_user.id})
-        provider_ids = [current_user.id]
-        if provider_profile:
-            provider_ids.append(provider_profile["id"])
-
-    if (current_user.role == UserRole.CUSTOMER and booking["customer_id"] != current_user.id) or (
-        current_user.role == UserRole.PROVIDER and booking.get("provider_id") not in provider_ids
-    ):
-        if current_user.role != UserRole.ADMIN:
-            raise HTTPException(status_code=403, detail="Access denied")
+    if not await can_access_booking(current_user, booking):
+        raise HTTPException(status_code=403, detail="Access denied")
     
+    cached = conditional_response(request, response, weak_etag(booking["id"], booking.get("updated_at")))
+    if cached:
+        return cached
     return Booking(**booking)
 
+# Bootstrap Endpoint
+UPCOMING_BOOKINGS_LIMIT = 20
+
+class Bootstrap(BaseModel):
+    user: UserResponse
+    upcoming_bookings: List[Booking]
+    catalog_version: str
+    # None when the client's catalog_version is still current
+    packages: Optional[List[ServicePackage]] = None
+    addons: Optional[List[ServiceAddon]] = None
+
+@api_router.get("/bootstrap", response_model=Bootstrap)
+async def bootstrap(catalog_version: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Everything the app's home, profile and services screens need at launch, in one round trip"""
+    
+    upcoming_query = {
+        "$and": [
+            await bookings_filter(current_user),
+            {"scheduled_datetime": {"$gte": datetime.utcnow()}},
+            {"status": {"$in": [BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.IN_PROGRESS]}},
+        ]
+    }
+    meta, upcoming = await asyncio.gather(
+        db.catalog_meta.find_one({"id": "catalog"}),
+        db.bookings.find(upcoming_query, {"_id": 0}).sort("scheduled_datetime", 1).to_list(UPCOMING_BOOKINGS_LIMIT)
+    )
+    
+    payload = {
+        "user": UserResponse(**current_user.dict()),
+        "upcoming_bookings": [Booking(**booking) for booking in upcoming],
+        "catalog_version": await catalog_etag("catalog", None, meta),
+    }
+    if catalog_version is None or not etag_values_match(catalog_version, payload["catalog_version"]):
+        packages, addons = await asyncio.gather(
+            load_catalog("service_packages"),
+            load_catalog("service_addons")
+        )
+        payload["packages"] = [ServicePackage(**pkg) for pkg in packages]
+        payload["addons"] = [ServiceAddon(**addon) for addon in addons]
+    return Bootstrap(**payload)
+
 # Payment Endpoints
+async def stripe_call(fn):
+    """Call Stripe through its circuit breaker; 503 while it is unavailable"""
+    try:
+        return await stripe_breaker.call(fn)
+    except CircuitOpen as e:
+        raise HTTPException(status_code=503, detail="Payments are temporarily unavailable",
+                            headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Payment provider timed out")
+
+async def capture_booking_payment(booking_id: str):
+    """Mark a booking paid and confirmed, once; repeated notifications are no-ops"""
+    changes = {
+        "payment_status": PaymentStatus.CAPTURED,
+        "status": BookingStatus.CONFIRMED,
+        **(await sync.stamp(db))
+    }
+    async def write(session):
+        booking = await db.bookings.find_one_and_update(
+            {"id": booking_id, "payment_status": {"$ne": PaymentStatus.CAPTURED}},
+            {"$set": changes},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if booking:
+            when = f"{booking['scheduled_datetime']:%d.%m.%Y %H:%M}"
+            data = {"booking_id": booking_id}
+            await notify(booking["customer_id"], "Your Domora booking is confirmed",
+                         f"Payment received, your booking on {when} is confirmed.", data, session=session)
+            await notify(booking.get("provider_id"), "New confirmed booking",
+                         f"A booking assigned to you on {when} has been paid and confirmed.", data, session=session)
+            remind_at = booking["scheduled_datetime"] - REMINDER_LEAD
+            if remind_at > datetime.utcnow():
+                await scheduler.schedule(db, "booking_reminder", remind_at, {"booking_id": booking_id},
+                                         key=f"reminder:{booking_id}", session=session)
+        return booking
+    
+    booking = await outbox.atomically(db, write)
+    if booking:
+        wake_outbox()
+        wake_scheduler()
+        await analytics.record_transition(db, booking, {**booking, **changes})
+        await realtime_bus.publish(realtime.topic("booking", booking_id), realtime.booking_event({**booking, **changes}))
+
 @api_router.post("/payments/create-checkout")
 async def create_checkout_session(
     booking_id: str,
     request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.HEADER),
     current_user: User = Depends(get_current_user)
 ):
     """Create Stripe checkout session for booking payment"""
+    return await idempotency.run(
+        db, request, response, f"{current_user.id}:checkout", idempotency_key,
+        lambda: start_checkout(booking_id, str(request.base_url), current_user)
+    )
+
+async def start_checkout(booking_id: str, host_url: str, current_user: User) -> Dict[str, Any]:
     
     # Get booking
     booking = await db.bookings.find_one({"id": booking_id})
@@ -549,17 +1095,15 @@ async def create_checkout_session(
         raise HTTPException(status_code=400, detail="Booking already has payment processed")
     
     # Initialize Stripe
-    stripe_api_key = os.getenv("STRIPE_SECRET_KEY")
-    host_url = str(request.base_url)
     webhook_url = f"{host_url}api/webhooks/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    stripe_checkout = integrations.stripe_checkout(webhook_url=webhook_url)
     
     # Create checkout session
     amount = booking["price_estimate"]["total_price"]
     success_url = f"{host_url}payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{host_url}payment-cancel"
     
-    checkout_request = CheckoutSessionRequest(
+    checkout_request = integrations.stripe.get().CheckoutSessionRequest(
         amount=amount,
         currency="eur",
         success_url=success_url,
@@ -571,7 +1115,7 @@ async def create_checkout_session(
         }
     )
     
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    session = await stripe_call(lambda: stripe_checkout.create_checkout_session(checkout_request))
     
     # Create payment transaction record
     transaction = PaymentTransaction(
@@ -589,7 +1133,7 @@ async def create_checkout_session(
     # Update booking with session ID
     await db.bookings.update_one(
         {"id": booking_id},
-        {"$set": {"stripe_session_id": session.session_id, "updated_at": datetime.utcnow()}}
+        {"$set": {"stripe_session_id": session.session_id, **(await sync.stamp(db))}}
     )
     
     return {"checkout_url": session.url, "session_id": session.session_id}
@@ -607,10 +1151,12 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Check Stripe status
-    stripe_api_key = os.getenv("STRIPE_SECRET_KEY")
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+    stripe_checkout = integrations.stripe_checkout()
     
-    checkout_status = await stripe_checkout.get_checkout_status(session_id)
+    # Clients poll this while the checkout page is open; share one Stripe call
+    checkout_status = await stripe_status_flights.do(
+        session_id, lambda: stripe_call(lambda: stripe_checkout.get_checkout_status(session_id))
+    )
     
     # Update transaction status if changed
     new_status = PaymentStatus.CAPTURED if checkout_status.payment_status == "paid" else PaymentStatus.PENDING
@@ -623,14 +1169,7 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
         
         # Update booking status
         if new_status == PaymentStatus.CAPTURED:
-            await db.bookings.update_one(
-                {"id": transaction["booking_id"]},
-                {"$set": {
-                    "payment_status": PaymentStatus.CAPTURED,
-                    "status": BookingStatus.CONFIRMED,
-                    "updated_at": datetime.utcnow()
-                }}
-            )
+            await capture_booking_payment(transaction["booking_id"])
     
     return {
         "status": checkout_status.status,
@@ -646,8 +1185,7 @@ async def stripe_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    stripe_api_key = os.getenv("STRIPE_SECRET_KEY")
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+    stripe_checkout = integrations.stripe_checkout()
     
     try:
         webhook_response = await stripe_checkout.handle_webhook(body, signature)
@@ -664,14 +1202,7 @@ async def stripe_webhook(request: Request):
             # Update booking
             transaction = await db.payment_transactions.find_one({"session_id": session_id})
             if transaction:
-                await db.bookings.update_one(
-                    {"id": transaction["booking_id"]},
-                    {"$set": {
-                        "payment_status": PaymentStatus.CAPTURED,
-                        "status": BookingStatus.CONFIRMED,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
+                await capture_booking_payment(transaction["booking_id"])
         
         return {"status": "success"}
     
@@ -703,33 +1234,411 @@ async def create_provider_profile(
     profile_dict["rating"] = 0.0
     profile_dict["total_reviews"] = 0
     profile_dict["is_verified"] = False
+    profile_dict.update(await sync.stamp(db))
     
     await db.provider_profiles.insert_one(profile_dict)
+    provider_profile_ids.remember(current_user.id, profile_dict["id"])
     
     return ProviderProfile(**profile_dict)
 
+PROVIDER_PROFILE_EDITABLE = ("business_name", "description", "service_types", "service_areas", "availability")
+
+@api_router.put("/providers/profile", response_model=ProviderProfile)
+async def update_provider_profile(
+    profile_data: dict,
+    current_user: User = Depends(get_current_user)
+):
+    """Update the provider's own profile"""
+    
+    if current_user.role != UserRole.PROVIDER:
+        raise HTTPException(status_code=403, detail="Only providers can update profiles")
+    
+    changes = {k: v for k, v in profile_data.items() if k in PROVIDER_PROFILE_EDITABLE}
+    profile = await db.provider_profiles.find_one_and_update(
+        {"user_id": current_user.id},
+        {"$set": {**changes, **(await sync.stamp(db))}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    cache_bus.publish("provider_profiles", profile["id"])
+    return ProviderProfile(**profile)
+
+# Real-time Endpoints
+@api_router.websocket("/ws")
+async def realtime_updates(websocket: WebSocket, token: str = ""):
+    """Push booking and chat thread updates; browsers cannot set headers, so the JWT comes as ?token="""
+    
+    try:
+        current_user = await user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    async def authorize(channel: str, booking_id: str) -> bool:
+        # Chat threads belong to bookings, so both channels share the booking's access rules
+        booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0, "customer_id": 1, "provider_id": 1})
+        return bool(booking) and await can_access_booking(current_user, booking)
+    
+    await websocket.accept()
+    await realtime.serve(websocket, current_user.id, realtime_hub, authorize)
+
+# Messaging Endpoints
+class MessageCreate(BaseModel):
+    text: str = Field(min_length=1, max_length=2000)
+
+class MessageRead(BaseModel):
+    seq: int
+
+async def get_chat_booking(booking_id: str, current_user: User) -> Dict[str, Any]:
+    """The booking whose chat thread ``current_user`` wants, if they may take part in it"""
+    booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0, "id": 1, "customer_id": 1, "provider_id": 1})
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if not await can_access_booking(current_user, booking):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return booking
+
+async def chat_participants(booking: Dict[str, Any]) -> List[str]:
+    """User ids of the booking's customer and provider; bookings may reference the provider's profile id"""
+    participants = [booking["customer_id"]]
+    provider_id = booking.get("provider_id")
+    if provider_id:
+        profile = await db.provider_profiles.find_one({"id": provider_id}, {"_id": 0, "user_id": 1})
+        participants.append(profile["user_id"] if profile else provider_id)
+    return participants
+
+@api_router.get("/messages/threads")
+async def get_message_threads(current_user: User = Depends(get_current_user)):
+    """The user's chat threads with unread counts"""
+    
+    return await messaging.threads_for(db, current_user.id)
+
+@api_router.get("/bookings/{booking_id}/messages")
+async def get_messages(
+    booking_id: str,
+    before: Optional[int] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """A page of the booking's chat, newest first; pass ``before`` from the previous page for older messages"""
+    
+    await get_chat_booking(booking_id, current_user)
+    messages, cursor = await messaging.history(db, booking_id, before, limit)
+    return {"messages": messages, "before": cursor}
+
+@api_router.post("/bookings/{booking_id}/messages")
+async def post_message(booking_id: str, message: MessageCreate, current_user: User = Depends(get_current_user)):
+    """Send a chat message about a booking"""
+    
+    booking = await get_chat_booking(booking_id, current_user)
+    created, thread = await messaging.post_message(
+        db, booking_id, current_user.id, message.text, await chat_participants(booking)
+    )
+    await realtime_bus.publish(realtime.topic("thread", booking_id), realtime.thread_event(thread))
+    return created
+
+@api_router.post("/bookings/{booking_id}/messages/read")
+async def mark_messages_read(booking_id: str, read: MessageRead, current_user: User = Depends(get_current_user)):
+    """Mark the booking's chat as read up to message ``seq``"""
+    
+    await get_chat_booking(booking_id, current_user)
+    return {"read_seq": await messaging.mark_read(db, booking_id, current_user.id, read.seq)}
+
+# Push Notification Endpoints
+class PushTokenRegistration(BaseModel):
+    token: str = Field(min_length=1, max_length=200)
+
+@api_router.put("/users/me/push-token")
+async def register_push_token(registration: PushTokenRegistration, current_user: User = Depends(get_current_user)):
+    """Register this device's Expo push token"""
+    
+    await db.users.update_one({"id": current_user.id}, {"$addToSet": {"push_tokens": registration.token}})
+    return {"registered": True}
+
+# Address Endpoints
+@api_router.get("/addresses", response_model=List[SavedAddress])
+async def get_addresses(current_user: User = Depends(get_current_user)):
+    """Get the user's saved addresses"""
+    
+    return await db.addresses.find({"user_id": current_user.id}, {"_id": 0}).to_list(100)
+
+@api_router.post("/addresses", response_model=SavedAddress)
+async def create_address(address_data: SavedAddressCreate, current_user: User = Depends(get_current_user)):
+    """Save an address for later bookings"""
+    
+    address = SavedAddress(**address_data.dict(), user_id=current_user.id)
+    address_dict = {**address.dict(), **(await sync.stamp(db))}
+    await db.addresses.insert_one(address_dict)
+    
+    return SavedAddress(**address_dict)
+
+@api_router.delete("/addresses/{address_id}")
+async def delete_address(address_id: str, current_user: User = Depends(get_current_user)):
+    """Delete a saved address"""
+    
+    result = await db.addresses.delete_one({"id": address_id, "user_id": current_user.id})
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Address not found")
+    
+    await sync.record_deletions(db, "addresses", [address_id], owner_id=current_user.id)
+    return {"deleted": address_id}
+
+# Sync Endpoints
+SYNC_LIMIT = int(os.getenv("SYNC_LIMIT", 500))
+
+@api_router.get("/sync")
+async def delta_sync(since: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Everything the mobile offline cache needs that changed since the ``since`` watermark"""
+    
+    try:
+        watermark = sync.decode_watermark(since)
+    except sync.InvalidWatermark as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Tombstones older than the watermark may already be gone; start over
+    reset = sync.needs_reset(watermark)
+    if reset:
+        watermark = sync.Watermark(0, sync.EPOCH)
+    
+    # Read before querying so writes racing the sync are picked up next time
+    latest, now = await sync.current_version(db), datetime.utcnow()
+    
+    collections = {
+        "packages": (db.service_packages, {}),
+        "addons": (db.service_addons, {}),
+        "addresses": (db.addresses, {"user_id": current_user.id}),
+    }
+    if current_user.role == UserRole.CUSTOMER:
+        collections["bookings"] = (db.bookings, {"customer_id": current_user.id})
+    elif current_user.role == UserRole.PROVIDER:
+        collections["bookings"] = (db.bookings, {"provider_id": {"$in": await provider_ids_for(current_user)}})
+        collections["provider_profile"] = (db.provider_profiles, {"user_id": current_user.id})
+    else:
+        collections["bookings"] = (db.bookings, {})
+    collections["deleted"] = (db.sync_tombstones, {"owner_id": {"$in": [current_user.id, None]}})
+    
+    results = {}
+    truncated = []
+    for name, (collection, query) in collections.items():
+        documents, has_more = await sync.fetch_changes(collection, query, watermark, SYNC_LIMIT)
+        results[name] = documents
+        if has_more:
+            truncated.append((documents[-1]["sync_version"], documents[-1]["id"]))
+    
+    # Trim every collection to the same boundary, so the next page resumes
+    # after it everywhere and no document is sent twice
+    boundary = min(truncated) if truncated else None
+    if boundary:
+        for name, documents in results.items():
+            results[name] = [d for d in documents if (d["sync_version"], d["id"]) <= boundary]
+    
+    deleted: Dict[str, List[str]] = {}
+    for tombstone in results.pop("deleted"):
+        deleted.setdefault(tombstone["collection"], []).append(tombstone["doc_id"])
+    profiles = results.pop("provider_profile", [])
+    
+    # The final page's overlap covers writes that landed while paging
+    started = watermark.started or now
+    if boundary:
+        watermark = watermark._replace(cursor=boundary, started=started)
+    else:
+        watermark = sync.Watermark(latest, started)
+    return {
+        "watermark": sync.encode_watermark(watermark),
+        "has_more": boundary is not None,
+        "reset": reset,
+        **{
+            name: {"changed": documents, "deleted": deleted.get(name, [])}
+            for name, documents in results.items()
+        },
+        "provider_profile": profiles[0] if profiles else None,
+    }
+
+# Admin Analytics Endpoints
+@api_router.get("/admin/analytics/summary")
+async def get_analytics_summary(days: int = 30, current_user: User = Depends(get_admin_user)):
+    """Bookings, revenue and users for the last ``days`` days, from precomputed rollups"""
+    
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+    
+    end_day = datetime.utcnow().date()
+    return await analytics.dashboard_summary(read_heavy_db(), end_day - timedelta(days=days - 1), end_day)
+
+@api_router.get("/admin/analytics/providers")
+async def get_top_providers(limit: int = 10, current_user: User = Depends(get_admin_user)):
+    """Providers ranked by captured revenue"""
+    
+    return await analytics.top_providers(read_heavy_db(), max(1, min(limit, 100)))
+
+@api_router.post("/admin/analytics/reconcile")
+async def reconcile_analytics(current_user: User = Depends(get_admin_user)):
+    """Rebuild analytics rollups from bookings and users"""
+    
+    return await analytics.reconcile(db)
+
+# Scheduled Jobs
+def wake_scheduler():
+    if job_scheduler:
+        job_scheduler.wake()
+
+async def expire_pending_bookings(payload: Dict[str, Any]):
+    """Cancel bookings that were never paid, freeing the slot"""
+    cutoff = datetime.utcnow() - BOOKING_PAYMENT_TTL
+    stale = await db.bookings.find(
+        {"status": BookingStatus.PENDING, "payment_status": PaymentStatus.PENDING, "created_at": {"$lt": cutoff}},
+        {"_id": 0, "id": 1}
+    ).to_list(500)
+    expired = 0
+    for candidate in stale:
+        changes = {"status": BookingStatus.CANCELLED, **(await sync.stamp(db))}
+        async def write(session):
+            # Conditional on the booking still being unpaid, in case payment just arrived
+            booking = await db.bookings.find_one_and_update(
+                {"id": candidate["id"], "status": BookingStatus.PENDING, "payment_status": PaymentStatus.PENDING},
+                {"$set": changes},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if booking:
+                await notify(booking["customer_id"], "Your Domora booking has expired",
+                             f"Your booking on {booking['scheduled_datetime']:%d.%m.%Y %H:%M} was cancelled "
+                             f"because it was not paid in time.",
+                             {"booking_id": booking["id"]}, session=session, key=f"expired:{booking['id']}")
+            return booking
+        
+        booking = await outbox.atomically(db, write)
+        if booking:
+            expired += 1
+            await analytics.record_transition(db, booking, {**booking, **changes})
+            await realtime_bus.publish(realtime.topic("booking", booking["id"]),
+                                       realtime.booking_event({**booking, **changes}))
+    if expired:
+        wake_outbox()
+        logging.info(f"Expired {expired} unpaid bookings")
+
+async def booking_reminder(payload: Dict[str, Any]):
+    """Remind both parties of a booking that is still on"""
+    booking = await db.bookings.find_one({"id": payload["booking_id"], "status": BookingStatus.CONFIRMED})
+    if not booking:
+        return
+    when = f"{booking['scheduled_datetime']:%d.%m.%Y %H:%M}"
+    data = {"booking_id": booking["id"]}
+    # Keyed by date too, so a rescheduled booking is reminded again
+    key = f"reminder:{booking['id']}:{booking['scheduled_datetime']:%Y%m%d%H%M}"
+    async def write(session):
+        await notify(booking["customer_id"], "Your Domora booking is coming up",
+                     f"Reminder: your booking is on {when}.", data, session=session, key=key)
+        await notify(booking.get("provider_id"), "Upcoming booking",
+                     f"Reminder: you have a booking on {when}.", data, session=session, key=key)
+    await outbox.atomically(db, write)
+    wake_outbox()
+
+async def reconcile_analytics_job(payload: Dict[str, Any]):
+    await analytics.reconcile(db)
+
+async def rewarm_demand_index(payload: Dict[str, Any]):
+    # Bookings created on other workers only reach this worker's index on a rewarm
+    await demand_index.warm(db)
+
+def create_scheduler() -> scheduler.Scheduler:
+    jobs = scheduler.Scheduler(db, batch_size=int(os.getenv("SCHEDULER_BATCH_SIZE", 20)))
+    jobs.job("expire_pending_bookings", expire_pending_bookings,
+             recurring=scheduler.every(int(os.getenv("BOOKING_EXPIRY_SWEEP_SECONDS", 300))))
+    jobs.job("booking_reminder", booking_reminder)
+    # Nightly rollup reconciliation; ANALYTICS_RECONCILE_HOUR is UTC, empty disables it
+    reconcile_hour = os.getenv("ANALYTICS_RECONCILE_HOUR", "3")
+    if reconcile_hour:
+        jobs.job("reconcile_analytics", reconcile_analytics_job, recurring=scheduler.daily_at(int(reconcile_hour)))
+    jobs.local_job("rewarm_demand_index", rewarm_demand_index,
+                   scheduler.every(int(os.getenv("DEMAND_REWARM_SECONDS", 600))))
+    return jobs
+
 # Initialize default data
+def catalog_fingerprint(packages: List[dict], addons: List[dict]) -> str:
+    """Content hash of the catalog, ignoring the ids generated per process"""
+    def strip_ids(items):
+        return [{k: v for k, v in item.items() if k not in ("id", "_id")} for item in items]
+
+    payload = json.dumps({"packages": strip_ids(packages), "addons": strip_ids(addons)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
 async def initialize_db():
     """Initialize database with enhanced service packages and addons"""
     
     # Import enhanced service data
     from enhanced_services import ENHANCED_SERVICE_DATA
     
-    # Always refresh with latest enhanced data
+    # Only reseed when the catalog content changed; rewriting it on every
+    # worker start made cold starts slow and churned package/addon ids
+    fingerprint = catalog_fingerprint(ENHANCED_SERVICE_DATA["packages"], ENHANCED_SERVICE_DATA["addons"])
+    meta = await db.catalog_meta.find_one({"id": "catalog"})
+    if meta and meta.get("fingerprint") == fingerprint:
+        logging.info("Service catalog is up to date, skipping reseed")
+        return
+    
+    # Tell offline clients to drop the replaced catalog entries
+    await sync.record_deletions(db, "packages", await db.service_packages.distinct("id"))
+    await sync.record_deletions(db, "addons", await db.service_addons.distinct("id"))
     await db.service_packages.delete_many({})
     await db.service_addons.delete_many({})
     
-    # Insert enhanced service data
-    await db.service_packages.insert_many(ENHANCED_SERVICE_DATA["packages"])
+    # Insert enhanced service data; copies keep the stamp out of the fingerprint
+    version = await sync.stamp(db)
+    await db.service_packages.insert_many([{**p, **version} for p in ENHANCED_SERVICE_DATA["packages"]])
     logging.info(f"Inserted {len(ENHANCED_SERVICE_DATA['packages'])} enhanced service packages")
     
-    await db.service_addons.insert_many(ENHANCED_SERVICE_DATA["addons"])
+    await db.service_addons.insert_many([{**a, **version} for a in ENHANCED_SERVICE_DATA["addons"]])
     logging.info(f"Inserted {len(ENHANCED_SERVICE_DATA['addons'])} enhanced service addons")
+    
+    await db.catalog_meta.update_one(
+        {"id": "catalog"},
+        {"$set": {"fingerprint": fingerprint, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    await initialize_db()
+    with startup_phase("seed_catalog"):
+        await initialize_db()
+    with startup_phase("warm_demand_index"):
+        await demand_index.warm(db)
+    await analytics.ensure_indexes(db)
+    await exports.ensure_indexes(db)
+    await sync.ensure_indexes(db)
+    await messaging.ensure_indexes(db)
+    await outbox.ensure_indexes(db)
+    await scheduler.ensure_indexes(db)
+    await idempotency.ensure_indexes(db)
+    await rate_limit.ensure_indexes(db)
+    await cache_bus.ensure_indexes(db)
+    await db.refresh_tokens.create_index("id", unique=True)
+    await db.refresh_tokens.create_index("user_id")
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    
+    global outbox_dispatcher, job_scheduler
+    outbox_dispatcher = outbox.OutboxDispatcher(
+        db,
+        {"email": deliver_email, "push": deliver_push},
+        concurrency={
+            "email": int(os.getenv("OUTBOX_EMAIL_CONCURRENCY", 4)),
+            "push": int(os.getenv("OUTBOX_PUSH_CONCURRENCY", 16)),
+        }
+    )
+    background_tasks.append(asyncio.create_task(outbox_dispatcher.run()))
+    
+    if os.getenv("CACHE_BUS_MODE", "auto") != "off":
+        background_tasks.append(asyncio.create_task(cache_bus.run(db)))
+    
+    background_tasks.append(asyncio.create_task(realtime_bus.run(db)))
+    
+    if os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes"):
+        job_scheduler = create_scheduler()
+        background_tasks.append(asyncio.create_task(job_scheduler.run()))
 
 # Include router
 app.include_router(api_router)
@@ -742,4 +1651,9 @@ logging.basicConfig(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    client.close()
+
+startup_timings["import"] = time.perf_counter() - _IMPORT_STARTED
\ No newline at end of file
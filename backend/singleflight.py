@@ -0,0 +1,49 @@
+# Request coalescing for Domora's expensive lookups
+# When many requests need the same slow result at once (geocoding one
+# building, the catalog right after a reseed, the status of one Stripe
+# session), only the first caller does the work; callers that arrive while
+# it is in flight await the same task. Nothing is cached: once the task
+# finishes, the next caller starts a new one.
+#
+# The shared task is shielded from its callers, so a client disconnecting
+# does not cancel the work other requests are waiting on.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+calls = metrics.counter("singleflight_calls_total", "Coalesced lookups, by group and whether they ran or joined one")
+in_flight = metrics.gauge("singleflight_in_flight", "Lookups currently in flight, by group")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return ``fn()``'s result, sharing one call among concurrent callers with the same key"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            calls.inc(group=self.name, result="executed")
+            in_flight.set(len(self._tasks), group=self.name)
+        else:
+            calls.inc(group=self.name, result="deduplicated")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]"):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        in_flight.set(len(self._tasks), group=self.name)
+        # Callers may all have gone; don't log the error as never retrieved
+        if not task.cancelled():
+            task.exception()
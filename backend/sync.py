@@ -0,0 +1,142 @@
+# Delta sync support for Domora's offline mobile cache
+# Every write to a synced collection is stamped with a global, monotonically
+# increasing ``sync_version`` (a $inc counter) and ``updated_at``; deletions
+# leave a tombstone stamped the same way. A client keeps the opaque watermark
+# returned by /api/sync and sends it back to receive only what changed.
+#
+# A version is allocated before its write lands, so a write can become
+# visible after a sync has already handed out a later watermark. To not lose
+# those, a sync also re-sends documents updated within SYNC_OVERLAP_SECONDS of
+# the previous watermark; clients apply changes idempotently by id.
+#
+# A sync with more than a page of changes is truncated. Its watermark then
+# carries a cursor, the (sync_version, id) of the last document sent, and the
+# next pages resume strictly after it; the id breaks ties between documents
+# stamped with one version (seeding, tombstones). Once the last page is sent
+# the watermark's overlap starts from when paging began, so writes that
+# landed late while paging are re-sent by the following sync.
+
+import base64
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+OVERLAP = timedelta(seconds=float(os.getenv("SYNC_OVERLAP_SECONDS", 5)))
+TOMBSTONE_RETENTION = timedelta(days=int(os.getenv("SYNC_TOMBSTONE_DAYS", 30)))
+EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+class Watermark(NamedTuple):
+    version: int
+    at: datetime
+    # While paging: the (sync_version, id) last sent, and when paging began
+    cursor: Optional[Tuple[int, str]] = None
+    started: Optional[datetime] = None
+
+
+async def ensure_indexes(db):
+    await db.bookings.create_index([("customer_id", ASCENDING), ("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.bookings.create_index([("provider_id", ASCENDING), ("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.bookings.create_index([("customer_id", ASCENDING), ("updated_at", ASCENDING)])
+    await db.bookings.create_index([("provider_id", ASCENDING), ("updated_at", ASCENDING)])
+    await db.addresses.create_index([("user_id", ASCENDING), ("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.service_packages.create_index([("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.service_addons.create_index([("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.sync_tombstones.create_index([("owner_id", ASCENDING), ("sync_version", ASCENDING), ("id", ASCENDING)])
+    await db.sync_tombstones.create_index("deleted_at", expireAfterSeconds=int(TOMBSTONE_RETENTION.total_seconds()))
+
+
+async def current_version(db) -> int:
+    counter = await db.counters.find_one({"id": "sync_version"})
+    return counter["value"] if counter else 0
+
+
+async def next_version(db) -> int:
+    counter = await db.counters.find_one_and_update(
+        {"id": "sync_version"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
+
+
+async def stamp(db) -> Dict[str, Any]:
+    """Fields to ``$set`` on every write to a synced document"""
+    return {"sync_version": await next_version(db), "updated_at": datetime.utcnow()}
+
+
+async def record_deletions(db, collection: str, doc_ids: List[str], owner_id: Optional[str] = None):
+    """Leave tombstones so clients drop their cached copies; ``owner_id`` None means visible to everyone"""
+    if not doc_ids:
+        return
+    version = await next_version(db)
+    now = datetime.utcnow()
+    await db.sync_tombstones.insert_many([
+        {"id": f"{collection}:{doc_id}:{version}", "collection": collection, "doc_id": doc_id,
+         "owner_id": owner_id, "sync_version": version, "updated_at": now, "deleted_at": now}
+        for doc_id in doc_ids
+    ])
+
+
+def encode_watermark(watermark: Watermark) -> str:
+    token = f"{watermark.version}:{watermark.at.isoformat()}"
+    if watermark.cursor:
+        # "|" appears in neither ISO dates nor document ids
+        cursor_version, cursor_id = watermark.cursor
+        token += f"|{cursor_version}|{cursor_id}|{watermark.started.isoformat()}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def decode_watermark(token: Optional[str]) -> Watermark:
+    if not token:
+        return Watermark(0, EPOCH)
+    try:
+        head, *paging = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split("|")
+        version, at = head.split(":", 1)
+        if not paging:
+            return Watermark(int(version), datetime.fromisoformat(at))
+        cursor_version, cursor_id, started = paging
+        return Watermark(int(version), datetime.fromisoformat(at), (int(cursor_version), cursor_id),
+                         datetime.fromisoformat(started))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidWatermark(f"Invalid sync watermark: {e}") from e
+
+
+def changed_since(base_query: Dict[str, Any], watermark: Watermark) -> Dict[str, Any]:
+    """Documents matching ``base_query`` written after the watermark, and after its cursor if paging"""
+    if watermark.version == 0:
+        return base_query
+    clauses = [{"$or": [
+        {"sync_version": {"$gt": watermark.version}},
+        {"updated_at": {"$gte": watermark.at - OVERLAP}},
+    ]}]
+    if watermark.cursor:
+        cursor_version, cursor_id = watermark.cursor
+        clauses.append({"$or": [
+            {"sync_version": {"$gt": cursor_version}},
+            {"sync_version": cursor_version, "id": {"$gt": cursor_id}},
+        ]})
+    if base_query:
+        clauses.insert(0, base_query)
+    return {"$and": clauses} if len(clauses) > 1 else clauses[0]
+
+
+async def fetch_changes(collection, base_query: Dict[str, Any], watermark: Watermark,
+                        limit: int, projection: Optional[Dict[str, int]] = None) -> Tuple[List[dict], bool]:
+    """Changed documents ordered by (version, id), and whether more remain beyond ``limit``"""
+    documents = collection.find(changed_since(base_query, watermark), {"_id": 0, **(projection or {})})
+    if watermark.version == 0:
+        # Documents written before sync existed carry no version to page by,
+        # so a full sync is never truncated
+        return await documents.to_list(None), False
+    documents = await documents.sort([("sync_version", ASCENDING), ("id", ASCENDING)]).limit(limit + 1).to_list(limit + 1)
+    return documents[:limit], len(documents) > limit
+
+
+def needs_reset(watermark: Watermark) -> bool:
+    """A watermark older than tombstone retention may have missed deletions"""
+    return watermark.version > 0 and datetime.utcnow() - watermark.at > TOMBSTONE_RETENTION
@@ -0,0 +1,69 @@
+# JWT issuing and verification for Domora
+# Every authenticated request verifies a bearer token. Verified claims are
+# cached per token until the token expires (or max_cache_seconds, whichever
+# comes first), so a client sending the same token again costs one dict lookup
+# instead of a PyJWT decode. tests/benchmarks/bench_jwt.py compares the cost
+# of both JWT libraries and of the cache.
+
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import jwt
+
+import metrics
+from ttl_cache import MISSING, TTLCache
+
+verifications = metrics.counter("jwt_verifications_total", "Bearer token verifications, by result")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class _ClaimsEncoder(json.JSONEncoder):
+    # Profile claims ("usr") hold datetimes, which PyJWT only converts for exp/iat/nbf
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class TokenCodec:
+    def __init__(
+        self,
+        secret: str,
+        algorithm: str = "HS256",
+        max_entries: int = 10_000,
+        max_cache_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_cache_seconds = max_cache_seconds
+        self._clock = clock
+        self._verified = TTLCache(max_entries, max_cache_seconds, clock=clock)
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm, json_encoder=_ClaimsEncoder)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Verified claims of ``token``; raises InvalidToken if it is forged, malformed or expired"""
+        claims = self._verified.get(token)
+        if claims is not MISSING:
+            # The cache entry never outlives the token, but it can outlive
+            # "exp" by the part of a second the TTL rounds over
+            if claims["exp"] > self._clock():
+                verifications.inc(result="cached")
+                return claims
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm], options={"require": ["exp"]})
+        except jwt.InvalidTokenError as e:
+            verifications.inc(result="invalid")
+            raise InvalidToken(str(e))
+        verifications.inc(result="verified")
+        ttl = min(self.max_cache_seconds, claims["exp"] - self._clock())
+        if ttl > 0:
+            self._verified.set(token, claims, ttl=ttl)
+        return claims
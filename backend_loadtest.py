@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Domora Marketplace Backend Load Generator
+Replays the backend_test.py scenarios as weighted, concurrent user journeys
+
+    python backend_loadtest.py --stub --users 2000 --rate 500 --duration 60
+    python backend_loadtest.py --url http://localhost:8001 --weights book=1,browse=4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from backend_test import SERVICE_ADDRESS, TEST_PASSWORD, booking_payload, registration_payload
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in microseconds.
+
+    Values below 128us are counted exactly; above that every power-of-two
+    range is split into 64 linear sub-buckets, bounding the relative error of
+    any reported percentile to about 1.6% while staying a few KB in size.
+    """
+
+    SUB_BUCKETS = 128
+    HALF = SUB_BUCKETS // 2
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.total = 0
+        self.sum_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 7
+        return self.SUB_BUCKETS + (shift - 1) * self.HALF + ((value >> shift) - self.HALF)
+
+    def _value_at(self, index: int) -> int:
+        """Highest value that maps to ``index``."""
+        if index < self.SUB_BUCKETS:
+            return index
+        shift = (index - self.SUB_BUCKETS) // self.HALF + 1
+        sub = (index - self.SUB_BUCKETS) % self.HALF + self.HALF
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_us += value
+        self.max_us = max(self.max_us, value)
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile_ms(self, pct: float) -> float:
+        if not self.total:
+            return 0.0
+        target = max(1, int(round(pct / 100 * self.total)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value_at(index), self.max_us) / 1000
+        return self.max_us / 1000
+
+    @property
+    def mean_ms(self) -> float:
+        return self.sum_us / self.total / 1000 if self.total else 0.0
+
+
+class RatePacer:
+    """Spaces request starts evenly to hold an aggregate target rate.
+
+    Returns the scheduled start time, so latency measured from it includes
+    any delay the generator itself introduced (no coordinated omission).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.perf_counter()
+
+    async def wait(self) -> float:
+        now = time.perf_counter()
+        if not self.interval:
+            return now
+        slot = max(self.next_slot, now)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return slot
+
+
+@dataclass
+class LoadStats:
+    histograms: Dict[str, LatencyHistogram] = field(default_factory=lambda: defaultdict(LatencyHistogram))
+    errors: Counter = field(default_factory=Counter)
+    requests: Counter = field(default_factory=Counter)
+    journeys: Counter = field(default_factory=Counter)
+    failed_journeys: Counter = field(default_factory=Counter)
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class LoadClient:
+    """Issues paced, timed requests against the API on a shared connection pool."""
+
+    def __init__(self, api_base_url: str, session: aiohttp.ClientSession, pacer: RatePacer, stats: LoadStats):
+        self.api_base_url = api_base_url
+        self.session = session
+        self.pacer = pacer
+        self.stats = stats
+
+    async def request(self, name: str, method: str, endpoint: str, token: Optional[str] = None,
+                      expect: Tuple[int, ...] = (200,), **kwargs) -> Any:
+        """Time one request under the route template ``name``; raise ``JourneyFailed`` on errors"""
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        started = await self.pacer.wait()
+        self.stats.requests[name] += 1
+        try:
+            async with self.session.request(method, f"{self.api_base_url}{endpoint}", headers=headers, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats.histograms[name].record(time.perf_counter() - started)
+            self.stats.errors[(name, type(e).__name__)] += 1
+            raise JourneyFailed(name) from e
+
+        self.stats.histograms[name].record(time.perf_counter() - started)
+        if status not in expect:
+            self.stats.errors[(name, f"HTTP {status}")] += 1
+            raise JourneyFailed(name)
+        if not body:
+            return None
+        try:
+            return await response.json(content_type=None)
+        except ValueError:
+            return body
+
+
+class VirtualUser:
+    """One simulated app user; keeps its own token and catalog picks between journeys"""
+
+    def __init__(self, client: LoadClient, rng: random.Random, status_polls: int):
+        self.client = client
+        self.rng = rng
+        self.status_polls = status_polls
+        self.token: Optional[str] = None
+        self.email: Optional[str] = None
+        self.bookings: List[str] = []
+
+    async def _catalog(self) -> Tuple[Dict, List[str]]:
+        packages = await self.client.request("GET /services/packages", "GET", "/services/packages")
+        addons = await self.client.request("GET /services/addons", "GET", "/services/addons")
+        package = self.rng.choice(packages)
+        matching = [a["id"] for a in addons if a["service_type"] == package["service_type"]]
+        return package, self.rng.sample(matching, k=min(len(matching), self.rng.randint(0, 2)))
+
+    async def _price_estimate(self, package: Dict, addon_ids: List[str]):
+        await self.client.request(
+            "POST /services/price-estimate", "POST", "/services/price-estimate",
+            params={"package_id": package["id"]},
+            json={"service_address": SERVICE_ADDRESS, "addon_ids": addon_ids},
+        )
+
+    async def _register(self):
+        data = registration_payload("customer", "Load Test User")
+        response = await self.client.request("POST /auth/register", "POST", "/auth/register", json=data)
+        self.email = data["email"]
+        self.token = response["access_token"]
+
+    async def _login(self):
+        response = await self.client.request(
+            "POST /auth/login", "POST", "/auth/login",
+            json={"email": self.email, "password": TEST_PASSWORD},
+        )
+        self.token = response["access_token"]
+
+    async def browse(self):
+        """Anonymous catalog browsing with a quote"""
+        package, addon_ids = await self._catalog()
+        await self._price_estimate(package, addon_ids)
+
+    async def book(self):
+        """register -> login -> price-estimate -> create booking -> checkout -> status polling"""
+        if not self.token:
+            await self._register()
+        await self._login()
+        package, addon_ids = await self._catalog()
+        await self._price_estimate(package, addon_ids)
+        booking = await self.client.request(
+            "POST /bookings", "POST", "/bookings", token=self.token,
+            json=booking_payload(package, addon_ids, notes="Load test booking"),
+        )
+        self.bookings.append(booking["id"])
+        checkout = await self.client.request(
+            "POST /payments/create-checkout", "POST", "/payments/create-checkout",
+            token=self.token, params={"booking_id": booking["id"]},
+        )
+        for _ in range(self.status_polls):
+            status = await self.client.request(
+                "GET /payments/status/{session_id}", "GET", f"/payments/status/{checkout['session_id']}",
+                token=self.token,
+            )
+            if status.get("payment_status") == "paid":
+                break
+
+    async def returning(self):
+        """Existing customer checks their bookings"""
+        if not self.token:
+            await self._register()
+        else:
+            await self._login()
+        await self.client.request("GET /auth/me", "GET", "/auth/me", token=self.token)
+        await self.client.request("GET /bookings", "GET", "/bookings", token=self.token)
+        if self.bookings:
+            booking_id = self.rng.choice(self.bookings)
+            await self.client.request("GET /bookings/{id}", "GET", f"/bookings/{booking_id}", token=self.token)
+
+
+JOURNEYS = ("browse", "book", "returning")
+DEFAULT_WEIGHTS = {"browse": 5, "book": 2, "returning": 3}
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    if not spec:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f"Unknown journey '{name}', expected one of {', '.join(JOURNEYS)}")
+        weights[name] = float(value or 1)
+    return weights
+
+
+async def run_load(api_base_url: str, users: int, duration: float, rate: float, connections: int,
+                   weights: Dict[str, float], status_polls: int = 2, seed: int = 0,
+                   timeout: float = 30.0) -> Tuple[LoadStats, float]:
+    """Run ``users`` virtual users for ``duration`` seconds; return stats and elapsed time"""
+    stats = LoadStats()
+    pacer = RatePacer(rate)
+    names = list(weights)
+    cumulative = [weights[n] for n in names]
+    connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections, keepalive_timeout=30)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        client = LoadClient(api_base_url, session, pacer, stats)
+        deadline = time.perf_counter() + duration
+
+        async def virtual_user(index: int):
+            rng = random.Random(seed * 1_000_003 + index)
+            user = VirtualUser(client, rng, status_polls)
+            # Stagger start-up so the first second is not a thundering herd
+            await asyncio.sleep(rng.random() * min(1.0, duration / 10))
+            while time.perf_counter() < deadline:
+                journey = rng.choices(names, weights=cumulative)[0]
+                stats.journeys[journey] += 1
+                try:
+                    await getattr(user, journey)()
+                except JourneyFailed:
+                    stats.failed_journeys[journey] += 1
+                    user.token = None
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+    return stats, elapsed
+
+
+def format_report(stats: LoadStats, elapsed: float) -> str:
+    lines = []
+    header = (f"{'endpoint':<36}{'count':>8}{'errors':>8}{'rps':>9}"
+              f"{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}{'max':>9}")
+    lines.append(header)
+    lines.append("-" * len(header))
+    errors_by_endpoint = Counter()
+    for (name, _), count in stats.errors.items():
+        errors_by_endpoint[name] += count
+    total = LatencyHistogram()
+    for name in sorted(stats.histograms):
+        hist = stats.histograms[name]
+        total.merge(hist)
+        lines.append(
+            f"{name:<36}{hist.total:>8}{errors_by_endpoint[name]:>8}{hist.total / elapsed:>9.1f}"
+            f"{hist.percentile_ms(50):>9.1f}{hist.percentile_ms(90):>9.1f}{hist.percentile_ms(99):>9.1f}"
+            f"{hist.percentile_ms(99.9):>9.1f}{hist.max_us / 1000:>9.1f}"
+        )
+    lines.append("-" * len(header))
+    lines.append(
+        f"{'ALL':<36}{total.total:>8}{sum(errors_by_endpoint.values()):>8}{total.total / elapsed:>9.1f}"
+        f"{total.percentile_ms(50):>9.1f}{total.percentile_ms(90):>9.1f}{total.percentile_ms(99):>9.1f}"
+        f"{total.percentile_ms(99.9):>9.1f}{total.max_us / 1000:>9.1f}"
+    )
+    lines.append("(latencies in ms)")
+
+    lines.append("\nJourneys:")
+    for journey, count in sorted(stats.journeys.items()):
+        lines.append(f"   • {journey}: {count} started, {stats.failed_journeys[journey]} failed")
+
+    if stats.errors:
+        lines.append("\nErrors:")
+        for (name, kind), count in stats.errors.most_common():
+            lines.append(f"   • {name}: {kind} x{count}")
+    return "\n".join(lines)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(api_base_url: str, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            try:
+                async with session.get(f"{api_base_url}/services/packages") as response:
+                    if response.status == 200 and await response.json():
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Stub backend did not become ready at {api_base_url}")
+
+
+def start_stub_backend(latency_ms: float, bcrypt_rounds: int, rate_limit: bool = False) -> Tuple[subprocess.Popen, str]:
+    """Launch tests.stub_server in a child process so it does not share our event loop"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "tests.stub_server", "--port", str(port),
+         "--latency-ms", str(latency_ms), "--bcrypt-rounds", str(bcrypt_rounds)]
+        + (["--rate-limit"] if rate_limit else []),
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return process, f"http://127.0.0.1:{port}/api"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=os.getenv("DOMORA_BACKEND_URL", "http://localhost:8001"),
+                        help="backend base URL (without /api)")
+    target.add_argument("--stub", action="store_true",
+                        help="start a local backend with in-memory Mongo and stubbed integrations")
+    parser.add_argument("--users", type=int, default=100, help="concurrent virtual users")
+    parser.add_argument("--rate", type=float, default=0, help="target requests/second across all users (0 = unpaced)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--weights", type=parse_weights, default=dict(DEFAULT_WEIGHTS),
+                        help="journey weights, e.g. browse=5,book=2,returning=3")
+    parser.add_argument("--status-polls", type=int, default=2, help="payment status polls per booking")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-latency-ms", type=float, default=0,
+                        help="simulated Google Maps/Stripe/SMTP latency for --stub")
+    parser.add_argument("--stub-bcrypt-rounds", type=int, default=0,
+                        help="password hashing cost for --stub (0 = production default)")
+    parser.add_argument("--stub-rate-limit", action="store_true",
+                        help="keep request rate limiting on in the --stub backend (off by default)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    process = None
+    api_base_url = f"{args.url.rstrip('/')}/api"
+    if args.stub:
+        process, api_base_url = start_stub_backend(args.stub_latency_ms, args.stub_bcrypt_rounds, args.stub_rate_limit)
+
+    try:
+        if process:
+            await _wait_until_ready(api_base_url)
+        print("🚀 Starting Domora Marketplace Load Test")
+        print(f"📍 Target: {api_base_url}  users={args.users} rate={args.rate or 'unpaced'} "
+              f"duration={args.duration}s weights={args.weights}")
+        stats, elapsed = await run_load(
+            api_base_url, args.users, args.duration, args.rate, args.connections,
+            args.weights, args.status_polls, args.seed, args.timeout,
+        )
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print("=" * 60)
+    print(format_report(stats, elapsed))
+    return 0 if not stats.errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -18,11 +18,41 @@ load_dotenv('/app/frontend/.env')
 
 # Configuration
 # Use localhost for testing since external URL mapping has issues in container environment
-BACKEND_URL = "http://localhost:8001"
+BACKEND_URL = os.getenv("DOMORA_BACKEND_URL", "http://localhost:8001")
 API_BASE_URL = f"{BACKEND_URL}/api"
 
+TEST_PASSWORD = "SecurePass123!"
+SERVICE_ADDRESS = {
+    "street": "Trubarjeva cesta 1",
+    "city": "Ljubljana",
+    "postal_code": "1000",
+    "country": "Slovenia"
+}
+
+# Scenario payloads, shared with backend_loadtest.py
+def registration_payload(role: str, full_name: str) -> Dict[str, Any]:
+    """Registration body for a fresh, unique user"""
+    return {
+        "email": f"{role}_{uuid.uuid4().hex[:8]}@test.com",
+        "password": TEST_PASSWORD,
+        "full_name": full_name,
+        "role": role
+    }
+
+def booking_payload(package: Dict[str, Any], addon_ids: list, notes: Optional[str] = None) -> Dict[str, Any]:
+    """Booking body for tomorrow at the shared test address"""
+    return {
+        "service_type": package['service_type'],
+        "package_id": package['id'],
+        "addon_ids": addon_ids,
+        "service_address": dict(SERVICE_ADDRESS),
+        "scheduled_datetime": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "notes": notes
+    }
+
 class DomoraAPITester:
-    def __init__(self):
+    def __init__(self, api_base_url: str = API_BASE_URL):
+        self.api_base_url = api_base_url
         self.session = None
         self.customer_token = None
         self.provider_token = None
@@ -58,7 +88,7 @@ class DomoraAPITester:
     async def make_request(self, method: str, endpoint: str, data: Dict = None, 
                           headers: Dict = None, token: str = None) -> tuple:
         """Make HTTP request and return (success, response_data, status_code)"""
-        url = f"{API_BASE_URL}{endpoint}"
+        url = f"{self.api_base_url}{endpoint}"
         
         request_headers = {'Content-Type': 'application/json'}
         if headers:
@@ -85,13 +115,7 @@ class DomoraAPITester:
     # Authentication Tests
     async def test_customer_registration(self):
         """Test customer registration"""
-        test_email = f"customer_{uuid.uuid4().hex[:8]}@test.com"
-        registration_data = {
-            "email": test_email,
-            "password": "SecurePass123!",
-            "full_name": "Maria Silva",
-            "role": "customer"
-        }
+        registration_data = registration_payload("customer", "Maria Silva")
         
         success, response, status = await self.make_request(
             'POST', '/auth/register', registration_data
@@ -106,13 +130,7 @@ class DomoraAPITester:
     
     async def test_provider_registration(self):
         """Test provider registration"""
-        test_email = f"provider_{uuid.uuid4().hex[:8]}@test.com"
-        registration_data = {
-            "email": test_email,
-            "password": "SecurePass123!",
-            "full_name": "João Santos",
-            "role": "provider"
-        }
+        registration_data = registration_payload("provider", "João Santos")
         
         success, response, status = await self.make_request(
             'POST', '/auth/register', registration_data
@@ -133,7 +151,7 @@ class DomoraAPITester:
             
         login_data = {
             "email": self.customer_user['email'],
-            "password": "SecurePass123!"
+            "password": TEST_PASSWORD
         }
         
         success, response, status = await self.make_request(
@@ -510,19 +528,11 @@ class DomoraAPITester:
             self.log_result("Create Booking", False, "Missing customer token or test package")
             return
             
-        booking_data = {
-            "service_type": self.test_package['service_type'],
-            "package_id": self.test_package['id'],
-            "addon_ids": [self.test_addon['id']] if hasattr(self, 'test_addon') else [],
-            "service_address": {
-                "street": "Trubarjeva cesta 1",
-                "city": "Ljubljana",
-                "postal_code": "1000",
-                "country": "Slovenia"
-            },
-            "scheduled_datetime": (datetime.utcnow() + timedelta(days=1)).isoformat(),
-            "notes": "Test booking for API validation"
-        }
+        booking_data = booking_payload(
+            self.test_package,
+            [self.test_addon['id']] if hasattr(self, 'test_addon') else [],
+            notes="Test booking for API validation"
+        )
         
         success, response, status = await self.make_request(
             'POST', '/bookings', booking_data, token=self.customer_token
@@ -690,7 +700,7 @@ class DomoraAPITester:
     async def run_all_tests(self):
         """Run all API tests"""
         print("🚀 Starting Domora Marketplace Backend API Tests")
-        print(f"📍 Testing against: {API_BASE_URL}")
+        print(f"📍 Testing against: {self.api_base_url}")
         print("=" * 60)
         
         # Authentication Tests
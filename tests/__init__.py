@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The backend runs with its own directory on sys.path (``uvicorn server:app``
+# from ``backend/``), so sibling modules such as ``enhanced_services`` are
+# imported by their bare name. Mirror that layout for tests and benchmarks.
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,303 @@
+"""Benchmark the real FastAPI app in-process over an ASGI transport.
+
+The database is the in-memory stand-in from ``tests.memory_db`` and Google
+Maps, Stripe and SMTP are replaced by the fakes in ``tests.stubs``, so runs are
+reproducible on any machine. Examples::
+
+    python -m tests.benchmarks.bench_api --scale 1000 --iterations 300
+    python -m tests.benchmarks.bench_api --latency-ms 20 --concurrency 8
+    python -m tests.benchmarks.bench_api --save tests/benchmarks/baselines/api.json
+    python -m tests.benchmarks.bench_api --compare tests/benchmarks/baselines/api.json
+"""
+
+import argparse
+import asyncio
+import copy
+import logging
+import sys
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from passlib.hash import bcrypt
+
+from tests.memory_db import MemoryDB
+from tests.stubs import IntegrationLatency, install_stub_modules, patch_integrations, reset_integrations
+from tests.benchmarks.harness import (
+    BenchmarkResult,
+    compare_to_baseline,
+    format_table,
+    load_baseline,
+    measure,
+    save_baseline,
+)
+
+install_stub_modules()
+
+from backend import server  # noqa: E402
+from enhanced_services import ENHANCED_SERVICE_DATA  # noqa: E402
+
+SCENARIOS = ("login", "catalog", "price_estimate", "price_batch", "create_booking", "list_bookings")
+PASSWORD = "SecurePass123!"
+ADDRESS = {
+    "street": "Trubarjeva cesta 1",
+    "city": "Ljubljana",
+    "postal_code": "1000",
+    "country": "Slovenia",
+}
+
+
+@dataclass
+class BenchConfig:
+    scale: int = 100  # number of seeded customers
+    bookings_per_customer: int = 5
+    providers: int = 10
+    iterations: int = 200
+    concurrency: int = 1
+    warmup: int = 5
+    latency_ms: float = 0.0  # simulated latency of every external call
+    bcrypt_rounds: int = 4  # production hashes use 12; lower keeps login about the app
+    scenarios: List[str] = field(default_factory=lambda: list(SCENARIOS))
+
+
+class BenchEnvironment:
+    """Seeds an in-memory database and wires ``server`` to it and the fakes."""
+
+    def __init__(self, config: BenchConfig):
+        self.config = config
+        self.db = MemoryDB()
+        self.customers: List[Dict] = []
+        self.tokens: List[str] = []
+        self.providers: List[Dict] = []
+        self.packages: List[Dict] = []
+        self.addons: List[Dict] = []
+        self._saved_db = None
+        self._saved_limiter = None
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "BenchEnvironment":
+        self._saved_db = server.db
+        self._saved_limiter = server.rate_limiter
+        await self._seed()
+        server.db = self.db
+        # Every request comes from one address; measure the endpoints, not the throttle
+        server.rate_limiter = server.rate_limit.RateLimiter(None)
+        patch_integrations(IntegrationLatency.uniform(self.config.latency_ms / 1000))
+        transport = httpx.ASGITransport(app=server.app)
+        self.client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        server.db = self._saved_db
+        server.rate_limiter = self._saved_limiter
+        reset_integrations()
+
+    async def _seed(self):
+        config = self.config
+        now = datetime.utcnow()
+
+        self.packages = copy.deepcopy(ENHANCED_SERVICE_DATA["packages"])
+        self.addons = copy.deepcopy(ENHANCED_SERVICE_DATA["addons"])
+        await self.db.service_packages.insert_many(self.packages)
+        await self.db.service_addons.insert_many(self.addons)
+
+        password_hash = bcrypt.using(rounds=config.bcrypt_rounds).hash(PASSWORD)
+        for i in range(config.scale):
+            user = {
+                "id": f"customer-{i}",
+                "email": f"customer{i}@bench-domora.com",
+                "full_name": f"Customer {i}",
+                "role": server.UserRole.CUSTOMER,
+                "password": password_hash,
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self.customers.append(user)
+            self.tokens.append(server.create_access_token(data={"sub": user["id"]}))
+        await self.db.users.insert_many(self.customers)
+
+        for i in range(config.providers):
+            self.providers.append({
+                "id": f"provider-{i}",
+                "user_id": f"provider-user-{i}",
+                "business_name": f"Provider {i}",
+                "description": "Benchmark provider",
+                "service_types": [server.ServiceType.HOUSE_CLEANING],
+                "service_areas": [{
+                    **ADDRESS,
+                    "latitude": 46.0569 + 0.05 * i,
+                    "longitude": 14.5058 + 0.05 * i,
+                }],
+                "availability": {},
+                "rating": 4.5,
+                "total_reviews": 10,
+                "is_verified": True,
+                "created_at": now,
+            })
+        await self.db.provider_profiles.insert_many(self.providers)
+
+        bookings = []
+        for i in range(config.scale * config.bookings_per_customer):
+            package = self.packages[i % len(self.packages)]
+            bookings.append({
+                "id": f"booking-{i}",
+                "customer_id": f"customer-{i % config.scale}",
+                "provider_id": self.providers[i % len(self.providers)]["id"] if i % 3 else None,
+                "service_type": package["service_type"],
+                "package_id": package["id"],
+                "addon_ids": [],
+                "service_address": {**ADDRESS, "latitude": 46.0569, "longitude": 14.5058},
+                "scheduled_datetime": now + timedelta(hours=i % 720),
+                "status": server.BookingStatus.PENDING,
+                "price_estimate": {
+                    "base_price": package["base_price"],
+                    "addons_price": 0.0,
+                    "travel_fee": 0.0,
+                    "total_price": package["base_price"],
+                    "currency": "EUR",
+                    "breakdown": {package["name"]: package["base_price"]},
+                },
+                "payment_status": server.PaymentStatus.PENDING,
+                "notes": None,
+                "created_at": now,
+                "updated_at": now,
+            })
+        await self.db.bookings.insert_many(bookings)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = await self.client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+        return response
+
+    def _auth(self, i: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[i % len(self.tokens)]}"}
+
+    async def login(self, i: int):
+        customer = self.customers[i % len(self.customers)]
+        await self._request("POST", "/api/auth/login", json={"email": customer["email"], "password": PASSWORD})
+
+    async def catalog(self, i: int):
+        await self._request("GET", "/api/services/packages")
+
+    async def price_estimate(self, i: int):
+        package = self.packages[i % len(self.packages)]
+        provider = self.providers[i % len(self.providers)]
+        await self._request(
+            "POST",
+            "/api/services/price-estimate",
+            params={"package_id": package["id"], "provider_id": provider["id"]},
+            json={"service_address": ADDRESS, "addon_ids": []},
+        )
+
+    async def price_batch(self, i: int):
+        """Every package against every provider for one address, in one request"""
+        quotes = [
+            {"package_id": package["id"], "addon_ids": [], "provider_id": provider["id"]}
+            for package in self.packages
+            for provider in self.providers
+        ]
+        await self._request(
+            "POST",
+            "/api/services/price-estimate/batch",
+            json={"service_address": ADDRESS, "quotes": quotes},
+        )
+
+    async def create_booking(self, i: int):
+        package = self.packages[i % len(self.packages)]
+        await self._request(
+            "POST",
+            "/api/bookings",
+            headers=self._auth(i),
+            json={
+                "service_type": package["service_type"],
+                "package_id": package["id"],
+                "addon_ids": [],
+                "service_address": ADDRESS,
+                "scheduled_datetime": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+                "notes": "benchmark",
+            },
+        )
+
+    async def list_bookings(self, i: int):
+        await self._request("GET", "/api/bookings", headers=self._auth(i))
+
+
+async def run_benchmarks(config: BenchConfig) -> List[BenchmarkResult]:
+    unknown = set(config.scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = []
+    async with BenchEnvironment(config) as env:
+        for name in config.scenarios:
+            results.append(await measure(
+                name,
+                getattr(env, name),
+                iterations=config.iterations,
+                concurrency=config.concurrency,
+                warmup=config.warmup,
+                scale=config.scale,
+            ))
+    return results
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=BenchConfig.scale, help="number of seeded customers")
+    parser.add_argument("--bookings-per-customer", type=int, default=BenchConfig.bookings_per_customer)
+    parser.add_argument("--providers", type=int, default=BenchConfig.providers)
+    parser.add_argument("--iterations", type=int, default=BenchConfig.iterations)
+    parser.add_argument("--concurrency", type=int, default=BenchConfig.concurrency)
+    parser.add_argument("--warmup", type=int, default=BenchConfig.warmup)
+    parser.add_argument("--latency-ms", type=float, default=BenchConfig.latency_ms,
+                        help="simulated latency of Google Maps, Stripe and SMTP calls")
+    parser.add_argument("--bcrypt-rounds", type=int, default=BenchConfig.bcrypt_rounds)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios",
+                        help="run only the given scenario (repeatable)")
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # server.py configures INFO logging; per-request client logs would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    config = BenchConfig(
+        scale=args.scale,
+        bookings_per_customer=args.bookings_per_customer,
+        providers=args.providers,
+        iterations=args.iterations,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        latency_ms=args.latency_ms,
+        bcrypt_rounds=args.bcrypt_rounds,
+        scenarios=args.scenarios or list(SCENARIOS),
+    )
+    results = asyncio.run(run_benchmarks(config))
+    print(format_table(results))
+
+    if args.save:
+        save_baseline(results, args.save, params=asdict(config))
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        regressions = compare_to_baseline(results, load_baseline(args.compare), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Throughput of the pricing rules engine.
+
+Compares the original per-call approach (parse the travel fee env vars, then
+compute inline) with compiled ``PricingRules`` for single estimates and for
+banding whole distance arrays as the batch endpoint does::
+
+    python -m tests.benchmarks.bench_pricing --iterations 200000
+    python -m tests.benchmarks.bench_pricing --rules pricing.json --batch-size 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import pricing
+
+SAMPLE_RULES = {
+    "version": "bench",
+    "travel_bands": [
+        {"from_km": 0, "fee_per_km": 0.0},
+        {"from_km": 15, "fee_per_km": 0.5},
+        {"from_km": 40, "fee_per_km": 0.8},
+        {"from_km": 80, "fee_per_km": 1.2},
+    ],
+    "service_type_surcharges": {"landscaping": 5.0, "car_washing": 2.0},
+    "weekend_multiplier": 1.15,
+    "emergency_multiplier": 1.5,
+}
+
+
+def legacy_estimate(base_price: float, addons_price: float, distance_km: float) -> float:
+    """The pre-rules path: env vars parsed on every call"""
+    free_radius = float(os.getenv("FREE_TRAVEL_RADIUS_KM", 15))
+    fee_per_km = float(os.getenv("TRAVEL_FEE_PER_KM", 0.50))
+    travel_fee = 0.0 if distance_km <= free_radius else (distance_km - free_radius) * fee_per_km
+    return base_price + addons_price + travel_fee
+
+
+def ops_per_second(operation: Callable[[int], object], iterations: int) -> float:
+    for i in range(min(iterations, 1000)):
+        operation(i)
+    started = time.perf_counter()
+    for i in range(iterations):
+        operation(i)
+    return iterations / (time.perf_counter() - started)
+
+
+def run(rules: pricing.PricingRules, iterations: int, batch_size: int) -> List[Dict[str, float]]:
+    distances = np.random.default_rng(7).uniform(0, 120, size=max(batch_size, 1024))
+    scalar_distances = distances.tolist()
+    weekday, saturday = datetime(2025, 6, 4, 10), datetime(2025, 6, 7, 10)
+    mask = len(scalar_distances) - 1
+
+    def compiled(i):
+        fee = rules.travel_fee(scalar_distances[i & mask])
+        return rules.evaluate(80.0, 15.0, fee, "house_cleaning", "Quick Tidy", saturday if i & 1 else weekday)
+
+    batch = distances[:batch_size]
+    batches = max(iterations // batch_size, 1)
+    results = [
+        {"case": "legacy (env per call)", "ops": ops_per_second(
+            lambda i: legacy_estimate(80.0, 15.0, scalar_distances[i & mask]), iterations)},
+        {"case": "compiled rules", "ops": ops_per_second(compiled, iterations)},
+        {"case": f"travel fees, batch of {batch_size}",
+         "ops": ops_per_second(lambda i: rules.travel_fee(batch), batches) * batch_size},
+    ]
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=300)
+    parser.add_argument("--rules", help="JSON rules file (defaults to a four-band sample)")
+    args = parser.parse_args(argv)
+
+    config = SAMPLE_RULES
+    if args.rules:
+        with open(args.rules) as f:
+            config = json.load(f)
+    rules = pricing.compile_rules(config)
+
+    print(f"{'case':<32}{'estimates/s':>14}")
+    for result in run(rules, args.iterations, args.batch_size):
+        print(f"{result['case']:<32}{result['ops']:>14,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
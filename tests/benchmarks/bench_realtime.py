@@ -0,0 +1,104 @@
+"""Memory and fan-out cost of idle WebSocket connections on one worker.
+
+Opens ``--connections`` fake sockets through ``realtime.serve`` (the same
+coroutine the /api/ws endpoint runs), each subscribed to its own booking
+topic, and leaves them idle. Reports the memory held per connection, the time
+to deliver one event to a single booking and to a topic every connection
+subscribes to::
+
+    python -m tests.benchmarks.bench_realtime --connections 10000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from tests.benchmarks.harness import percentile
+
+import realtime
+
+
+class IdleSocket:
+    """Sends nothing until told to; counts what the server writes"""
+
+    def __init__(self):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.sent = 0
+
+    async def receive_text(self) -> str:
+        return await self.inbox.get()
+
+    async def send_text(self, text: str):
+        self.sent += 1
+
+
+async def allow(channel: str, key: str) -> bool:
+    return True
+
+
+async def run(connections: int, deliveries: int = 200) -> Dict[str, float]:
+    hub = realtime.Hub()
+    sockets = [IdleSocket() for _ in range(connections)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(realtime.serve(s, f"user-{i}", hub, allow)) for i, s in enumerate(sockets)]
+    for i, socket in enumerate(sockets):
+        socket.inbox.put_nowait(json.dumps({"action": "subscribe", "id": f"b{i}"}))
+        socket.inbox.put_nowait(json.dumps({"action": "subscribe", "id": "everyone"}))
+    while sum(s.sent for s in sockets) < 2 * connections:
+        await asyncio.sleep(0.01)
+    setup_seconds = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    single: List[float] = []
+    for i in range(deliveries):
+        t0 = time.perf_counter()
+        hub.deliver(realtime.topic("booking", f"b{i % connections}"), {"type": "booking.updated"})
+        single.append(time.perf_counter() - t0)
+
+    async def sent(count: int):
+        while sum(s.sent for s in sockets) < count:
+            await asyncio.sleep(0.01)
+
+    await sent(2 * connections + deliveries)
+    t0 = time.perf_counter()
+    hub.deliver(realtime.topic("booking", "everyone"), {"type": "booking.updated"})
+    broadcast_queue = time.perf_counter() - t0
+    await sent(3 * connections + deliveries)
+    broadcast_sent = time.perf_counter() - t0
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "connections": connections,
+        "setup_s": setup_seconds,
+        "kb_per_connection": held / connections / 1024,
+        "deliver_one_p50_us": percentile(single, 50) * 1e6,
+        "deliver_one_p99_us": percentile(single, 99) * 1e6,
+        "broadcast_queue_ms": broadcast_queue * 1000,
+        "broadcast_sent_ms": broadcast_sent * 1000,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.connections))
+    for name, value in result.items():
+        print(f"{name:<24}{value:>14,.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Measure API cold start: process spawn to first successful request.
+
+Each trial launches a fresh interpreter that imports ``server``, runs the
+startup hooks and serves ``GET /api/services/packages`` in-process. The
+parent reports per-phase timings and checks the total against a
+time-to-first-request budget::
+
+    python -m tests.benchmarks.bench_startup --trials 5 --budget-ms 1500
+    python -m tests.benchmarks.bench_startup --mongo   # use MONGO_URL instead of the in-memory stand-in
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from tests.benchmarks.harness import percentile
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Integrations that should not be imported before a request needs them
+HEAVY_MODULES = ("googlemaps", "emergentintegrations", "smtplib", "email.mime.text", "passlib.context")
+
+
+def _child(use_mongo: bool):
+    """Runs inside the spawned interpreter; prints one JSON line of timings"""
+    started = time.perf_counter()
+    import asyncio
+    import logging
+
+    import httpx
+
+    from backend import server
+
+    imported = time.perf_counter()
+    heavy_after_import = [name for name in HEAVY_MODULES if name in sys.modules]
+    logging.disable(logging.INFO)
+
+    if not use_mongo:
+        from tests.memory_db import MemoryDB
+        server.db = MemoryDB()
+
+    async def serve_first_request():
+        async with server.app.router.lifespan_context(server.app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+                response = await client.get("/api/services/packages")
+                response.raise_for_status()
+            return ready, time.perf_counter()
+
+    ready, first_response = asyncio.run(serve_first_request())
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (first_response - ready) * 1000,
+        "server_phases_ms": {k: v * 1000 for k, v in server.startup_timings.items()},
+        "heavy_modules_after_import": heavy_after_import,
+    }))
+
+
+def run_trial(use_mongo: bool = False) -> Dict:
+    spawned = time.perf_counter()
+    command = [sys.executable, "-m", "tests.benchmarks.bench_startup", "--child"]
+    if use_mongo:
+        command.append("--mongo")
+    output = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    total_ms = (time.perf_counter() - spawned) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total_ms"] = total_ms
+    result["interpreter_ms"] = total_ms - result["import_ms"] - result["startup_ms"] - result["first_request_ms"]
+    return result
+
+
+def summarize(trials: List[Dict]) -> Dict[str, Dict[str, float]]:
+    phases = ("interpreter_ms", "import_ms", "startup_ms", "first_request_ms", "total_ms")
+    return {
+        phase: {
+            "p50": percentile([t[phase] for t in trials], 50),
+            "max": max(t[phase] for t in trials),
+        }
+        for phase in phases
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500,
+                        help="p50 time-to-first-request budget, spawn to first response")
+    parser.add_argument("--mongo", action="store_true", help="use the real MONGO_URL database")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.mongo)
+        return 0
+
+    trials = [run_trial(args.mongo) for _ in range(args.trials)]
+    summary = summarize(trials)
+    print(f"{'phase':<20}{'p50 ms':>10}{'max ms':>10}")
+    for phase, stats in summary.items():
+        print(f"{phase:<20}{stats['p50']:>10.1f}{stats['max']:>10.1f}")
+
+    heavy = sorted({name for t in trials for name in t["heavy_modules_after_import"]})
+    if heavy:
+        print(f"\nEagerly imported integrations: {', '.join(heavy)}")
+
+    total = summary["total_ms"]["p50"]
+    within = total <= args.budget_ms
+    print(f"\nTime to first request p50 {total:.0f} ms, budget {args.budget_ms:.0f} ms: {'OK' if within else 'OVER BUDGET'}")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
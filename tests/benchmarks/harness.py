@@ -0,0 +1,166 @@
+"""Timing, percentile and baseline helpers shared by the benchmark scripts."""
+
+import asyncio
+import json
+import math
+import platform
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples`` (``pct`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    scale: int
+    iterations: int
+    concurrency: int
+    wall_seconds: float
+    samples: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.iterations / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def p50_ms(self) -> float:
+        return percentile(self.samples, 50) * 1000
+
+    @property
+    def p99_ms(self) -> float:
+        return percentile(self.samples, 99) * 1000
+
+    @property
+    def mean_ms(self) -> float:
+        return sum(self.samples) / len(self.samples) * 1000 if self.samples else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "scale": self.scale,
+            "iterations": self.iterations,
+            "concurrency": self.concurrency,
+            "throughput": round(self.throughput, 2),
+            "p50_ms": round(self.p50_ms, 3),
+            "p99_ms": round(self.p99_ms, 3),
+            "mean_ms": round(self.mean_ms, 3),
+        }
+
+
+async def measure(
+    name: str,
+    operation: Callable[[int], Awaitable[None]],
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 0,
+    scale: int = 0,
+) -> BenchmarkResult:
+    """Run ``operation(i)`` ``iterations`` times across ``concurrency`` workers.
+
+    Each call is timed individually; throughput is derived from the wall time
+    of the whole run so it reflects contention between concurrent callers.
+    """
+    for i in range(warmup):
+        await operation(-1 - i)
+
+    samples: List[float] = []
+    counter = iter(range(iterations))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            await operation(i)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - started
+
+    return BenchmarkResult(
+        name=name,
+        scale=scale,
+        iterations=iterations,
+        concurrency=concurrency,
+        wall_seconds=wall,
+        samples=samples,
+    )
+
+
+def format_table(results: List[BenchmarkResult]) -> str:
+    header = f"{'benchmark':<18}{'scale':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        lines.append(
+            f"{result.name:<18}{result.scale:>8}{result.throughput:>12.1f}"
+            f"{result.p50_ms:>10.2f}{result.p99_ms:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def save_baseline(results: List[BenchmarkResult], path: Path, params: Optional[Dict] = None):
+    """Write results to ``path`` as JSON for later ``compare_to_baseline`` runs."""
+    payload = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params or {},
+        "results": {result.name: result.summary() for result in results},
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+
+
+def load_baseline(path: Path) -> Dict:
+    return json.loads(Path(path).read_text())
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return (self.current - self.baseline) / self.baseline if self.baseline else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name}.{self.metric}: {self.baseline:.3f} -> {self.current:.3f} ({self.change:+.0%})"
+
+
+def compare_to_baseline(results: List[BenchmarkResult], baseline: Dict, tolerance: float = 0.2) -> List[Regression]:
+    """Return metrics that got worse than ``baseline`` by more than ``tolerance``.
+
+    Latency percentiles regress when they grow; throughput regresses when it
+    shrinks. Benchmarks missing from the baseline are ignored.
+    """
+    regressions = []
+    recorded = baseline.get("results", {})
+    for result in results:
+        previous = recorded.get(result.name)
+        if not previous:
+            continue
+        current = result.summary()
+        for metric in ("p50_ms", "p99_ms"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(Regression(result.name, metric, previous[metric], current[metric]))
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(Regression(result.name, "throughput", previous["throughput"], current["throughput"]))
+    return regressions
+
+
+def results_to_json(results: List[BenchmarkResult]) -> str:
+    return json.dumps([{"name": r.name, **r.summary()} for r in results], indent=2)
+
@@ -0,0 +1,29 @@
+import pytest
+
+from tests.benchmarks.bench_api import SCENARIOS, BenchConfig, run_benchmarks
+from tests.benchmarks.harness import compare_to_baseline, load_baseline, save_baseline
+
+
+@pytest.mark.asyncio
+async def test_benchmark_scenarios_run_against_in_memory_stack(tmp_path):
+    config = BenchConfig(scale=10, bookings_per_customer=2, providers=2, iterations=5, warmup=1)
+
+    results = await run_benchmarks(config)
+
+    assert [r.name for r in results] == list(SCENARIOS)
+    for result in results:
+        assert len(result.samples) == config.iterations
+        assert result.p99_ms >= result.p50_ms > 0
+        assert result.throughput > 0
+
+    baseline_path = tmp_path / "baseline.json"
+    save_baseline(results, baseline_path, params={"scale": config.scale})
+    baseline = load_baseline(baseline_path)
+    assert compare_to_baseline(results, baseline) == []
+
+    # A baseline ten times faster than this run must be reported as a regression.
+    for summary in baseline["results"].values():
+        summary["p50_ms"] /= 10
+        summary["throughput"] *= 10
+    regressions = compare_to_baseline(results, baseline)
+    assert {r.metric for r in regressions} >= {"p50_ms", "throughput"}
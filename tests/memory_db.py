@@ -0,0 +1,901 @@
+"""In-memory stand-in for the subset of the Motor API used by the backend.
+
+Collections keep documents in insertion order and evaluate queries with
+MongoDB semantics for the operators the backend relies on. Equality lookups
+are served from hash indexes (``id`` is always indexed, more can be added with
+``create_index``), so fixtures with hundreds of thousands of documents stay
+fast. Meant for unit tests and benchmarks that need the real FastAPI app
+without a running ``mongod``.
+
+Stored documents are never mutated in place: updates replace them with a
+modified copy. Read results are shallow copies, so callers must not mutate
+nested values of returned documents.
+"""
+
+import re
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+# --------------------------------------------------------------------------
+# Value helpers
+# --------------------------------------------------------------------------
+
+def _clone(value: Any) -> Any:
+    """Deep copy limited to the container types BSON documents use."""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+def _lookup(doc: Any, path: str) -> Any:
+    """Resolve a dotted ``path``; array segments fan out like MongoDB does.
+
+    Returns ``_MISSING`` when the path does not exist. When the path crosses an
+    array without a numeric index, the result is the list of values found in
+    each element.
+    """
+    if "." not in path and isinstance(doc, dict):
+        return doc.get(path, _MISSING)
+    current = doc
+    parts = path.split(".")
+    for i, part in enumerate(parts):
+        if isinstance(current, dict):
+            current = current.get(part, _MISSING)
+        elif isinstance(current, list):
+            if part.isdigit():
+                index = int(part)
+                current = current[index] if index < len(current) else _MISSING
+            else:
+                rest = ".".join(parts[i:])
+                values = [_lookup(item, rest) for item in current if isinstance(item, dict)]
+                values = [v for v in values if v is not _MISSING]
+                return values if values else _MISSING
+        else:
+            return _MISSING
+        if current is _MISSING:
+            return _MISSING
+    return current
+
+
+_TYPE_ORDER = (
+    (type(None), 1),
+    (bool, 8),
+    (int, 2),
+    (float, 2),
+    (str, 3),
+    (dict, 4),
+    (list, 5),
+    (ObjectId, 7),
+    (datetime, 9),
+)
+
+
+def _type_rank(value: Any) -> int:
+    if value is _MISSING:
+        return 0
+    for kind, rank in _TYPE_ORDER:
+        if isinstance(value, kind):
+            return rank
+    return 10
+
+
+def _sort_key(value: Any) -> Tuple:
+    if value is _MISSING or value is None:
+        return (1, 0)
+    rank = _type_rank(value)
+    if rank in (4, 5):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+def _compare(value: Any, op: str, arg: Any) -> bool:
+    if value is _MISSING or value is None or arg is None:
+        return False
+    if _type_rank(value) != _type_rank(arg):
+        return False
+    try:
+        if op == "$gt":
+            return value > arg
+        if op == "$gte":
+            return value >= arg
+        if op == "$lt":
+            return value < arg
+        return value <= arg
+    except TypeError:
+        return False
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if value == expected:
+        return True
+    if isinstance(value, list) and not isinstance(expected, list):
+        return any(item == expected for item in value)
+    return False
+
+
+# --------------------------------------------------------------------------
+# Query matching
+# --------------------------------------------------------------------------
+
+def _match_operator(value: Any, op: str, arg: Any) -> bool:
+    if op == "$eq":
+        return _equals(value, arg)
+    if op == "$ne":
+        return not _equals(value, arg)
+    if op == "$in":
+        return any(_equals(value, candidate) for candidate in arg)
+    if op == "$nin":
+        return not any(_equals(value, candidate) for candidate in arg)
+    if op == "$exists":
+        return bool(arg) == (value is not _MISSING)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        if isinstance(value, list):
+            return any(_compare(item, op, arg) for item in value)
+        return _compare(value, op, arg)
+    if op == "$not":
+        return not _match_condition(value, arg)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == arg
+    if op == "$regex":
+        pattern = arg if hasattr(arg, "search") else re.compile(arg)
+        return isinstance(value, str) and bool(pattern.search(value))
+    if op == "$options":
+        return True
+    if op == "$elemMatch":
+        return isinstance(value, list) and any(
+            matches(item, arg) if isinstance(item, dict) else _match_condition(item, arg) for item in value
+        )
+    raise NotImplementedError(f"Unsupported query operator: {op}")
+
+
+def _is_operator_dict(condition: Any) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(k.startswith("$") for k in condition)
+
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if _is_operator_dict(condition):
+        if "$regex" in condition and "$options" in condition:
+            flags = re.IGNORECASE if "i" in condition["$options"] else 0
+            condition = {**condition, "$regex": re.compile(condition["$regex"], flags)}
+        return all(_match_operator(value, op, arg) for op, arg in condition.items())
+    if hasattr(condition, "search") and hasattr(condition, "pattern"):
+        return isinstance(value, str) and bool(condition.search(value))
+    return _equals(value, condition)
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Return True when ``doc`` satisfies the MongoDB filter ``query``."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, sub) for sub in condition):
+                return False
+        elif not _match_condition(_lookup(doc, key), condition):
+            return False
+    return True
+
+
+# --------------------------------------------------------------------------
+# Updates and projection
+# --------------------------------------------------------------------------
+
+def _parent(doc: Dict[str, Any], path: str, create: bool) -> Tuple[Any, str]:
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        if isinstance(current, list) and part.isdigit():
+            current = current[int(part)]
+            continue
+        if part not in current or not isinstance(current[part], (dict, list)):
+            if not create:
+                return None, parts[-1]
+            current[part] = {}
+        current = current[part]
+    return current, parts[-1]
+
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any):
+    parent, leaf = _parent(doc, path, create=True)
+    if isinstance(parent, list) and leaf.isdigit():
+        parent[int(leaf)] = value
+    else:
+        parent[leaf] = value
+
+
+def _unset_path(doc: Dict[str, Any], path: str):
+    parent, leaf = _parent(doc, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(leaf, None)
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set_path(doc, path, _clone(value))
+            continue
+        for path, arg in fields.items():
+            current = _lookup(doc, path)
+            if op == "$set":
+                _set_path(doc, path, _clone(arg))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current in (_MISSING, None) else current) + arg)
+            elif op == "$mul":
+                _set_path(doc, path, (0 if current in (_MISSING, None) else current) * arg)
+            elif op == "$min":
+                if current is _MISSING or arg < current:
+                    _set_path(doc, path, arg)
+            elif op == "$max":
+                if current is _MISSING or arg > current:
+                    _set_path(doc, path, arg)
+            elif op in ("$push", "$addToSet"):
+                items = list(current) if isinstance(current, list) else []
+                values = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                for value in values:
+                    if op == "$push" or value not in items:
+                        items.append(_clone(value))
+                if isinstance(arg, dict) and "$slice" in arg:
+                    limit = arg["$slice"]
+                    items = items[limit:] if limit < 0 else items[:limit]
+                _set_path(doc, path, items)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    if isinstance(arg, dict) and not _is_operator_dict(arg):
+                        keep = [v for v in current if not (isinstance(v, dict) and matches(v, arg))]
+                    else:
+                        keep = [v for v in current if not _match_condition(v, arg)]
+                    _set_path(doc, path, keep)
+            elif op == "$currentDate":
+                _set_path(doc, path, datetime.utcnow())
+            else:
+                raise NotImplementedError(f"Unsupported update operator: {op}")
+
+
+def _is_replacement(update: Dict[str, Any]) -> bool:
+    return not any(key.startswith("$") for key in update)
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Any]) -> Dict[str, Any]:
+    if not projection:
+        return dict(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        result: Dict[str, Any] = {}
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        for path in fields:
+            value = _lookup(doc, path)
+            if value is not _MISSING:
+                _set_path(result, path, value)
+        return result
+    result = _clone(doc) if any("." in k for k in fields) else dict(doc)
+    for path in fields:
+        _unset_path(result, path)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _equality_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields an upsert copies from its filter into the new document."""
+    seed: Dict[str, Any] = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            if key == "$and":
+                for sub in condition:
+                    for path, value in _equality_seed(sub).items():
+                        _set_path(seed, path, value)
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set_path(seed, key, _clone(condition["$eq"]))
+        else:
+            _set_path(seed, key, _clone(condition))
+    return seed
+
+
+# --------------------------------------------------------------------------
+# Indexes
+# --------------------------------------------------------------------------
+
+def _normalize_keys(keys: Any) -> List[Tuple[str, Any]]:
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return [(k, 1) if isinstance(k, str) else tuple(k) for k in keys]
+
+
+class HashIndex:
+    """Maps the values of ``fields`` to the row ids holding them.
+
+    Array values are indexed per element (multikey); values that cannot be
+    hashed are kept aside and always treated as candidates.
+    """
+
+    def __init__(self, name: str, fields: Sequence[str], unique: bool = False, sparse: bool = False, **options):
+        self.name = name
+        self.fields = tuple(fields)
+        self.unique = unique
+        self.sparse = sparse
+        self.options = options
+        self.entries: Dict[Any, Dict[int, None]] = {}
+        self.unhashable: Set[int] = set()
+
+    def keys_for(self, doc: Dict[str, Any]) -> Sequence[Any]:
+        if len(self.fields) == 1:
+            value = _lookup(doc, self.fields[0])
+            if value is _MISSING and self.sparse:
+                return ()
+            if isinstance(value, list):
+                return list(dict.fromkeys(value)) if value else (_MISSING,)
+            return (value,)
+        values = tuple(_lookup(doc, field) for field in self.fields)
+        if self.sparse and all(v is _MISSING for v in values):
+            return ()
+        return (values,)
+
+    def add(self, rowid: int, doc: Dict[str, Any]):
+        entries = self.entries
+        try:
+            for key in self.keys_for(doc):
+                bucket = entries.get(key)
+                if bucket is None:
+                    entries[key] = {rowid: None}
+                else:
+                    bucket[rowid] = None
+        except TypeError:
+            self.unhashable.add(rowid)
+
+    def remove(self, rowid: int, doc: Dict[str, Any]):
+        self.unhashable.discard(rowid)
+        try:
+            for key in self.keys_for(doc):
+                bucket = self.entries.get(key)
+                if bucket is not None:
+                    bucket.pop(rowid, None)
+                    if not bucket:
+                        del self.entries[key]
+        except TypeError:
+            pass
+
+    def conflicts(self, rowid: Optional[int], doc: Dict[str, Any]) -> bool:
+        if not self.unique:
+            return False
+        try:
+            for key in self.keys_for(doc):
+                if key is _MISSING and self.sparse:
+                    continue
+                bucket = self.entries.get(key)
+                if bucket and any(other != rowid for other in bucket):
+                    return True
+        except TypeError:
+            return False
+        return False
+
+    def lookup(self, values: Iterable[Any]) -> Optional[Set[int]]:
+        rows: Set[int] = set(self.unhashable)
+        try:
+            for value in values:
+                bucket = self.entries.get(value)
+                if bucket:
+                    rows.update(bucket)
+        except TypeError:
+            return None
+        return rows
+
+    def info(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {"key": [(field, 1) for field in self.fields]}
+        if self.unique:
+            info["unique"] = True
+        if self.sparse:
+            info["sparse"] = True
+        info.update(self.options)
+        return info
+
+
+# --------------------------------------------------------------------------
+# Cursor
+# --------------------------------------------------------------------------
+
+class MemoryCursor:
+    """Lazy cursor supporting sort/skip/limit/projection and async iteration."""
+
+    def __init__(self, collection: "MemoryCollection", query: Dict[str, Any], projection: Any = None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._iterator: Optional[Iterator[Dict[str, Any]]] = None
+        self.plan: Dict[str, Any] = {}
+
+    def sort(self, key, direction: int = 1):
+        self._sort = [(key, direction)] if isinstance(key, str) else [tuple(k) for k in key]
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _documents(self) -> Iterator[Dict[str, Any]]:
+        docs: Iterable[Dict[str, Any]] = self._collection._select(self._query, self.plan)
+        if self._sort:
+            docs = list(docs)
+            for key, direction in reversed(self._sort):
+                docs.sort(key=lambda d, k=key: _sort_key(_lookup(d, k)), reverse=direction < 0)
+        stop = self._skip + self._limit if self._limit else None
+        for doc in islice(docs, self._skip, stop):
+            yield _project(doc, self._projection)
+
+    def _ensure_iterator(self) -> Iterator[Dict[str, Any]]:
+        if self._iterator is None:
+            self._iterator = self._documents()
+        return self._iterator
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        iterator = self._ensure_iterator()
+        return list(iterator if length is None else islice(iterator, length))
+
+    def explain(self) -> Dict[str, Any]:
+        plan: Dict[str, Any] = {}
+        sum(1 for _ in self._collection._select(self._query, plan))
+        return plan
+
+    async def close(self):
+        self._iterator = iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._ensure_iterator())
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+# --------------------------------------------------------------------------
+# Collection
+# --------------------------------------------------------------------------
+
+class MemoryCollection:
+    def __init__(self, name: str, docs: Optional[List[Dict[str, Any]]] = None):
+        self.name = name
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._next_rowid = 0
+        self._indexes: Dict[str, HashIndex] = {}
+        self._add_index(HashIndex("_id_", ["_id"], unique=True))
+        self._add_index(HashIndex("id_1", ["id"]))
+        for doc in docs or []:
+            self._insert(doc)
+
+    # -- indexes ---------------------------------------------------------
+
+    def _add_index(self, index: HashIndex):
+        for rowid, doc in self._rows.items():
+            if index.conflicts(rowid, doc):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {index.name}")
+            index.add(rowid, doc)
+        self._indexes[index.name] = index
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None,
+                           sparse: bool = False, **options) -> str:
+        fields = _normalize_keys(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in fields)
+        existing = self._indexes.get(name)
+        if existing is not None:
+            if unique and not existing.unique:
+                self._indexes.pop(name)
+            else:
+                return name
+        options.pop("background", None)
+        self._add_index(HashIndex(name, [f for f, _ in fields], unique=unique, sparse=sparse, **options))
+        return name
+
+    async def create_indexes(self, indexes) -> List[str]:
+        names = []
+        for model in indexes:
+            document = model.document
+            keys = list(document.pop("key").items())
+            names.append(await self.create_index(keys, **document))
+        return names
+
+    async def drop_index(self, name: str):
+        self._indexes.pop(name, None)
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        return {name: index.info() for name, index in self._indexes.items()}
+
+    def _index_rows(self, rowid: int, doc: Dict[str, Any]):
+        for index in self._indexes.values():
+            index.add(rowid, doc)
+
+    def _unindex_rows(self, rowid: int, doc: Dict[str, Any]):
+        for index in self._indexes.values():
+            index.remove(rowid, doc)
+
+    def _check_unique(self, rowid: Optional[int], doc: Dict[str, Any]):
+        for index in self._indexes.values():
+            if index.unique and index.conflicts(rowid, doc):
+                key = {field: _lookup(doc, field) for field in index.fields}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {index.name} dup key: {key}",
+                    11000,
+                )
+
+    # -- query planning --------------------------------------------------
+
+    def _candidates_for_field(self, field: str, condition: Any) -> Optional[Tuple[str, Set[int]]]:
+        index = next((ix for ix in self._indexes.values() if ix.fields == (field,)), None)
+        if index is None:
+            return None
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                values = [condition["$eq"]]
+            elif "$in" in condition:
+                values = list(condition["$in"])
+            elif condition.get("$exists") is False:
+                values = [_MISSING]
+            else:
+                return None
+        elif isinstance(condition, (dict, list)) or hasattr(condition, "pattern"):
+            return None
+        else:
+            values = [condition]
+        if None in values:
+            values.append(_MISSING)
+        rows = index.lookup(values)
+        return None if rows is None else (index.name, rows)
+
+    def _candidates_for_compound(self, query: Dict[str, Any]) -> Optional[Tuple[str, Set[int]]]:
+        best = None
+        for index in self._indexes.values():
+            if len(index.fields) < 2:
+                continue
+            values = []
+            for field in index.fields:
+                condition = query.get(field, _MISSING)
+                if condition is _MISSING or _is_operator_dict(condition) or isinstance(condition, (dict, list)):
+                    break
+                values.append(condition)
+            else:
+                rows = index.lookup([tuple(values)])
+                if rows is not None and (best is None or len(rows) < len(best[1])):
+                    best = (index.name, rows)
+        return best
+
+    def _plan(self, query: Dict[str, Any]) -> Optional[Tuple[str, Set[int]]]:
+        """Pick the most selective index for ``query``; None means a full scan."""
+        options = []
+        compound = self._candidates_for_compound(query)
+        if compound:
+            options.append(compound)
+        for key, condition in query.items():
+            if key == "$and":
+                for sub in condition:
+                    planned = self._plan(sub)
+                    if planned:
+                        options.append(planned)
+            elif key == "$or":
+                branches = [self._plan(sub) for sub in condition]
+                if branches and all(branches):
+                    rows: Set[int] = set()
+                    for _, branch_rows in branches:
+                        rows |= branch_rows
+                    options.append(("+".join(sorted({name for name, _ in branches})), rows))
+            elif not key.startswith("$"):
+                planned = self._candidates_for_field(key, condition)
+                if planned:
+                    options.append(planned)
+        if not options:
+            return None
+        return min(options, key=lambda option: len(option[1]))
+
+    def _select_rows(self, query: Dict[str, Any], plan: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        chosen = self._plan(query) if query else None
+        if chosen is None:
+            rowids: Iterable[int] = list(self._rows)
+            if plan is not None:
+                plan.update({"index": None, "candidates": len(self._rows)})
+        else:
+            rowids = sorted(chosen[1])
+            if plan is not None:
+                plan.update({"index": chosen[0], "candidates": len(rowids)})
+        rows = self._rows
+        for rowid in rowids:
+            doc = rows.get(rowid)
+            if doc is not None and (not query or matches(doc, query)):
+                yield rowid, doc
+
+    def _select(self, query: Dict[str, Any], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        for _, doc in self._select_rows(query or {}, plan):
+            yield doc
+
+    def _select_rowids(self, query: Dict[str, Any], sort=None, first: bool = False) -> List[int]:
+        selected = self._select_rows(query or {})
+        if not sort:
+            return [rowid for rowid, _ in islice(selected, 1 if first else None)]
+        pairs = list(selected)
+        for key, direction in reversed(_normalize_keys(sort)):
+            pairs.sort(key=lambda pair, k=key: _sort_key(_lookup(pair[1], k)), reverse=direction < 0)
+        return [rowid for rowid, _ in (pairs[:1] if first else pairs)]
+
+    # -- writes ----------------------------------------------------------
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        stored = _clone(document)
+        self._check_unique(None, stored)
+        rowid = self._next_rowid
+        self._next_rowid += 1
+        self._rows[rowid] = stored
+        self._index_rows(rowid, stored)
+        return document["_id"]
+
+    def _replace_row(self, rowid: int, new_doc: Dict[str, Any]):
+        old_doc = self._rows[rowid]
+        self._unindex_rows(rowid, old_doc)
+        try:
+            self._check_unique(rowid, new_doc)
+        except DuplicateKeyError:
+            self._index_rows(rowid, old_doc)
+            raise
+        self._rows[rowid] = new_doc
+        self._index_rows(rowid, new_doc)
+
+    def _update_row(self, rowid: int, update: Dict[str, Any]) -> bool:
+        old_doc = self._rows[rowid]
+        if _is_replacement(update):
+            new_doc = _clone(update)
+            new_doc["_id"] = old_doc["_id"]
+        else:
+            new_doc = _clone(old_doc)
+            _apply_update(new_doc, update)
+        if new_doc == old_doc:
+            return False
+        self._replace_row(rowid, new_doc)
+        return True
+
+    def _upsert(self, query: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        if _is_replacement(update):
+            doc = _clone(update)
+        else:
+            doc = _equality_seed(query)
+            _apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _do_update(self, query, update, upsert: bool, many: bool, sort=None) -> Dict[str, Any]:
+        rowids = self._select_rowids(query, sort, first=not many)
+        modified = sum(1 for rowid in rowids if self._update_row(rowid, update))
+        result = {"n": len(rowids), "nModified": modified}
+        if not rowids and upsert:
+            result["upserted"] = self._upsert(query, update)
+            result["n"] = 1
+        return result
+
+    # -- public API ------------------------------------------------------
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, *args, **kwargs) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter or {}, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("skip"):
+            cursor.skip(kwargs["skip"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = await self.find(filter, projection, **kwargs).limit(1).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: Dict[str, Any], **kwargs) -> int:
+        count = sum(1 for _ in self._select(filter))
+        if kwargs.get("skip"):
+            count = max(0, count - kwargs["skip"])
+        if kwargs.get("limit"):
+            count = min(count, kwargs["limit"])
+        return count
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self._rows)
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        values: List[Any] = []
+        for doc in self._select(filter or {}):
+            value = _lookup(doc, key)
+            for item in value if isinstance(value, list) else [value]:
+                if item is not _MISSING and item not in values:
+                    values.append(item)
+        return values
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        return InsertManyResult([self._insert(doc) for doc in documents], True)
+
+    async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._do_update(filter, update, upsert, many=False, sort=kwargs.get("sort")), True)
+
+    async def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._do_update(filter, update, upsert, many=True), True)
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        if not _is_replacement(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return UpdateResult(self._do_update(filter, replacement, upsert, many=False), True)
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], projection: Any = None,
+                                  sort=None, upsert: bool = False,
+                                  return_document: bool = ReturnDocument.BEFORE, **kwargs):
+        rowids = self._select_rowids(filter, sort, first=True)
+        if rowids:
+            before = self._rows[rowids[0]]
+            self._update_row(rowids[0], update)
+            doc = self._rows[rowids[0]] if return_document else before
+            return _project(doc, projection)
+        if upsert:
+            upserted_id = self._upsert(filter, update)
+            if return_document:
+                return await self.find_one({"_id": upserted_id}, projection)
+        return None
+
+    async def find_one_and_replace(self, filter: Dict[str, Any], replacement: Dict[str, Any], **kwargs):
+        if not _is_replacement(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return await self.find_one_and_update(filter, replacement, **kwargs)
+
+    async def find_one_and_delete(self, filter: Dict[str, Any], projection: Any = None, sort=None, **kwargs):
+        rowids = self._select_rowids(filter, sort, first=True)
+        if not rowids:
+            return None
+        doc = self._rows.pop(rowids[0])
+        self._unindex_rows(rowids[0], doc)
+        return _project(doc, projection)
+
+    def _delete(self, filter: Dict[str, Any], many: bool) -> int:
+        rowids = self._select_rowids(filter, first=not many)
+        if not filter and many:
+            self._rows.clear()
+            for index in self._indexes.values():
+                index.entries.clear()
+                index.unhashable.clear()
+            return len(rowids)
+        for rowid in rowids:
+            doc = self._rows.pop(rowid)
+            self._unindex_rows(rowid, doc)
+        return len(rowids)
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=False)}, True)
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, many=True)}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    result = self._do_update(request._filter, request._doc, request._upsert,
+                                             many=isinstance(request, UpdateMany))
+                    if "upserted" in result:
+                        counts["nUpserted"] += 1
+                        counts["upserted"].append({"index": i, "_id": result["upserted"]})
+                    else:
+                        counts["nMatched"] += result["n"]
+                        counts["nModified"] += result["nModified"]
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    counts["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                else:
+                    raise TypeError(f"{request!r} is not a valid request")
+            except DuplicateKeyError as e:
+                counts["writeErrors"].append({"index": i, "code": 11000, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+        if counts["writeErrors"]:
+            raise BulkWriteError(counts)
+        return BulkWriteResult(counts, True)
+
+    async def drop(self, **kwargs):
+        self._rows.clear()
+        for name in [n for n in self._indexes if n not in ("_id_", "id_1")]:
+            del self._indexes[name]
+        for index in self._indexes.values():
+            index.entries.clear()
+            index.unhashable.clear()
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
+
+    def with_options(self, **kwargs) -> "MemoryCollection":
+        return self
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class MemoryDB:
+    """Database whose collections are created on first attribute access."""
+
+    # No client: like a standalone server, there are no sessions or transactions
+    client = None
+
+    def __init__(self, **collections: List[Dict[str, Any]]):
+        self._collections: Dict[str, MemoryCollection] = {}
+        for name, docs in collections.items():
+            self._collections[name] = MemoryCollection(name, docs)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    def with_options(self, **kwargs) -> "MemoryDB":
+        # One node: read preferences and write concerns change nothing
+        return self
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return list(self._collections)
+
+    async def drop_collection(self, name: str, **kwargs):
+        self._collections.pop(name, None)
+
+    async def command(self, command: Any, **kwargs) -> Dict[str, Any]:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"no such command: '{name}'", 59)
+
+    def watch(self, *args, **kwargs):
+        # Behaves like a standalone server, which cannot open change streams
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
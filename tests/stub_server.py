@@ -0,0 +1,54 @@
+"""Serve the real FastAPI app over HTTP with the in-memory database and fakes.
+
+Used as a local target for ``backend_loadtest.py --stub`` and handy for poking
+at the API without MongoDB or third-party credentials::
+
+    python -m tests.stub_server --port 8001 --latency-ms 25
+"""
+
+import argparse
+
+import uvicorn
+
+from tests.memory_db import MemoryDB
+from tests.stubs import IntegrationLatency, install_stub_modules, patch_integrations
+
+
+def build_app(latency: IntegrationLatency, bcrypt_rounds: int = 0, rate_limit: bool = False):
+    """Return ``server.app`` wired to a fresh in-memory database and the fakes.
+
+    The catalog is seeded by the app's own startup hook. ``bcrypt_rounds``
+    lowers the password hashing cost when set, which keeps registration-heavy
+    runs focused on the request path rather than on hashing. Rate limiting is
+    off unless ``rate_limit`` is set: every load test user shares one client
+    address, so the per-IP buckets would answer most requests with 429.
+    """
+    install_stub_modules()
+    from backend import server
+    import integrations
+
+    server.db = MemoryDB()
+    if not rate_limit:
+        server.rate_limiter = server.rate_limit.RateLimiter(None)
+    patch_integrations(latency)
+    if bcrypt_rounds:
+        integrations.pwd_context.get().update(bcrypt__rounds=bcrypt_rounds)
+    return server.app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="simulated latency of Google Maps, Stripe and SMTP calls")
+    parser.add_argument("--bcrypt-rounds", type=int, default=0)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the RATE_LIMIT_* request limits on")
+    args = parser.parse_args(argv)
+
+    app = build_app(IntegrationLatency.uniform(args.latency_ms / 1000), args.bcrypt_rounds, args.rate_limit)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
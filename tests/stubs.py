@@ -0,0 +1,248 @@
+"""Stand-ins for the external integrations used by ``server.py``.
+
+Google Maps, Stripe (via ``emergentintegrations``) and SMTP are replaced by
+local fakes whose latency can be configured, so tests and benchmarks exercise
+the real request path without network access.
+"""
+
+import asyncio
+import json
+import math
+import sys
+import time
+import types
+import uuid
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, Optional
+
+# Ljubljana city centre; geocoded addresses resolve here unless overridden.
+DEFAULT_LOCATION = {"lat": 46.0569, "lng": 14.5058}
+
+
+@dataclass
+class IntegrationLatency:
+    """Simulated round-trip latency, in seconds, per external dependency."""
+
+    geocode: float = 0.0
+    distance: float = 0.0
+    stripe: float = 0.0
+    smtp: float = 0.0
+
+    @classmethod
+    def uniform(cls, seconds: float) -> "IntegrationLatency":
+        return cls(geocode=seconds, distance=seconds, stripe=seconds, smtp=seconds)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class FakeGoogleMaps:
+    """Mimics the synchronous ``googlemaps.Client`` calls made by the backend.
+
+    The real client blocks the event loop while it waits on the network, so
+    the simulated latency deliberately uses ``time.sleep``.
+    """
+
+    def __init__(self, latency: Optional[IntegrationLatency] = None, location: Optional[Dict] = None):
+        self.latency = latency or IntegrationLatency()
+        self.location = location or DEFAULT_LOCATION
+        self.calls = {"geocode": 0, "distance_matrix": 0}
+
+    def geocode(self, address: str):
+        self.calls["geocode"] += 1
+        if self.latency.geocode:
+            time.sleep(self.latency.geocode)
+        return [{"geometry": {"location": dict(self.location)}, "formatted_address": address}]
+
+    def distance_matrix(self, origins, destinations, mode="driving", units="metric"):
+        self.calls["distance_matrix"] += 1
+        if self.latency.distance:
+            time.sleep(self.latency.distance)
+        (lat1, lon1), (lat2, lon2) = origins[0], destinations[0]
+        meters = int(haversine_km(lat1, lon1, lat2, lon2) * 1000)
+        return {
+            "status": "OK",
+            "rows": [{"elements": [{"status": "OK", "distance": {"value": meters}}]}],
+        }
+
+
+class CheckoutSessionRequest:
+    def __init__(self, amount: float, currency: str, success_url: str, cancel_url: str,
+                 metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        self.amount = amount
+        self.currency = currency
+        self.success_url = success_url
+        self.cancel_url = cancel_url
+        self.metadata = metadata or {}
+
+
+class CheckoutSessionResponse:
+    def __init__(self, url: str, session_id: str):
+        self.url = url
+        self.session_id = session_id
+
+
+class CheckoutStatusResponse:
+    def __init__(self, status: str, payment_status: str, amount_total: int, currency: str,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self.status = status
+        self.payment_status = payment_status
+        self.amount_total = amount_total
+        self.currency = currency
+        self.metadata = metadata or {}
+
+
+class WebhookResponse:
+    def __init__(self, event_type: str, session_id: str):
+        self.event_type = event_type
+        self.session_id = session_id
+
+
+class FakeStripeCheckout:
+    """Async drop-in for ``emergentintegrations``' ``StripeCheckout``.
+
+    Sessions live in a class-level registry so separately constructed
+    instances (the backend builds one per request) see the same state.
+    """
+
+    latency: float = 0.0
+    sessions: Dict[str, CheckoutStatusResponse] = {}
+    paid_on_status_check: bool = False
+
+    def __init__(self, api_key: str = "", webhook_url: str = ""):
+        self.api_key = api_key
+        self.webhook_url = webhook_url
+
+    async def _wait(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_checkout_session(self, request: CheckoutSessionRequest) -> CheckoutSessionResponse:
+        await self._wait()
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        self.sessions[session_id] = CheckoutStatusResponse(
+            status="open",
+            payment_status="unpaid",
+            amount_total=int(round(request.amount * 100)),
+            currency=request.currency,
+            metadata=request.metadata,
+        )
+        return CheckoutSessionResponse(url=f"https://checkout.stripe.test/{session_id}", session_id=session_id)
+
+    async def get_checkout_status(self, session_id: str) -> CheckoutStatusResponse:
+        await self._wait()
+        session = self.sessions[session_id]
+        if self.paid_on_status_check:
+            session.status, session.payment_status = "complete", "paid"
+        return session
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]) -> WebhookResponse:
+        await self._wait()
+        event = json.loads(body or b"{}")
+        return WebhookResponse(event.get("type", ""), event.get("session_id", ""))
+
+
+class FakeSMTP:
+    latency: float = 0.0
+    sent: list = []
+
+    def __init__(self, host=None, port=None):
+        self.host = host
+        self.port = port
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, from_addr, to_addr, message):
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent.append((from_addr, to_addr, message))
+
+    def quit(self):
+        pass
+
+
+class FakePushClient:
+    """Records Expo push requests; set ``failures`` to fail that many sends first"""
+
+    def __init__(self):
+        self.sent: list = []
+        self.failures = 0
+
+    async def post(self, url, json=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("push service unavailable")
+        self.sent.append((url, json))
+        return types.SimpleNamespace(status_code=200, raise_for_status=lambda: None)
+
+
+def install_stub_modules():
+    """Register a fake ``emergentintegrations`` package when it is not installed."""
+    try:
+        import emergentintegrations.payments.stripe.checkout  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    emergent = types.ModuleType("emergentintegrations")
+    payments = types.ModuleType("emergentintegrations.payments")
+    stripe = types.ModuleType("emergentintegrations.payments.stripe")
+    checkout = types.ModuleType("emergentintegrations.payments.stripe.checkout")
+
+    checkout.StripeCheckout = FakeStripeCheckout
+    checkout.CheckoutSessionRequest = CheckoutSessionRequest
+    checkout.CheckoutSessionResponse = CheckoutSessionResponse
+    checkout.CheckoutStatusResponse = CheckoutStatusResponse
+    stripe.checkout = checkout
+    payments.stripe = stripe
+    emergent.payments = payments
+
+    sys.modules["emergentintegrations"] = emergent
+    sys.modules["emergentintegrations.payments"] = payments
+    sys.modules["emergentintegrations.payments.stripe"] = stripe
+    sys.modules["emergentintegrations.payments.stripe.checkout"] = checkout
+
+
+def patch_integrations(latency: Optional[IntegrationLatency] = None) -> FakeGoogleMaps:
+    """Point the backend's lazy integrations at the fakes; returns the maps stub.
+
+    Call ``reset_integrations()`` to go back to the real, lazily built clients.
+    """
+    import integrations
+
+    latency = latency or IntegrationLatency()
+    stripe_cls = type("StripeCheckout", (FakeStripeCheckout,), {"latency": latency.stripe, "sessions": {}})
+    smtp_cls = type("SMTP", (FakeSMTP,), {"latency": latency.smtp, "sent": []})
+    gmaps = FakeGoogleMaps(latency)
+
+    integrations.gmaps.override(gmaps)
+    integrations.stripe.override(types.SimpleNamespace(
+        StripeCheckout=stripe_cls,
+        CheckoutSessionRequest=CheckoutSessionRequest,
+        CheckoutSessionResponse=CheckoutSessionResponse,
+        CheckoutStatusResponse=CheckoutStatusResponse,
+    ))
+    integrations.smtp.override(types.SimpleNamespace(
+        SMTP=smtp_cls, MIMEText=MIMEText, MIMEMultipart=MIMEMultipart,
+    ))
+    integrations.push.override(FakePushClient())
+    return gmaps
+
+
+def reset_integrations():
+    import integrations
+
+    for integration in (integrations.gmaps, integrations.stripe, integrations.smtp, integrations.push):
+        integration.override(None)
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import FakeStripeCheckout, install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+
+ADDRESS = {"street": "Slovenska cesta 1", "city": "Ljubljana", "postal_code": "1000", "country": "Slovenia"}
+
+
+async def register(client, role):
+    response = await client.post("/api/auth/register", json={
+        "email": f"{role}@analytics-domora.com", "full_name": role.title(), "role": role, "password": "Secret123!",
+    })
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_transitions_and_match_reconciliation(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(FakeStripeCheckout, "paid_on_status_check", True)
+    patch_integrations()
+    await server.initialize_db()
+    package = await server.db.service_packages.find_one({"service_type": "house_cleaning"})
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            admin = await register(client, "admin")
+            customer = await register(client, "customer")
+
+            booking_ids = []
+            for _ in range(2):
+                response = await client.post("/api/bookings", headers=customer, json={
+                    "service_type": "house_cleaning",
+                    "package_id": package["id"],
+                    "service_address": ADDRESS,
+                    "scheduled_datetime": (datetime.utcnow() + timedelta(days=2)).isoformat(),
+                })
+                booking_ids.append(response.json()["id"])
+
+            checkout = await client.post(
+                "/api/payments/create-checkout", params={"booking_id": booking_ids[0]}, headers=customer
+            )
+            session_id = checkout.json()["session_id"]
+            await client.get(f"/api/payments/status/{session_id}", headers=customer)
+            # A late webhook for the same payment must not count it twice
+            await client.post("/api/webhooks/stripe", content=json.dumps(
+                {"type": "checkout.session.completed", "session_id": session_id}
+            ))
+
+            assert (await client.get("/api/admin/analytics/summary", headers=customer)).status_code == 403
+            summary = (await client.get("/api/admin/analytics/summary?days=7", headers=admin)).json()
+            assert summary["total_bookings"] == 2
+            assert summary["by_status"] == {"pending": 1, "confirmed": 1}
+            assert summary["total_revenue"] == package["base_price"]
+            assert summary["by_service_type"]["house_cleaning"]["revenue"] == package["base_price"]
+            assert summary["users"] == {"customer": 1, "provider": 0, "admin": 1}
+
+            reconciled = await client.post("/api/admin/analytics/reconcile", headers=admin)
+            assert reconciled.json()["bookings"] == 2
+            after = (await client.get("/api/admin/analytics/summary?days=7", headers=admin)).json()
+            assert after == summary
+    finally:
+        reset_integrations()
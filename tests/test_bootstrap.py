@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+
+ADDRESS = {"street": "Glavni trg 5", "city": "Maribor", "postal_code": "2000", "country": "Slovenia"}
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_returns_home_screen_and_skips_unchanged_catalog(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    patch_integrations()
+    await server.initialize_db()
+    package = await server.db.service_packages.find_one({"service_type": "car_washing"})
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": "customer@bootstrap-domora.com", "full_name": "Customer", "role": "customer",
+                "password": "Secret123!",
+            })
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            for days in (5, 2):
+                await client.post("/api/bookings", headers=headers, json={
+                    "service_type": "car_washing",
+                    "package_id": package["id"],
+                    "service_address": ADDRESS,
+                    "scheduled_datetime": (datetime.utcnow() + timedelta(days=days)).isoformat(),
+                })
+            past = await server.db.bookings.find_one({}, {"_id": 0})
+            await server.db.bookings.insert_one({
+                **past, "id": "past", "scheduled_datetime": datetime.utcnow() - timedelta(days=1)
+            })
+
+            first = (await client.get("/api/bootstrap", headers=headers)).json()
+            assert first["user"]["email"] == "customer@bootstrap-domora.com"
+            scheduled = [b["scheduled_datetime"] for b in first["upcoming_bookings"]]
+            assert len(scheduled) == 2 and scheduled == sorted(scheduled)
+            assert len(first["packages"]) == await server.db.service_packages.count_documents({})
+            assert first["addons"]
+
+            cached = (await client.get(
+                "/api/bootstrap", params={"catalog_version": first["catalog_version"]}, headers=headers
+            )).json()
+            assert cached["catalog_version"] == first["catalog_version"]
+            assert cached["packages"] is None and cached["addons"] is None
+
+            assert (await client.get("/api/bootstrap")).status_code in (401, 403)
+    finally:
+        reset_integrations()
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from bson import Timestamp
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import cache_bus
+import metrics
+import sync
+
+
+class FakeChangeStream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            raise StopAsyncIteration
+        return self.changes.pop(0)
+
+
+class ReplicaSetDB(MemoryDB):
+    def __init__(self, changes):
+        super().__init__()
+        self.changes = changes
+
+    def watch(self, pipeline, **kwargs):
+        return FakeChangeStream(self.changes)
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_polling_on_standalone_servers():
+    db = MemoryDB()
+    bus = cache_bus.CacheBus(poll_interval=0.01)
+    received = []
+    bus.subscribe("users", lambda collection, doc_id: received.append((collection, doc_id)))
+    bus.subscribe("service_packages", lambda collection, doc_id: received.append((collection, doc_id)))
+    lag_before = cache_bus.propagation_lag.count(collection="users")
+    await bus.ensure_indexes(db)
+    for collection in cache_bus.WATCHED:
+        assert "updated_at_1" in await db[collection].index_information()
+
+    task = asyncio.create_task(bus.run(db))
+    try:
+        await asyncio.sleep(0.03)
+        await db.users.insert_one({"id": "u1", "updated_at": datetime.utcnow()})
+        await sync.record_deletions(db, "packages", ["p1"])
+        await asyncio.sleep(0.05)
+    finally:
+        task.cancel()
+
+    # Each change is published once even though polls overlap
+    assert received == [("users", "u1"), ("service_packages", "p1")]
+    assert cache_bus.propagation_lag.count(collection="users") == lag_before + 1
+    assert cache_bus.bus_mode.value(mode="poll") == 1
+
+
+@pytest.mark.asyncio
+async def test_change_stream_events_invalidate_subscribers():
+    now = datetime.utcnow()
+    db = ReplicaSetDB([
+        {"operationType": "update", "ns": {"coll": "provider_profiles"}, "fullDocument": {"id": "pp1"},
+         "clusterTime": Timestamp(now, 1)},
+        {"operationType": "delete", "ns": {"coll": "users"}, "documentKey": {"_id": "x"}},
+    ])
+    bus = cache_bus.CacheBus()
+    received = []
+    for collection in ("users", "provider_profiles"):
+        bus.subscribe(collection, lambda collection, doc_id: received.append((collection, doc_id)))
+
+    await bus.watch(db)
+
+    # The stream opening flushes everything, then each event is applied
+    assert received == [("users", None), ("provider_profiles", None), ("provider_profiles", "pp1"), ("users", None)]
+    assert cache_bus.bus_mode.value(mode="change_stream") == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_renders_prometheus_text():
+    requests = metrics.counter("test_requests_total", "Requests seen by the test")
+    requests.inc(route="/x")
+    metrics.histogram("test_latency_seconds", "Test latency", buckets=(0.1, 1)).observe(0.5)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/api/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE test_requests_total counter" in response.text
+    assert 'test_requests_total{route="/x"} 1' in response.text
+    assert 'test_latency_seconds_bucket{le="0.1"} 0' in response.text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 1' in response.text
+    assert metrics.counter("test_requests_total", "") is requests
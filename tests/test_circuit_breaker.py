@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("maps down")
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_on_errors_and_closes_after_a_good_probe():
+    clock = Clock()
+    breaker = CircuitBreaker("test_maps", window=10, min_calls=4, open_seconds=30, clock=clock)
+
+    for call in (succeed, fail, fail, fail):
+        try:
+            await breaker.call(call)
+        except ConnectionError:
+            pass
+    assert breaker.state == "open"
+    assert circuit_breaker.state_gauge.value(dependency="test_maps") == 2
+
+    with pytest.raises(CircuitOpen) as rejected:
+        await breaker.call(succeed)
+    assert rejected.value.retry_after == 30
+
+    # Half-open: one probe at a time; a failed probe reopens the breaker
+    clock.now += 30
+    assert breaker.state == "half_open"
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert breaker.state == "open"
+
+    clock.now += 30
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == "closed"
+    assert circuit_breaker.state_gauge.value(dependency="test_maps") == 0
+    assert circuit_breaker.calls.value(dependency="test_maps", result="rejected") == 1
+
+
+@pytest.mark.asyncio
+async def test_timeout_adapts_to_recent_latency():
+    breaker = CircuitBreaker("test_stripe", min_calls=3, min_timeout=0.01, max_timeout=5, timeout_multiplier=2)
+    assert breaker.timeout == 5
+
+    async def quick():
+        await asyncio.sleep(0.01)
+
+    for _ in range(3):
+        await breaker.call(quick)
+    assert 0.02 <= breaker.timeout < 0.5
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(hang)
+    assert circuit_breaker.calls.value(dependency="test_stripe", result="timeout") == 1
+
+
+@pytest.mark.asyncio
+async def test_open_maps_breaker_falls_back_without_calling_google(monkeypatch):
+    clock = Clock()
+    breaker = CircuitBreaker("google_maps_test", clock=clock)
+    breaker._trip()
+    monkeypatch.setattr(server, "gmaps_breaker", breaker)
+    gmaps = patch_integrations()
+    try:
+        address = server.AddressModel(street="Titova 10", city="Novo mesto", postal_code="8000", country="Slovenia")
+        assert (await server.geocode_address(address)).latitude is None
+        assert await server.calculate_distance(46.05, 14.5, 45.8, 15.17) == 0.0
+        assert gmaps.calls == {"geocode": 0, "distance_matrix": 0}
+    finally:
+        reset_integrations()
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import pricing
+from demand import DemandIndex
+
+NOW = datetime(2025, 6, 4, 12, 30)
+
+
+class FakeClock:
+    def __init__(self, when: datetime):
+        self.now = when
+
+    def __call__(self) -> float:
+        return self.now.replace(tzinfo=timezone.utc).timestamp()
+
+
+def test_ring_counts_roll_out_of_the_window():
+    clock = FakeClock(NOW)
+    index = DemandIndex(window_hours=3, clock=clock)
+
+    index.record(server.ServiceType.HOUSE_CLEANING, "Ljubljana", NOW - timedelta(hours=2))
+    index.record("house_cleaning", " ljubljana ", NOW)
+    index.record("house_cleaning", "Ljubljana", NOW - timedelta(hours=5))  # already outside the window
+    index.record("landscaping", "Ljubljana", NOW)
+    assert index.count("house_cleaning", "LJUBLJANA") == 2
+    assert index.count("house_cleaning", "Maribor") == 0
+
+    clock.now = NOW + timedelta(hours=1)
+    assert index.count("house_cleaning", "Ljubljana") == 1
+    clock.now = NOW + timedelta(days=2)
+    assert index.count("house_cleaning", "Ljubljana") == 0
+    assert index.count("landscaping", "Ljubljana") == 0
+
+
+@pytest.mark.asyncio
+async def test_warm_rebuilds_from_recent_bookings():
+    db = MemoryDB()
+    await db.bookings.insert_many([
+        {"id": f"b{i}", "service_type": "car_washing", "service_address": {"city": "Koper"},
+         "created_at": NOW - timedelta(minutes=20 * i)}
+        for i in range(6)
+    ] + [{"id": "old", "service_type": "car_washing", "service_address": {"city": "Koper"},
+          "created_at": NOW - timedelta(days=3)}])
+    index = DemandIndex(window_hours=2, clock=FakeClock(NOW))
+
+    # Hour slots: the window covers 11:00-13:00, so 10:50 and older are left out
+    assert await index.warm(db) == 5
+    assert index.count("car_washing", "Koper") == 5
+
+
+def test_surge_multiplier_is_bounded():
+    rules = pricing.compile_rules({
+        "travel_bands": [{"from_km": 0, "fee_per_km": 0}],
+        "demand_surge": {"baseline": 10, "step": 0.05, "max_multiplier": 1.3},
+    })
+    assert rules.surge_multiplier(10) == 1.0
+    assert rules.surge_multiplier(14) == pytest.approx(1.2)
+    assert rules.surge_multiplier(1_000) == 1.3
+
+    components = rules.evaluate(100.0, 0.0, 0.0, "house_cleaning", "Quick Tidy", demand=14)
+    assert components.demand_surcharge == pytest.approx(20.0)
+    assert "Demand Surcharge" in pricing.estimate_fields(components, "Quick Tidy", {})["breakdown"]
+    assert pricing.compile_rules({"travel_bands": [{"from_km": 0, "fee_per_km": 0}]}).surge_multiplier(1_000) == 1.0
@@ -0,0 +1,70 @@
+import gzip
+
+import brotli
+import httpx
+import pytest
+import pytest_asyncio
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+from http_caching import negotiate_encoding
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    await server.initialize_db()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def test_negotiate_encoding_honours_quality_values():
+    assert negotiate_encoding("gzip, br", ("br", "gzip")) == "br"
+    assert negotiate_encoding("br;q=0.5, gzip", ("br", "gzip")) == "gzip"
+    assert negotiate_encoding("br;q=0, identity", ("br", "gzip")) is None
+    assert negotiate_encoding("*", ("br", "gzip")) == "br"
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_compressed_per_accept_encoding(client):
+    plain = await client.get("/api/services/packages", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    for encoding, decode in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+        raw = await client.send(
+            client.build_request("GET", "/api/services/packages", headers={"Accept-Encoding": encoding}),
+            stream=True,
+        )
+        body = b"".join([chunk async for chunk in raw.aiter_raw()])
+        assert raw.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in raw.headers["vary"]
+        assert len(body) < len(plain.content)
+        assert decode(body) == plain.content
+
+
+@pytest.mark.asyncio
+async def test_small_responses_are_not_compressed(client):
+    response = await client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_catalog_revalidates_with_etag(client):
+    first = await client.get("/api/services/packages?service_type=house_cleaning")
+    etag = first.headers["etag"]
+    assert etag.startswith("W/")
+
+    again = await client.get("/api/services/packages?service_type=house_cleaning", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    other_filter = await client.get("/api/services/packages", headers={"If-None-Match": etag})
+    assert other_filter.status_code == 200
+
+    await server.db.catalog_meta.update_one({"id": "catalog"}, {"$set": {"fingerprint": "changed"}})
+    reseeded = await client.get("/api/services/packages?service_type=house_cleaning", headers={"If-None-Match": etag})
+    assert reseeded.status_code == 200
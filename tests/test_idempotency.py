@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import integrations
+
+ADDRESS = {"street": "Titova 10", "city": "Novo mesto", "postal_code": "8000", "country": "Slovenia"}
+
+
+@pytest.mark.asyncio
+async def test_retried_posts_replay_the_first_response(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    patch_integrations()
+    await server.initialize_db()
+    await server.idempotency.ensure_indexes(server.db)
+    package = await server.db.service_packages.find_one({"service_type": "house_cleaning"})
+    booking = {
+        "service_type": "house_cleaning",
+        "package_id": package["id"],
+        "service_address": ADDRESS,
+        "scheduled_datetime": (datetime.utcnow() + timedelta(days=2)).isoformat(),
+    }
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": "customer@idem-domora.com", "full_name": "Customer", "role": "customer",
+                "password": "Secret123!",
+            })
+            auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            headers = {**auth, "Idempotency-Key": "booking-1"}
+
+            # Concurrent duplicates share one execution
+            responses = await asyncio.gather(*(
+                client.post("/api/bookings", headers=headers, json=booking) for _ in range(3)
+            ))
+            assert [r.status_code for r in responses] == [200, 200, 200]
+            assert len({r.json()["id"] for r in responses}) == 1
+            assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 2
+            assert await server.db.bookings.count_documents({}) == 1
+
+            replay = await client.post("/api/bookings", headers=headers, json=booking)
+            assert replay.json()["id"] == responses[0].json()["id"]
+
+            changed = await client.post("/api/bookings", headers=headers, json={**booking, "notes": "Ring twice"})
+            assert changed.status_code == 422
+
+            # Requests without a key are not deduplicated
+            await client.post("/api/bookings", headers=auth, json=booking)
+            assert await server.db.bookings.count_documents({}) == 2
+
+            booking_id = responses[0].json()["id"]
+            checkout = {**auth, "Idempotency-Key": "checkout-1"}
+            first = await client.post("/api/payments/create-checkout", params={"booking_id": booking_id},
+                                      headers=checkout)
+            second = await client.post("/api/payments/create-checkout", params={"booking_id": booking_id},
+                                       headers=checkout)
+            assert first.status_code == 200 and second.json() == first.json()
+            assert len(integrations.stripe.get().StripeCheckout.sessions) == 1
+
+            # Client errors are replayed too
+            missing = {**auth, "Idempotency-Key": "checkout-2"}
+            for _ in range(2):
+                gone = await client.post("/api/payments/create-checkout", params={"booking_id": "nope"},
+                                         headers=missing)
+                assert gone.status_code == 404
+            assert gone.headers["Idempotent-Replayed"] == "true"
+    finally:
+        reset_integrations()
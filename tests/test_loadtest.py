@@ -0,0 +1,31 @@
+import random
+
+from backend_loadtest import LatencyHistogram, parse_weights
+
+
+def test_histogram_percentiles_stay_within_bucket_precision():
+    rng = random.Random(7)
+    samples = [rng.uniform(0.0005, 2.0) for _ in range(20_000)]
+    hist = LatencyHistogram()
+    for value in samples:
+        hist.record(value)
+
+    ordered = sorted(samples)
+    for pct in (50, 90, 99, 99.9):
+        exact_ms = ordered[int(round(pct / 100 * len(ordered))) - 1] * 1000
+        assert abs(hist.percentile_ms(pct) - exact_ms) <= exact_ms * 0.02
+    assert hist.total == len(samples)
+    assert len(hist.counts) < 1500
+
+
+def test_histogram_merge_combines_counts():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    a.record(0.001)
+    b.record(0.5)
+    a.merge(b)
+    assert a.total == 2
+    assert a.percentile_ms(100) == b.percentile_ms(100)
+
+
+def test_parse_weights():
+    assert parse_weights("book=1,browse=4") == {"book": 1.0, "browse": 4.0}
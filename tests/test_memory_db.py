@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from tests.memory_db import MemoryDB, matches
+
+
+def test_matches_supports_query_operators():
+    doc = {
+        "id": "b1",
+        "status": "pending",
+        "provider_id": None,
+        "price_estimate": {"total_price": 80.0},
+        "addon_ids": ["a1", "a2"],
+    }
+
+    assert matches(doc, {"status": {"$in": ["pending", "confirmed"]}})
+    assert matches(doc, {"$or": [{"provider_id": "p1"}, {"provider_id": None}]})
+    assert matches(doc, {"missing": {"$exists": False}, "provider_id": {"$exists": True}})
+    assert matches(doc, {"price_estimate.total_price": {"$gte": 80, "$lt": 100}})
+    assert matches(doc, {"addon_ids": "a2"})
+    assert matches(doc, {"status": {"$nin": ["cancelled"]}, "id": {"$ne": "b2"}})
+    assert not matches(doc, {"price_estimate.total_price": {"$gt": 80}})
+    assert not matches(doc, {"$and": [{"status": "pending"}, {"id": "b2"}]})
+
+
+@pytest.mark.asyncio
+async def test_find_sort_limit_projection_and_async_iteration():
+    db = MemoryDB()
+    base = datetime(2025, 1, 1)
+    await db.bookings.insert_many([
+        {"id": f"b{i}", "customer_id": f"c{i % 3}", "created_at": base + timedelta(hours=i), "notes": "x"}
+        for i in range(10)
+    ])
+
+    cursor = db.bookings.find({"customer_id": "c1"}, {"_id": 0, "id": 1, "created_at": 1})
+    docs = await cursor.sort("created_at", -1).skip(1).limit(2).to_list(None)
+    assert [d["id"] for d in docs] == ["b4", "b1"]
+    assert set(docs[0]) == {"id", "created_at"}
+
+    seen = [doc["id"] async for doc in db.bookings.find({"id": {"$in": ["b2", "b3"]}})]
+    assert seen == ["b2", "b3"]
+
+
+@pytest.mark.asyncio
+async def test_updates_and_find_one_and_update():
+    db = MemoryDB()
+    await db.counters.insert_one({"id": "sync", "value": 1})
+
+    doc = await db.counters.find_one_and_update(
+        {"id": "sync"}, {"$inc": {"value": 1}}, return_document=ReturnDocument.AFTER
+    )
+    assert doc["value"] == 2
+
+    doc = await db.counters.find_one_and_update(
+        {"id": "other"}, {"$inc": {"value": 1}, "$setOnInsert": {"created": True}},
+        upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    assert doc["id"] == "other" and doc["value"] == 1 and doc["created"] is True
+
+    result = await db.counters.update_one({"id": "sync"}, {"$set": {"meta.owner": "a"}, "$push": {"log": 1}})
+    assert result.modified_count == 1
+    stored = await db.counters.find_one({"meta.owner": "a"})
+    assert stored["log"] == [1]
+
+
+@pytest.mark.asyncio
+async def test_unique_index_and_bulk_write():
+    db = MemoryDB()
+    await db.users.create_index("email", unique=True)
+    await db.users.insert_one({"id": "u1", "email": "a@x.com"})
+    with pytest.raises(DuplicateKeyError):
+        await db.users.insert_one({"id": "u2", "email": "a@x.com"})
+
+    result = await db.users.bulk_write([
+        InsertOne({"id": "u3", "email": "c@x.com"}),
+        UpdateOne({"id": "u1"}, {"$set": {"is_active": False}}),
+        UpdateOne({"id": "u4"}, {"$set": {"email": "d@x.com"}}, upsert=True),
+        DeleteOne({"id": "u3"}),
+    ])
+    assert (result.inserted_count, result.modified_count, result.upserted_count, result.deleted_count) == (1, 1, 1, 1)
+    assert await db.users.count_documents({}) == 2
+    assert (await db.users.find_one({"email": "d@x.com"}))["id"] == "u4"
+
+
+@pytest.mark.asyncio
+async def test_indexed_queries_stay_fast_at_volume():
+    db = MemoryDB()
+    await db.bookings.create_index("customer_id")
+    await db.bookings.create_index("provider_id")
+    await db.bookings.insert_many([
+        {
+            "id": f"b{i}",
+            "customer_id": f"c{i % 10_000}",
+            "provider_id": f"p{i % 500}" if i % 4 else None,
+            "status": "pending",
+        }
+        for i in range(100_000)
+    ])
+
+    started = time.perf_counter()
+    for i in range(1_000):
+        docs = await db.bookings.find({"customer_id": f"c{i}"}).to_list(100)
+        assert len(docs) == 10
+        await db.bookings.update_one({"id": f"b{i}"}, {"$set": {"status": "confirmed"}})
+    elapsed = time.perf_counter() - started
+
+    plan = db.bookings.find({
+        "$or": [{"provider_id": {"$in": ["p1", "p2"]}}, {"provider_id": None}],
+    }).explain()
+    assert plan["index"] == "provider_id_1"
+    assert plan["candidates"] == 25_000 + 2 * 200
+    assert elapsed < 5
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import messaging
+
+
+@pytest.mark.asyncio
+async def test_messages_are_bucketed_and_paged_newest_first(monkeypatch):
+    monkeypatch.setattr(messaging, "BUCKET_SIZE", 3)
+    db = MemoryDB()
+    for n in range(1, 9):
+        await messaging.post_message(db, "t1", "alice" if n % 2 else "bob", f"message {n}", ["alice", "bob"])
+
+    assert await db.message_buckets.count_documents({"thread_id": "t1"}) == 3
+
+    pages, before = [], None
+    while True:
+        page, before = await messaging.history(db, "t1", before, limit=3)
+        pages.append([m["seq"] for m in page])
+        if before is None:
+            break
+    assert pages == [[8, 7, 6], [5, 4, 3], [2, 1]]
+
+    # Alice sent message 7, so she has read up to there; Bob up to 8
+    threads = {user: await messaging.threads_for(db, user) for user in ("alice", "bob")}
+    assert threads["alice"][0]["unread"] == 1 and threads["bob"][0]["unread"] == 0
+    assert await messaging.mark_read(db, "t1", "alice", 100) == 8
+    assert await messaging.mark_read(db, "t1", "alice", 2) == 8  # watermarks never move back
+    assert (await messaging.threads_for(db, "alice"))[0]["unread"] == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoints_scope_threads_to_booking_participants(monkeypatch):
+    db = MemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    server.provider_profile_ids.invalidate("provider_profiles")
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {}
+        for role in ("customer", "provider", "outsider"):
+            response = await client.post("/api/auth/register", json={
+                "email": f"{role}@chat-domora.com", "full_name": role.title(), "password": "Secret123!",
+                "role": "customer" if role == "outsider" else role,
+            })
+            headers[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        customer_id = (await client.get("/api/auth/me", headers=headers["customer"])).json()["id"]
+        provider_id = (await client.get("/api/auth/me", headers=headers["provider"])).json()["id"]
+        await db.provider_profiles.insert_one({"id": "profile-1", "user_id": provider_id})
+        await db.bookings.insert_one({
+            "id": "b1", "customer_id": customer_id, "provider_id": "profile-1", "status": "confirmed",
+            "scheduled_datetime": datetime.utcnow() + timedelta(days=1),
+        })
+
+        for text in ("Hello!", "Is 9am fine?"):
+            sent = await client.post("/api/bookings/b1/messages", headers=headers["customer"], json={"text": text})
+            assert sent.status_code == 200
+        assert (await client.post("/api/bookings/b1/messages", headers=headers["customer"],
+                                  json={"text": ""})).status_code == 422
+
+        threads = (await client.get("/api/messages/threads", headers=headers["provider"])).json()
+        assert [(t["thread_id"], t["unread"], t["last_message"]) for t in threads] == [("b1", 2, "Is 9am fine?")]
+
+        page = (await client.get("/api/bookings/b1/messages", params={"limit": 1}, headers=headers["provider"])).json()
+        assert [m["text"] for m in page["messages"]] == ["Is 9am fine?"] and page["before"] == 2
+        read = await client.post("/api/bookings/b1/messages/read", headers=headers["provider"], json={"seq": 1})
+        assert read.json() == {"read_seq": 1}
+        assert (await client.get("/api/messages/threads", headers=headers["provider"])).json()[0]["unread"] == 1
+
+        assert (await client.get("/api/bookings/b1/messages", headers=headers["outsider"])).status_code == 403
+        assert (await client.get("/api/messages/threads", headers=headers["outsider"])).json() == []
@@ -0,0 +1,48 @@
+from pymongo import monitoring
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+import mongo_pool
+
+
+def test_client_options_come_from_env_but_never_override_the_url(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "250")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "10")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zstd,zlib,lz4")
+    monkeypatch.setattr(mongo_pool.importlib.util, "find_spec", lambda name: None)
+
+    options = mongo_pool.client_options("mongodb://db-1,db-2/?replicaSet=rs0&serverSelectionTimeoutMS=1000")
+    assert options["maxPoolSize"] == 250 and options["minPoolSize"] == 10
+    assert options["waitQueueTimeoutMS"] == 5000
+    assert "serverSelectionTimeoutMS" not in options
+    # zstandard is "not installed" here and lz4 is unknown, so only zlib is offered
+    assert options["compressors"] == "zlib"
+
+
+def test_read_heavy_preference(monkeypatch):
+    assert isinstance(mongo_pool.read_heavy_preference(), SecondaryPreferred)
+    monkeypatch.setenv("MONGO_READ_HEAVY_PREFERENCE", "primary")
+    assert isinstance(mongo_pool.read_heavy_preference(), Primary)
+
+
+def test_pool_metrics_record_checkout_waits_and_usage():
+    listener = mongo_pool.PoolMetrics()
+    address = ("db-1", 27017)
+    waits = mongo_pool.pool_wait.count()
+
+    listener.connection_created(monitoring.ConnectionCreatedEvent(address, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, 1))
+    assert mongo_pool.pool_wait.count() == waits + 1
+    assert mongo_pool.connections_in_use.value(server="db-1:27017") == 1
+
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+    listener.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(address, "timeout"))
+    assert mongo_pool.connections_in_use.value(server="db-1:27017") == 0
+    assert mongo_pool.connections_open.value(server="db-1:27017") == 1
+    assert mongo_pool.checkout_failures.value(reason="timeout") == 1
+    assert mongo_pool.pool_wait.count() == waits + 2
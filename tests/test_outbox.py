@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from pymongo.errors import OperationFailure
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import integrations
+import outbox
+
+ADDRESS = {"street": "Titova 10", "city": "Novo mesto", "postal_code": "8000", "country": "Slovenia"}
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_retries_limits_concurrency_and_dead_letters():
+    db = MemoryDB()
+    for n in range(6):
+        await outbox.enqueue(db, "email", {"n": n})
+    await outbox.enqueue(db, "sms", {"n": 0})
+
+    in_flight, peak, failures = [0], [0], {0: 1}
+
+    async def flaky_email(payload):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        if failures.get(payload["n"]):
+            failures[payload["n"]] -= 1
+            raise ConnectionError("smtp down")
+
+    dispatcher = outbox.OutboxDispatcher(db, {"email": flaky_email}, concurrency={"email": 2}, base_delay=0)
+    assert await dispatcher.dispatch_once() == 7
+    assert peak[0] == 2
+
+    retried = await db.outbox.find_one({"payload.n": 0, "channel": "email"})
+    assert retried["status"] == "pending" and retried["attempts"] == 1 and "smtp down" in retried["last_error"]
+    assert (await db.outbox.find_one({"channel": "sms"}))["status"] == "dead"
+
+    assert await dispatcher.dispatch_once() == 1
+    assert await db.outbox.count_documents({"status": "sent"}) == 6
+
+    async def broken(payload):
+        raise RuntimeError("always fails")
+
+    await outbox.enqueue(db, "push", {"n": 1})
+    pushes = outbox.OutboxDispatcher(db, {"push": broken}, max_attempts=2, base_delay=0)
+    await pushes.dispatch_once()
+    await pushes.dispatch_once()
+    dead = await db.outbox.find_one({"channel": "push"})
+    assert dead["status"] == "dead" and dead["attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_atomically_falls_back_without_replica_set(monkeypatch):
+    class StandaloneClient:
+        async def start_session(self):
+            raise OperationFailure("Transaction numbers are only allowed on a replica set member or mongos", 20)
+
+    db = MemoryDB()
+    monkeypatch.setattr(db, "client", StandaloneClient(), raising=False)
+    monkeypatch.setattr(outbox, "_transactions_supported", None)
+    sessions = []
+
+    async def work(session):
+        sessions.append(session)
+        return "done"
+
+    assert await outbox.atomically(db, work) == "done"
+    assert await outbox.atomically(db, work) == "done"
+    assert sessions == [None, None] and outbox._transactions_supported is False
+
+
+@pytest.mark.asyncio
+async def test_booking_notifications_go_through_the_outbox(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    patch_integrations()
+    await server.initialize_db()
+    package = await server.db.service_packages.find_one({"service_type": "house_cleaning"})
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": "customer@outbox-domora.com", "full_name": "Customer", "role": "customer",
+                "password": "Secret123!",
+            })
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            await client.put("/api/users/me/push-token", headers=headers, json={"token": "ExponentPushToken[abc]"})
+            booking = await client.post("/api/bookings", headers=headers, json={
+                "service_type": "house_cleaning",
+                "package_id": package["id"],
+                "service_address": ADDRESS,
+                "scheduled_datetime": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+            })
+            assert booking.status_code == 200
+
+        queued = await server.db.outbox.find({}).to_list(None)
+        assert sorted(m["channel"] for m in queued) == ["email", "push"]
+        assert {m["status"] for m in queued} == {"pending"}
+
+        dispatcher = outbox.OutboxDispatcher(server.db, {"email": server.deliver_email, "push": server.deliver_push})
+        assert await dispatcher.dispatch_once() == 2
+
+        (_, to_addr, _), = integrations.smtp.get().SMTP.sent
+        assert to_addr == "customer@outbox-domora.com"
+        (_, messages), = integrations.push.get().sent
+        assert messages[0]["to"] == "ExponentPushToken[abc]"
+        assert messages[0]["data"] == {"booking_id": booking.json()["id"]}
+    finally:
+        reset_integrations()
@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pytest
+
+from tests.benchmarks import bench_pricing
+from tests.memory_db import MemoryDB
+from tests.stubs import haversine_km as scalar_haversine_km
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import pricing
+import rate_limit
+
+ADDRESS = {"street": "Slovenska cesta 1", "city": "Ljubljana", "postal_code": "1000", "country": "Slovenia"}
+
+
+def test_vectorized_haversine_and_travel_fee():
+    lats = np.array([46.0569, 46.5547, 45.5481])
+    lons = np.array([14.5058, 15.6459, 13.7302])
+
+    distances = pricing.haversine_km(46.0569, 14.5058, lats, lons)
+    expected = [scalar_haversine_km(46.0569, 14.5058, lat, lon) for lat, lon in zip(lats, lons)]
+    assert np.allclose(distances, expected)
+
+    rules = pricing.compile_rules({"travel_bands": [
+        {"from_km": 0, "fee_per_km": 0},
+        {"from_km": 15, "fee_per_km": 0.5},
+        {"from_km": 35, "fee_per_km": 1.0},
+    ]})
+    fees = rules.travel_fee(np.array([5.0, 15.0, 35.0, 45.0]))
+    assert fees.tolist() == [0.0, 0.0, 10.0, 20.0]
+    assert rules.travel_fee(45.0) == 20.0
+
+
+def test_rules_apply_surcharges_and_multipliers():
+    rules = pricing.compile_rules({
+        "travel_bands": [{"from_km": 0, "fee_per_km": 0}],
+        "service_type_surcharges": {"landscaping": 5.0},
+        "weekend_multiplier": 1.5,
+        "emergency_multiplier": 2.0,
+    })
+    saturday = datetime(2025, 6, 7, 10)
+
+    plain = rules.evaluate(80.0, 20.0, 3.0, "house_cleaning", "Quick Tidy", datetime(2025, 6, 4, 10))
+    assert plain.total_price == 103.0
+
+    components = rules.evaluate(80.0, 20.0, 3.0, "landscaping", "Emergency Storm Cleanup", saturday)
+    assert (components.weekend_surcharge, components.emergency_surcharge) == (50.0, 150.0)
+    assert components.total_price == 100.0 + 50.0 + 150.0 + 5.0 + 3.0
+
+    breakdown = pricing.estimate_fields(components, "Emergency Storm Cleanup", {})["breakdown"]
+    assert list(breakdown) == [
+        "Emergency Storm Cleanup", "Service Surcharge", "Weekend Surcharge", "Emergency Surcharge", "Travel Fee"
+    ]
+
+    with pytest.raises(ValueError):
+        pricing.compile_rules({"travel_bands": [{"from_km": 5, "fee_per_km": 1}]})
+
+
+def test_rules_store_reloads_changed_file_and_keeps_last_good(tmp_path):
+    path = tmp_path / "pricing.json"
+    path.write_text(json.dumps({"version": "v1", "travel_bands": [{"from_km": 0, "fee_per_km": 1}]}))
+    store = pricing.PricingRulesStore(str(path), check_interval=0)
+    first = store.current()
+    assert first.version == "v1" and store.current() is first
+
+    path.write_text(json.dumps({"version": "v2", "travel_bands": [{"from_km": 0, "fee_per_km": 2}]}))
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert store.current().version == "v2"
+
+    path.write_text("{not json")
+    os.utime(path, (time.time() + 20, time.time() + 20))
+    assert store.current().version == "v2"
+
+
+@pytest.mark.asyncio
+async def test_batch_estimate_matches_single_estimates(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(None))
+    gmaps = patch_integrations()
+    await server.initialize_db()
+    packages = await server.db.service_packages.find({}).to_list(3)
+    addons = await server.db.service_addons.find({}).to_list(2)
+    addon_ids = [addon["id"] for addon in addons]
+    await server.db.provider_profiles.insert_many([
+        {"id": "near", "service_areas": [{**ADDRESS, "latitude": 46.06, "longitude": 14.51}]},
+        {"id": "far", "service_areas": [{**ADDRESS, "latitude": 46.5547, "longitude": 15.6459}]},
+        {"id": "unlocated", "service_areas": [ADDRESS]},
+    ])
+
+    quotes = [
+        {"package_id": package["id"], "addon_ids": addon_ids, "provider_id": provider_id}
+        for package in packages
+        for provider_id in ("near", "far", "unlocated", None)
+    ]
+    quotes.append({"package_id": "missing", "addon_ids": [], "provider_id": None})
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/api/services/price-estimate/batch",
+                json={"service_address": ADDRESS, "quotes": quotes},
+            )
+            geocode_calls = gmaps.calls["geocode"]
+            singles = [
+                await client.post(
+                    "/api/services/price-estimate",
+                    params={"package_id": quote["package_id"], **({"provider_id": quote["provider_id"]}
+                                                                   if quote["provider_id"] else {})},
+                    json={"service_address": ADDRESS, "addon_ids": quote["addon_ids"]},
+                )
+                for quote in quotes[:-1]
+            ]
+    finally:
+        reset_integrations()
+    assert response.status_code == 200
+    assert geocode_calls == 1
+    results = response.json()["quotes"]
+    assert len(results) == len(quotes)
+    assert results[-1]["error"] == "Package not found" and results[-1]["estimate"] is None
+
+    addons_price = sum(addon["price"] for addon in addons)
+    for quote, result in zip(quotes[:-1], results[:-1]):
+        estimate = result["estimate"]
+        package = next(p for p in packages if p["id"] == quote["package_id"])
+        assert estimate["base_price"] == package["base_price"]
+        assert estimate["addons_price"] == pytest.approx(addons_price)
+        if quote["provider_id"] == "far":
+            assert estimate["travel_fee"] > 0
+        else:
+            assert estimate["travel_fee"] == 0.0
+        assert (result["distance_km"] is None) == (quote["provider_id"] in ("unlocated", None))
+
+    # Every batch quote prices exactly as the single-quote endpoint does
+    for result, single in zip(results[:-1], singles):
+        assert single.status_code == 200, single.text
+        single = single.json()
+        for field in ("base_price", "addons_price", "travel_fee", "total_price"):
+            assert result["estimate"][field] == pytest.approx(single[field], abs=0.01), field
+        assert estimate["total_price"] == pytest.approx(
+            estimate["base_price"] + estimate["addons_price"] + estimate["travel_fee"]
+        )
+        assert estimate["breakdown"][package["name"]] == package["base_price"]
+
+
+def test_pricing_benchmark_runs():
+    results = bench_pricing.run(pricing.compile_rules(bench_pricing.SAMPLE_RULES), iterations=2_000, batch_size=100)
+    assert [r["case"] for r in results][1] == "compiled rules"
+    assert all(r["ops"] > 0 for r in results)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from jose import jwt
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+from ttl_cache import MISSING, TTLCache
+
+PROFILE = {
+    "business_name": "Sparkle",
+    "description": "Cleaning",
+    "service_types": ["house_cleaning"],
+    "service_areas": [{"street": "Trg 1", "city": "Celje", "postal_code": "3000", "country": "Slovenia"}],
+    "availability": {},
+}
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    now = [0.0]
+    cache = TTLCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING and len(cache) == 2
+
+    now[0] = 10
+    assert cache.get("a") is MISSING
+    cache.set("d", None, ttl=5)
+    assert cache.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_provider_access_checks_use_cached_profile_id(monkeypatch):
+    db = MemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "JWT_PROVIDER_CLAIM", True)
+    server.provider_profile_ids.invalidate("provider_profiles")
+    lookups = []
+    find_one = db.provider_profiles.find_one
+
+    async def counting_find_one(query, *args, **kwargs):
+        lookups.append(query)
+        return await find_one(query, *args, **kwargs)
+
+    monkeypatch.setattr(db.provider_profiles, "find_one", counting_find_one)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        credentials = {"email": "provider@cache-domora.com", "password": "Secret123!"}
+        token = (await client.post("/api/auth/register", json={
+            **credentials, "full_name": "Provider", "role": "provider",
+        })).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        profile = (await client.post("/api/providers/profile", headers=headers, json=PROFILE)).json()
+        await db.bookings.insert_one({
+            "id": "b1", "customer_id": "c1", "provider_id": profile["id"], "service_type": "house_cleaning",
+            "package_id": "p1", "service_address": PROFILE["service_areas"][0],
+            "scheduled_datetime": datetime.utcnow() + timedelta(days=1), "status": "confirmed",
+            "payment_status": "captured",
+            "price_estimate": {"base_price": 1, "addons_price": 0, "travel_fee": 0, "total_price": 1, "breakdown": {}},
+            "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+        })
+
+        lookups.clear()
+        assert (await client.get("/api/bookings/b1", headers=headers)).status_code == 200
+        assert [b["id"] for b in (await client.get("/api/bookings", headers=headers)).json()] == ["b1"]
+        assert lookups == []  # warmed when the profile was created
+
+        # A fresh worker learns the profile id from the token's pid claim
+        login = (await client.post("/api/auth/login", json=credentials)).json()
+        assert jwt.get_unverified_claims(login["access_token"])["pid"] == profile["id"]
+        server.provider_profile_ids.invalidate("provider_profiles")
+        lookups.clear()
+        fresh = {"Authorization": f"Bearer {login['access_token']}"}
+        assert (await client.get("/api/bookings/b1", headers=fresh)).status_code == 200
+        assert lookups == []
+
+        updated = await client.put("/api/providers/profile", headers=fresh, json={"business_name": "Sparkle 2",
+                                                                                  "rating": 5.0})
+        assert updated.json()["business_name"] == "Sparkle 2" and updated.json()["rating"] == 0.0
+        assert len(server.provider_profile_ids) == 0  # dropped by the invalidation
@@ -0,0 +1,95 @@
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import rate_limit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_800_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["memory", "mongo"])
+async def test_buckets_allow_bursts_then_refill_at_the_rate(kind):
+    clock = Clock()
+    db = MemoryDB()
+    await rate_limit.ensure_indexes(db)
+    if kind == "memory":
+        buckets = rate_limit.MemoryBuckets(max_keys=10, clock=clock)
+    else:
+        buckets = rate_limit.MongoBuckets(lambda: db, clock=clock)
+    limit = rate_limit.parse_limit("3/minute")
+
+    assert [await buckets.hit("a", limit) for _ in range(3)] == [None, None, None]
+    assert await buckets.hit("a", limit) == pytest.approx(20)
+    assert await buckets.hit("b", limit) is None
+
+    clock.now += 20
+    assert await buckets.hit("a", limit) is None
+    assert await buckets.hit("a", limit) == pytest.approx(20)
+
+
+def test_parse_limit_rejects_malformed_specs():
+    assert rate_limit.parse_limit("10/hour") == rate_limit.Limit(10, 3600)
+    for spec in ("10", "ten/minute", "10/fortnight", "0/minute"):
+        with pytest.raises(ValueError):
+            rate_limit.parse_limit(spec)
+
+
+@pytest.mark.asyncio
+async def test_login_is_throttled_per_address_and_account(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(rate_limit.MemoryBuckets(), proxy_hops=1))
+    monkeypatch.setattr(server, "AUTH_RATE_LIMIT", rate_limit.parse_limit("5/minute"))
+    monkeypatch.setattr(server, "LOGIN_ACCOUNT_RATE_LIMIT", rate_limit.parse_limit("3/minute"))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def login(ip, email="victim@limit-domora.com"):
+            return await client.post("/api/auth/login", headers={"X-Forwarded-For": f"10.0.0.9, {ip}"},
+                                     json={"email": email, "password": "wrong"})
+
+        # Each address is within its own limit, but the account's bucket runs dry
+        statuses = [(await login(f"198.51.100.{n}")).status_code for n in range(4)]
+        assert statuses == [401, 401, 401, 429]
+
+        responses = [await login("203.0.113.7", f"user{n}@limit-domora.com") for n in range(6)]
+        assert [r.status_code for r in responses] == [401] * 5 + [429]
+        assert int(responses[-1].headers["Retry-After"]) == 12
+
+
+@pytest.mark.asyncio
+async def test_failed_guesses_elsewhere_do_not_lock_the_owner_out(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(rate_limit.MemoryBuckets(), proxy_hops=1))
+    monkeypatch.setattr(server, "AUTH_RATE_LIMIT", rate_limit.parse_limit("6/minute"))
+    monkeypatch.setattr(server, "LOGIN_ACCOUNT_RATE_LIMIT", rate_limit.parse_limit("3/minute"))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def login(ip, password):
+            return await client.post("/api/auth/login", headers={"X-Forwarded-For": ip},
+                                     json={"email": "owner@limit-domora.com", "password": password})
+
+        await client.post("/api/auth/register", headers={"X-Forwarded-For": "192.0.2.1"}, json={
+            "email": "owner@limit-domora.com", "full_name": "Owner", "role": "customer", "password": "Secret123!",
+        })
+        # Successful logins do not spend the account's budget
+        assert [(await login("203.0.113.7", "Secret123!")).status_code for _ in range(4)] == [200] * 4
+
+        guesses = [(await login(f"198.51.100.{n}", "wrong")).status_code for n in range(5)]
+        assert guesses == [401, 401, 401, 429, 429]
+
+        # The owner's usual address still gets in; a new one waits for the bucket
+        assert (await login("203.0.113.7", "Secret123!")).status_code == 200
+        assert (await login("198.51.100.99", "Secret123!")).status_code == 429
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from tests.benchmarks import bench_realtime
+from tests.memory_db import MemoryDB
+from tests.stubs import FakeStripeCheckout, install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import realtime
+
+ADDRESS = {"street": "Mestni trg 3", "city": "Koper", "postal_code": "6000", "country": "Slovenia"}
+
+
+def register(client, email, role):
+    response = client.post("/api/auth/register", json={
+        "email": email, "full_name": role.title(), "role": role, "password": "Secret123!",
+    })
+    return response.json()["access_token"]
+
+
+def test_payment_capture_is_pushed_to_subscribed_sockets(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(FakeStripeCheckout, "paid_on_status_check", True)
+    monkeypatch.setenv("ANALYTICS_RECONCILE_HOUR", "")
+    monkeypatch.setenv("CACHE_BUS_MODE", "off")
+    patch_integrations()
+    try:
+        with TestClient(server.app) as client:
+            token = register(client, "customer@realtime-domora.com", "customer")
+            other = register(client, "other@realtime-domora.com", "customer")
+            headers = {"Authorization": f"Bearer {token}"}
+            package = client.get("/api/services/packages", params={"service_type": "house_cleaning"}).json()[0]
+            booking = client.post("/api/bookings", headers=headers, json={
+                "service_type": "house_cleaning",
+                "package_id": package["id"],
+                "service_address": ADDRESS,
+                "scheduled_datetime": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+            }).json()
+
+            with client.websocket_connect(f"/api/ws?token={other}") as intruder:
+                intruder.send_json({"action": "subscribe", "id": booking["id"]})
+                assert intruder.receive_json()["detail"] == "Access denied"
+
+            with client.websocket_connect(f"/api/ws?token={token}") as socket:
+                socket.send_json({"action": "subscribe", "id": booking["id"]})
+                assert socket.receive_json() == {"type": "subscribed", "topic": f"booking:{booking['id']}"}
+                socket.send_json({"action": "subscribe", "channel": "thread", "id": booking["id"]})
+                assert socket.receive_json()["type"] == "subscribed"
+
+                session_id = client.post(
+                    "/api/payments/create-checkout", params={"booking_id": booking["id"]}, headers=headers
+                ).json()["session_id"]
+                client.get(f"/api/payments/status/{session_id}", headers=headers)
+
+                event = socket.receive_json()
+                assert event["type"] == "booking.updated" and event["booking_id"] == booking["id"]
+                assert event["status"] == "confirmed" and event["payment_status"] == "captured"
+
+            with pytest.raises(WebSocketDisconnect):
+                with client.websocket_connect("/api/ws?token=not-a-jwt") as rejected:
+                    rejected.receive_json()
+    finally:
+        reset_integrations()
+
+
+@pytest.mark.asyncio
+async def test_slow_connections_get_a_resync_instead_of_a_backlog():
+    hub = realtime.Hub()
+    connection = realtime.Connection(websocket=None, user_id="u", queue_size=2)
+    hub.add(connection)
+    hub.subscribe(connection, "booking:b1")
+
+    assert [hub.deliver("booking:b1", {"n": n}) for n in range(3)] == [1, 1, 1]
+    assert connection.queue.qsize() == 1
+    assert connection.queue.get_nowait() == {"type": "resync", "topics": ["booking:b1"]}
+
+    hub.remove(connection)
+    assert hub.deliver("booking:b1", {"n": 4}) == 0 and not hub.connections
+
+
+@pytest.mark.asyncio
+async def test_idle_socket_benchmark_runs():
+    result = await bench_realtime.run(connections=200, deliveries=20)
+    assert result["connections"] == 200 and result["kb_per_connection"] > 0
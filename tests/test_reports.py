@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from typer.testing import CliRunner
+
+from tests import BACKEND_DIR  # noqa: F401
+
+import reports
+
+
+def booking(i, customer, month, status="confirmed", paid=True, provider="p1", travel_fee=0.0):
+    return {
+        "id": f"b{i}",
+        "customer_id": customer,
+        "provider_id": provider,
+        "service_type": "landscaping" if i % 2 else "house_cleaning",
+        "status": status,
+        "payment_status": "captured" if paid else "pending",
+        "service_address": {"city": "Ljubljana"},
+        "price_estimate": {"base_price": 50.0, "addons_price": 0.0, "travel_fee": travel_fee,
+                           "total_price": 50.0 + travel_fee},
+        "scheduled_datetime": datetime(2025, month, 20),
+        "created_at": datetime(2025, month, 10),
+    }
+
+
+BOOKINGS = [
+    booking(0, "c1", 1),
+    booking(1, "c1", 2, travel_fee=4.0),
+    booking(2, "c2", 1, paid=False, provider=None),
+    booking(3, "c3", 2, provider="p2", travel_fee=2.0),
+    booking(4, "c1", 3),
+]
+TRANSACTIONS = [
+    {"id": f"t{i}", "booking_id": b["id"], "user_id": b["customer_id"], "amount": b["price_estimate"]["total_price"],
+     "currency": "eur", "payment_status": b["payment_status"], "created_at": b["created_at"],
+     "updated_at": b["created_at"]}
+    for i, b in enumerate(BOOKINGS)
+]
+
+
+@pytest.fixture
+def frames():
+    # Batches of two exercise the per-batch conversion and categorical union
+    batches = lambda docs: [docs[i:i + 2] for i in range(0, len(docs), 2)]  # noqa: E731
+    return {
+        "bookings": reports.build_frame(batches(BOOKINGS), reports.BOOKING_COLUMNS),
+        "payment_transactions": reports.build_frame(batches(TRANSACTIONS), reports.TRANSACTION_COLUMNS),
+    }
+
+
+def test_frames_are_typed_and_snapshots_round_trip(frames, tmp_path):
+    bookings = frames["bookings"]
+    assert isinstance(bookings["service_type"].dtype, pd.CategoricalDtype)
+    assert set(bookings["status"].cat.categories) == {"confirmed"}
+    assert str(bookings["created_at"].dtype) == "datetime64[ns]"
+    assert bookings["provider_id"].isna().sum() == 1
+
+    reports.save_snapshot(frames, tmp_path / "snap")
+    loaded = reports.load_snapshot(tmp_path / "snap")
+    for name, frame in frames.items():
+        pd.testing.assert_frame_equal(loaded[name], frame)
+
+
+def test_reports(frames):
+    bookings, transactions = frames["bookings"], frames["payment_transactions"]
+
+    cohorts = reports.cohort_report(bookings)
+    assert cohorts.loc["2025-01", "customers"] == 2 and cohorts.loc["2025-01", "bookings"] == 4
+    assert cohorts.loc["2025-02", "revenue"] == 52.0
+
+    retention = reports.retention_report(bookings, months=3)
+    assert retention.loc["2025-01"].tolist() == [1.0, 0.5, 0.5]
+
+    providers = reports.revenue_per_provider(bookings, transactions)
+    assert providers.index[0] == "p1" and providers.loc["p1", "revenue"] == 154.0
+    assert "(unassigned)" not in providers.index  # the unassigned booking was never paid
+
+    fees = reports.travel_fee_report(bookings)
+    assert fees.loc["landscaping", "charged_share"] == 1.0
+    assert fees.loc["house_cleaning", "total_fees"] == 0.0
+
+
+def test_cli_reads_snapshots(frames, tmp_path):
+    reports.save_snapshot(frames, tmp_path)
+    result = CliRunner().invoke(reports.app, ["travel-fees", "--snapshot", str(tmp_path), "--by", "city"])
+    assert result.exit_code == 0, result.output
+    assert "Ljubljana" in result.output
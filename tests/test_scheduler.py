@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import scheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2026, 3, 2, 12, 0)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_only_the_lease_holder_runs_jobs_in_batches():
+    db, clock = MemoryDB(), Clock()
+    await scheduler.ensure_indexes(db)
+    ran = []
+
+    async def handler(payload):
+        ran.append(payload["n"])
+
+    workers = [scheduler.Scheduler(db, batch_size=2, clock=clock) for _ in range(2)]
+    for worker in workers:
+        worker.job("send", handler)
+    for n in range(5):
+        await scheduler.schedule(db, "send", clock.now - timedelta(minutes=n), {"n": n})
+    await scheduler.schedule(db, "send", clock.now + timedelta(hours=1), {"n": 99})
+
+    first, second = workers
+    await first.tick()
+    await second.tick()
+    assert first.is_leader and not second.is_leader
+    assert sorted(ran) == [0, 1, 2, 3, 4]
+    assert await db.scheduled_jobs.count_documents({"status": "done"}) == 5
+    # The leader sleeps until the next persisted job is due
+    assert first._heap[0][0] == clock.now + timedelta(hours=1)
+
+    # The lease passes on once its holder stops renewing it
+    clock.now += timedelta(minutes=5)
+    await second.tick()
+    assert second.is_leader
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_retry_and_recurring_jobs_reschedule():
+    db, clock = MemoryDB(), Clock()
+    worker = scheduler.Scheduler(db, max_attempts=2, clock=clock)
+    calls = []
+
+    async def flaky(payload):
+        calls.append(clock.now)
+        raise ConnectionError("smtp down")
+
+    async def sweep(payload):
+        calls.append("sweep")
+
+    worker.job("flaky", flaky)
+    worker.job("sweep", sweep, recurring=scheduler.every(300))
+    await scheduler.schedule(db, "flaky", clock.now, key="flaky:1")
+
+    await worker.tick()
+    job = await db.scheduled_jobs.find_one({"key": "flaky:1"})
+    assert job["status"] == "scheduled" and job["attempts"] == 1 and job["run_at"] > clock.now
+    sweep_job = await db.scheduled_jobs.find_one({"key": "recurring:sweep"})
+    assert sweep_job["run_at"] == clock.now + timedelta(seconds=300)
+
+    clock.now += timedelta(minutes=5)
+    await worker.tick()
+    assert (await db.scheduled_jobs.find_one({"key": "flaky:1"}))["status"] == "failed"
+    sweep_job = await db.scheduled_jobs.find_one({"key": "recurring:sweep"})
+    assert sweep_job["status"] == "scheduled" and sweep_job["run_at"] == clock.now + timedelta(seconds=300)
+    assert calls.count("sweep") == 1
+    assert await db.scheduled_jobs.count_documents({"key": "recurring:sweep"}) == 1
+
+
+@pytest.mark.asyncio
+async def test_unpaid_bookings_expire_and_paid_ones_get_a_reminder(monkeypatch):
+    db = MemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    now = datetime.utcnow()
+    for booking_id, created in (("stale", now - timedelta(hours=2)), ("fresh", now)):
+        await db.bookings.insert_one({
+            "id": booking_id, "customer_id": "c1", "service_type": "house_cleaning", "status": "pending",
+            "payment_status": "pending", "created_at": created, "scheduled_datetime": now + timedelta(days=3),
+            "price_estimate": {"total_price": 80.0},
+        })
+
+    await server.expire_pending_bookings({})
+    assert (await db.bookings.find_one({"id": "stale"}))["status"] == "cancelled"
+    assert (await db.bookings.find_one({"id": "fresh"}))["status"] == "pending"
+    assert await db.outbox.count_documents({"payload.subject": "Your Domora booking has expired"}) == 2
+
+    await server.capture_booking_payment("fresh")
+    reminder = await db.scheduled_jobs.find_one({"key": "reminder:fresh"})
+    assert reminder["name"] == "booking_reminder"
+    assert reminder["run_at"] == now + timedelta(days=3) - server.REMINDER_LEAD
+
+    # A job run again after its lease was lost queues nothing new
+    for _ in range(2):
+        await server.booking_reminder(reminder["payload"])
+    assert await db.outbox.count_documents({"payload.subject": "Your Domora booking is coming up"}) == 2
+    assert await db.outbox.find_one({"id": "reminder:fresh:%s:c1:push" % f"{now + timedelta(days=3):%Y%m%d%H%M}"})
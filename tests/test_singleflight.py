@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from tests.stubs import IntegrationLatency, install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import singleflight
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights = SingleFlight("test")
+    started, release = [], asyncio.Event()
+
+    async def lookup(value):
+        started.append(value)
+        await release.wait()
+        return value * 2
+
+    callers = [asyncio.create_task(flights.do("k", lambda: lookup(21))) for _ in range(5)]
+    other = asyncio.create_task(flights.do("other", lambda: lookup(1)))
+    await asyncio.sleep(0)
+    assert len(flights) == 2
+
+    # Cancelling the caller that started the call does not cancel it for the rest
+    callers[0].cancel()
+    release.set()
+    assert await asyncio.gather(*callers[1:]) == [42, 42, 42, 42]
+    assert await other == 2
+    assert started == [21, 1] and len(flights) == 0
+    assert singleflight.calls.value(group="test", result="deduplicated") == 4
+
+    async def broken():
+        raise LookupError("no such address")
+
+    failing = [flights.do("k", broken) for _ in range(2)]
+    results = await asyncio.gather(*failing, return_exceptions=True)
+    assert all(isinstance(r, LookupError) for r in results)
+    assert await flights.do("k", lambda: lookup(5)) == 10
+
+
+@pytest.mark.asyncio
+async def test_geocoding_the_same_address_concurrently_calls_maps_once():
+    gmaps = patch_integrations(IntegrationLatency(geocode=0.05))
+    try:
+        addresses = [
+            server.AddressModel(street="Titova 10", city="Novo mesto", postal_code="8000", country="Slovenia")
+            for _ in range(10)
+        ]
+        geocoded = await asyncio.gather(*(server.geocode_address(a) for a in addresses))
+        assert gmaps.calls["geocode"] == 1
+        assert all(a.latitude and a.longitude for a in geocoded)
+    finally:
+        reset_integrations()
@@ -0,0 +1,30 @@
+import pytest
+
+from tests.benchmarks.bench_startup import run_trial
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+
+
+def test_cold_start_defers_heavy_integrations():
+    trial = run_trial()
+
+    assert trial["heavy_modules_after_import"] == []
+    assert "seed_catalog" in trial["server_phases_ms"]
+    assert trial["first_request_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_initialize_db_skips_reseed_when_catalog_unchanged(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+
+    await server.initialize_db()
+    first_ids = {p["id"] for p in await server.db.service_packages.find({}).to_list(None)}
+    await server.initialize_db()
+    second_ids = {p["id"] for p in await server.db.service_packages.find({}).to_list(None)}
+
+    assert first_ids and first_ids == second_ids
+    assert await server.db.catalog_meta.count_documents({}) == 1
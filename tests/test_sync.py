@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules, patch_integrations, reset_integrations
+
+install_stub_modules()
+
+from backend import server
+import sync
+
+ADDRESS = {"street": "Prešernov trg 2", "city": "Ljubljana", "postal_code": "1000", "country": "Slovenia"}
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_returns_only_changes_and_tombstones(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    # No overlap window, so a repeat sync is exactly empty
+    monkeypatch.setattr(sync, "OVERLAP", timedelta(0))
+    patch_integrations()
+    await server.initialize_db()
+    package = await server.db.service_packages.find_one({"service_type": "landscaping"})
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": "customer@sync-domora.com", "full_name": "Customer", "role": "customer",
+                "password": "Secret123!",
+            })
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            home = (await client.post("/api/addresses", headers=headers, json={**ADDRESS, "label": "Home"})).json()
+
+            full = (await client.get("/api/sync", headers=headers)).json()
+            assert not full["has_more"] and not full["reset"]
+            assert len(full["packages"]["changed"]) == await server.db.service_packages.count_documents({})
+            assert [a["id"] for a in full["addresses"]["changed"]] == [home["id"]]
+            assert full["bookings"]["changed"] == []
+
+            unchanged = (await client.get("/api/sync", params={"since": full["watermark"]}, headers=headers)).json()
+            assert all(not unchanged[name]["changed"] and not unchanged[name]["deleted"]
+                       for name in ("bookings", "packages", "addons", "addresses"))
+
+            booking = (await client.post("/api/bookings", headers=headers, json={
+                "service_type": "landscaping",
+                "package_id": package["id"],
+                "service_address": ADDRESS,
+                "scheduled_datetime": (datetime.utcnow() + timedelta(days=3)).isoformat(),
+            })).json()
+            assert (await client.delete(f"/api/addresses/{home['id']}", headers=headers)).status_code == 200
+
+            delta = (await client.get("/api/sync", params={"since": unchanged["watermark"]}, headers=headers)).json()
+            assert [b["id"] for b in delta["bookings"]["changed"]] == [booking["id"]]
+            assert delta["addresses"] == {"changed": [], "deleted": [home["id"]]}
+            assert delta["packages"]["changed"] == [] and delta["provider_profile"] is None
+
+            bad = await client.get("/api/sync", params={"since": "%%%"}, headers=headers)
+            assert bad.status_code == 400
+    finally:
+        reset_integrations()
+
+
+@pytest.mark.asyncio
+async def test_truncated_sync_pages_through_every_change_once(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(server, "SYNC_LIMIT", 3)
+    patch_integrations()
+    await server.initialize_db()
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/auth/register", json={
+                "email": "pager@sync-domora.com", "full_name": "Pager", "role": "customer",
+                "password": "Secret123!",
+            })
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            watermark = (await client.get("/api/sync", headers=headers)).json()["watermark"]
+
+            addresses = [(await client.post("/api/addresses", headers=headers,
+                                            json={**ADDRESS, "label": f"A{n}"})).json()["id"] for n in range(4)]
+            # Every package tombstone shares one version, more than a page of them
+            package_ids = await server.db.service_packages.distinct("id")
+            await sync.record_deletions(server.db, "packages", package_ids)
+
+            sent = []
+            for _ in range(50):
+                page = (await client.get("/api/sync", params={"since": watermark}, headers=headers)).json()
+                for name in ("bookings", "packages", "addons", "addresses"):
+                    sent += [(name, "changed", doc["id"]) for doc in page[name]["changed"]]
+                    sent += [(name, "deleted", doc_id) for doc_id in page[name]["deleted"]]
+                watermark = page["watermark"]
+                if not page["has_more"]:
+                    break
+            assert not page["has_more"]
+            assert len(sent) == len(set(sent))
+            assert {doc_id for name, kind, doc_id in sent if name == "addresses"} == set(addresses)
+            assert {doc_id for name, kind, doc_id in sent if kind == "deleted"} == set(package_ids)
+    finally:
+        reset_integrations()
+
+
+def test_watermarks_round_trip():
+    assert sync.decode_watermark(None) == sync.Watermark(0, sync.EPOCH)
+    plain = sync.Watermark(7, datetime(2026, 5, 1, 12, 30))
+    paging = plain._replace(cursor=(9, "a1b2-c3"), started=datetime(2026, 5, 2, 8, 0, 1, 250))
+    for watermark in (plain, paging):
+        assert sync.decode_watermark(sync.encode_watermark(watermark)) == watermark
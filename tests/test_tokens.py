@@ -0,0 +1,132 @@
+import time
+from datetime import timedelta
+
+import httpx
+import jwt as pyjwt
+import pytest
+from jose import jwt as jose_jwt
+
+from tests.memory_db import MemoryDB
+from tests.stubs import install_stub_modules
+
+install_stub_modules()
+
+from backend import server
+import rate_limit
+import tokens
+
+SECRET = "test-secret-long-enough-for-hs256-keys"
+
+
+def test_codec_interoperates_with_jwt_libraries_and_caches_until_exp():
+    now = int(time.time())
+    clock = [float(now)]
+    codec = tokens.TokenCodec(SECRET, clock=lambda: clock[0])
+    token = codec.encode({"sub": "u1", "exp": now + 60})
+    assert pyjwt.decode(token, SECRET, algorithms=["HS256"])["sub"] == "u1"
+    jose_token = jose_jwt.encode({"sub": "u2", "exp": now + 60}, SECRET, algorithm="HS256")
+    assert codec.decode(jose_token)["sub"] == "u2"
+
+    cached = tokens.verifications.value(result="cached")
+    assert codec.decode(token) == codec.decode(token) == {"sub": "u1", "exp": now + 60}
+    assert tokens.verifications.value(result="cached") == cached + 1
+
+    # Once the cache's clock passes exp the token is verified again
+    clock[0] += 61
+    verified = tokens.verifications.value(result="verified")
+    codec.decode(token)
+    assert tokens.verifications.value(result="verified") == verified + 1
+
+    header, payload, signature = token.split(".")
+    forged = [
+        codec.encode({"sub": "u1", "exp": now - 1}),
+        codec.encode({"sub": "u1"}),  # tokens must expire
+        f"{header}.{codec.encode({'sub': 'admin', 'exp': now + 60}).split('.')[1]}.{signature}",
+        pyjwt.encode({"sub": "u1", "exp": now + 60}, "another-secret-long-enough-for-hs256", algorithm="HS256"),
+        jose_jwt.encode({"sub": "u1", "exp": now + 60}, SECRET, algorithm="HS512"),
+        f"{header}.{payload}.",
+        "not-a-token",
+    ]
+    for token in forged:
+        with pytest.raises(tokens.InvalidToken):
+            codec.decode(token)
+
+
+@pytest.mark.asyncio
+async def test_refresh_tokens_rotate_and_replays_end_the_session(monkeypatch):
+    monkeypatch.setattr(server, "db", MemoryDB())
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(None))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        registered = (await client.post("/api/auth/register", json={
+            "email": "customer@tokens-domora.com", "full_name": "Customer", "role": "customer",
+            "password": "Secret123!",
+        })).json()
+        assert registered["expires_in"] == int(server.ACCESS_TOKEN_TTL.total_seconds())
+
+        # Refresh tokens are not access tokens
+        me = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {registered['refresh_token']}"})
+        assert me.status_code == 401
+
+        refreshed = await client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]})
+        assert refreshed.status_code == 200
+        rotated = refreshed.json()
+        me = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+        assert me.json()["email"] == "customer@tokens-domora.com"
+
+        replayed = await client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]})
+        assert replayed.status_code == 401
+        revoked = await client.post("/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+        assert revoked.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_short_lived_access_tokens_skip_the_user_lookup(monkeypatch):
+    db = MemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(None))
+    monkeypatch.setattr(server, "JWT_ACCESS_TOKEN_MINUTES", "15")
+    monkeypatch.setattr(server, "ACCESS_TOKEN_TTL", timedelta(minutes=15))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        registered = (await client.post("/api/auth/register", json={
+            "email": "provider@tokens-domora.com", "full_name": "Provider", "role": "provider",
+            "password": "Secret123!",
+        })).json()
+        assert registered["expires_in"] == 900
+        headers = {"Authorization": f"Bearer {registered['access_token']}"}
+
+        await db.users.delete_many({})
+        me = await client.get("/api/auth/me", headers=headers)
+        assert me.status_code == 200
+        assert me.json()["role"] == "provider" and me.json()["created_at"] == registered["user"]["created_at"]
+
+        # Refreshing goes back to the database
+        refreshed = await client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]})
+        assert refreshed.status_code == 401
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("access_minutes", [None, "15"])
+async def test_deactivated_accounts_lose_access(monkeypatch, access_minutes):
+    db = MemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "rate_limiter", rate_limit.RateLimiter(None))
+    monkeypatch.setattr(server, "JWT_ACCESS_TOKEN_MINUTES", access_minutes)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        registered = (await client.post("/api/auth/register", json={
+            "email": "leaver@tokens-domora.com", "full_name": "Leaver", "role": "customer",
+            "password": "Secret123!",
+        })).json()
+        headers = {"Authorization": f"Bearer {registered['access_token']}"}
+        await db.users.update_one({"email": "leaver@tokens-domora.com"}, {"$set": {"is_active": False}})
+
+        # A long-lived token is refused at once, a short-lived one when it runs out
+        me = await client.get("/api/auth/me", headers=headers)
+        assert me.status_code == (401 if access_minutes is None else 200)
+        refreshed = await client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]})
+        assert refreshed.status_code == 401